@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from .metrics import METRICS
+
+
+LANES = ("interactive", "bulk")
+
+QUEUE_DEPTH = METRICS.gauge("queue_depth", "Jobs waiting per priority lane.")
+QUEUE_WAIT = METRICS.histogram("queue_wait_seconds", "Time from admission to start per priority lane.")
+REJECTED = METRICS.counter("rejected_total", "Jobs refused or dropped per lane and reason (overload, deadline, shutdown).")
+IN_FLIGHT = METRICS.gauge("in_flight", "Jobs running per priority lane.")
+
+
+class Overloaded(RuntimeError):
+    """
+    The lane's queue is full; retry_after_s estimates when capacity frees up.
+    """
+
+    def __init__(self, lane: str, retry_after_s: float) -> None:
+        super().__init__(f"The {lane} queue is full; retry in {retry_after_s:.0f}s.")
+        self.lane = lane
+        self.retry_after_s = retry_after_s
+
+
+class DeadlineExceeded(RuntimeError):
+    """
+    The job's deadline passed while it was still queued, so it was never started.
+    """
+
+
+@dataclass(frozen = True)
+class LaneConfig:
+    max_queue: int
+    # most workers this lane may occupy at once; the rest stay free for higher-priority lanes
+    max_running: int
+    default_deadline_s: Optional[float] = None
+
+
+@dataclass
+class _Job:
+    fn: Callable[[], Any]
+    future: Future
+    lane: str
+    admitted: float
+    deadline: Optional[float]
+
+
+class AdmissionController:
+    """
+    Bounded priority lanes in front of a fixed pool of worker threads.
+    Workers always take interactive work first; bulk work may only occupy its max_running workers, so a big
+    upload cannot starve single-document requests. A full lane refuses new work with Overloaded instead of
+    queueing without bound, and a job whose deadline passes while queued is dropped before it starts.
+    """
+
+    def __init__(self, workers: int, lanes: Optional[Dict[str, LaneConfig]] = None) -> None:
+        self._workers = max(1, int(workers))
+        self._lanes = lanes or {
+            "interactive": LaneConfig(max_queue = 4 * self._workers, max_running = self._workers, default_deadline_s = 30.0),
+            "bulk": LaneConfig(max_queue = 16, max_running = self._workers - 1),
+        }
+        unknown = set(self._lanes) - set(LANES)
+        if unknown:
+            raise ValueError(f"Unknown lanes: {', '.join(sorted(unknown))}. Expected: {', '.join(LANES)}")
+        bulk = self._lanes.get("bulk")
+        if bulk is not None and not 1 <= bulk.max_running < self._workers:
+            # bulk must be able to run, and must leave a worker free for interactive requests
+            raise ValueError(
+                f"The bulk lane needs 1 to {self._workers - 1} running workers out of {self._workers}, got {bulk.max_running}. "
+                f"Use at least 2 workers when a bulk lane is configured."
+            )
+
+        self._queues: Dict[str, Deque[_Job]] = {lane: deque() for lane in self._lanes}
+        self._running: Dict[str, int] = {lane: 0 for lane in self._lanes}
+        # recent run times per lane, for Retry-After estimates
+        self._recent: Dict[str, Deque[float]] = {lane: deque(maxlen = 50) for lane in self._lanes}
+        self._cond = threading.Condition()
+        self._closed = False
+
+        for lane in self._lanes:
+            QUEUE_DEPTH.set(0, lane = lane)
+            IN_FLIGHT.set(0, lane = lane)
+
+        self._threads = [
+            threading.Thread(target = self._work, name = f"admission-{i}", daemon = True)
+            for i in range(self._workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, lane: str, fn: Callable[[], Any], *, deadline_s: Optional[float] = None) -> Future:
+        """
+        Queue fn on a lane. Raises Overloaded when the lane is full. The future fails with DeadlineExceeded
+        if the job is still queued deadline_s seconds from now; cancelling the future while queued drops the job.
+        """
+        config = self._lanes.get(lane)
+        if config is None:
+            raise ValueError(f"Unknown lane '{lane}'. Expected one of: {', '.join(self._lanes)}")
+        deadline_s = self.deadline_s(lane, deadline_s)
+        now = time.monotonic()
+
+        with self._cond:
+            if self._closed:
+                REJECTED.inc(lane = lane, reason = "shutdown")
+                raise Overloaded(lane, 1.0)
+            queue = self._queues[lane]
+            if len(queue) >= config.max_queue:
+                REJECTED.inc(lane = lane, reason = "overload")
+                raise Overloaded(lane, self._retry_after(lane))
+            job = _Job(fn = fn, future = Future(), lane = lane, admitted = now, deadline = now + deadline_s if deadline_s else None)
+            queue.append(job)
+            QUEUE_DEPTH.set(len(queue), lane = lane)
+            self._cond.notify()
+        return job.future
+
+    def deadline_s(self, lane: str, requested: Optional[float] = None) -> Optional[float]:
+        # the deadline submit() applies: the requested one, else the lane default (None: no deadline)
+        return requested if requested is not None else self._lanes[lane].default_deadline_s
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._cond:
+            return {
+                lane: {"queued": len(self._queues[lane]), "running": self._running[lane], "max_queue": config.max_queue, "max_running": config.max_running}
+                for lane, config in self._lanes.items()
+            }
+
+    def close(self, *, wait: bool = True) -> None:
+        # stop admitting, fail whatever is still queued, let running jobs finish
+        with self._cond:
+            self._closed = True
+            dropped = [job for queue in self._queues.values() for job in queue]
+            for queue in self._queues.values():
+                queue.clear()
+            self._cond.notify_all()
+        for job in dropped:
+            REJECTED.inc(lane = job.lane, reason = "shutdown")
+            # a caller may have cancelled the future already; setting an exception on it would raise
+            if job.future.set_running_or_notify_cancel():
+                job.future.set_exception(Overloaded(job.lane, 1.0))
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _retry_after(self, lane: str) -> float:
+        # queued work ahead of the caller, spread over the workers the lane may use
+        recent = self._recent[lane]
+        per_job = sum(recent) / len(recent) if recent else 1.0
+        return max(1.0, per_job * (len(self._queues[lane]) + 1) / self._lanes[lane].max_running)
+
+    def _next(self) -> Tuple[Optional[_Job], List[_Job]]:
+        # called with the lock held: first runnable job in priority order, plus expired jobs to fail
+        expired: List[_Job] = []
+        now = time.monotonic()
+        for lane in LANES:
+            if lane not in self._lanes:
+                continue
+            queue = self._queues[lane]
+            while queue and queue[0].deadline is not None and queue[0].deadline <= now:
+                expired.append(queue.popleft())
+            if queue and self._running[lane] < self._lanes[lane].max_running:
+                job = queue.popleft()
+                QUEUE_DEPTH.set(len(queue), lane = lane)
+                return job, expired
+            QUEUE_DEPTH.set(len(queue), lane = lane)
+        return None, expired
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    job, expired = self._next()
+                    if job is not None or expired or self._closed:
+                        break
+                    # wake periodically so queued jobs past their deadline are failed promptly
+                    self._cond.wait(timeout = 0.5)
+                if job is not None:
+                    self._running[job.lane] += 1
+                    IN_FLIGHT.set(self._running[job.lane], lane = job.lane)
+                elif not expired and self._closed:
+                    return
+
+            for old in expired:
+                REJECTED.inc(lane = old.lane, reason = "deadline")
+                if old.future.set_running_or_notify_cancel():
+                    old.future.set_exception(DeadlineExceeded(f"Deadline passed after {time.monotonic() - old.admitted:.1f}s in the {old.lane} queue."))
+            if job is None:
+                continue
+
+            started = time.monotonic()
+            QUEUE_WAIT.observe(started - job.admitted, lane = job.lane)
+            try:
+                if job.future.set_running_or_notify_cancel():
+                    try:
+                        job.future.set_result(job.fn())
+                    except BaseException as e:
+                        job.future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._running[job.lane] -= 1
+                    self._recent[job.lane].append(time.monotonic() - started)
+                    IN_FLIGHT.set(self._running[job.lane], lane = job.lane)
+                    # a bulk slot freeing up can make queued bulk work runnable for an idle worker
+                    self._cond.notify_all()
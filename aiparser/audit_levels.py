@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+
+# minimal:  run_id (+ shared_computation) only
+# standard: + retrieval candidates that passed min_retrieval_score, reranker decisions, section reuse, model params
+# full:     + every retrieved candidate and the raw model output
+AUDIT_LEVELS = ("minimal", "standard", "full")
+
+# identical for every document of a run, so they live in the run manifest
+_RUN_LEVEL_KEYS = ("timestamp_utc", "input_hash", "dictionary", "environment")
+
+
+def check_audit_level(level: str) -> str:
+    if level not in AUDIT_LEVELS:
+        raise ValueError(f"Unknown audit level '{level}'. Expected one of: {', '.join(AUDIT_LEVELS)}")
+    return level
+
+
+def document_audit(audit: Optional[Dict[str, Any]], level: str, run_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Document-specific part of a full per-document audit dict.
+    Run-level blocks are dropped because the manifest for `run_id` carries them; a record computed by a
+    different run (restored from a checkpoint) keeps its own run-level blocks at the full level.
+    """
+    check_audit_level(level)
+    if not audit:
+        return audit
+
+    out: Dict[str, Any] = {"run_id": audit.get("run_id")}
+    if level == "full" and run_id is not None and audit.get("run_id") != run_id:
+        out.update({k: audit[k] for k in _RUN_LEVEL_KEYS if audit.get(k) is not None})
+    if audit.get("shared_computation"):
+        out["shared_computation"] = audit["shared_computation"]
+    if level == "minimal":
+        return out
+
+    retrieval = audit.get("retrieval")
+    if retrieval:
+        candidates = retrieval.get("candidates") or []
+        if level == "standard":
+            floor = retrieval.get("min_retrieval_score") or 0.0
+            candidates = [c for c in candidates if c["retrieval_score"] >= floor]
+        out["retrieval"] = {"candidates": candidates}
+        if retrieval.get("rerank"):
+            out["retrieval"]["rerank"] = retrieval["rerank"]
+        if retrieval.get("sections"):
+            out["retrieval"]["sections"] = retrieval["sections"]
+
+    model = audit.get("model")
+    if model:
+        out["model"] = {"params": model.get("params")}
+        if level == "full" and model.get("raw_output") is not None:
+            out["model"]["raw_output"] = model["raw_output"]
+
+    return out
+
+
+def expand_document_audit(audit: Optional[Dict[str, Any]], manifest: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Rebuild the inline audit shape from a document audit and its run manifest (both as JSON dicts).
+    """
+    if not audit:
+        return audit
+    pipeline = manifest.get("pipeline") or {}
+    out = {
+        "run_id": audit.get("run_id"),
+        "timestamp_utc": audit.get("timestamp_utc", manifest.get("timestamp_utc")),
+        "input_hash": audit.get("input_hash", manifest.get("input_hash")),
+        "dictionary": audit.get("dictionary", manifest.get("dictionary")),
+        "retrieval": None,
+        "model": None,
+        "environment": audit.get("environment", manifest.get("environment")),
+        "shared_computation": audit.get("shared_computation"),
+    }
+    if "retrieval" in audit:
+        out["retrieval"] = {**(pipeline.get("retrieval") or {}), **audit["retrieval"]}
+    if "model" in audit:
+        out["model"] = {
+            "model_name": None,
+            "model_version": None,
+            "params": None,
+            "prompt_template": None,
+            "raw_output": None,
+            "model_info": None,
+            **(pipeline.get("model") or {}),
+            **audit["model"],
+        }
+    return out
+
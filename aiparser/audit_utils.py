@@ -4,10 +4,27 @@ from datetime import datetime, timezone
 import uuid
 import platform
 import sys
+from typing import Dict, List, Sequence, Tuple
 
 def sha256_text(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
+def group_identical_texts(texts: Sequence[str]) -> Tuple[List[str], Dict[str, List[int]]]:
+    # per-text hashes plus hash -> input positions, first position is the one that gets computed
+    hashes = [sha256_text(t) for t in texts]
+    groups: Dict[str, List[int]] = {}
+    for i, h in enumerate(hashes):
+        groups.setdefault(h, []).append(i)
+    return hashes, groups
+
+def shared_computation_note(text_hash: str, source_id: str, group_ids: List[str]) -> dict:
+    return {
+        "text_sha256": text_hash,
+        "computed_for": source_id,
+        "group_size": len(group_ids),
+        "group_ids": list(group_ids),
+    }
+
 def sha256_file(path: Path) -> str:
     data = path.read_bytes()
     return hashlib.sha256(data).hexdigest()
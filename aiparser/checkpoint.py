@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+
+class CheckpointJournal:
+    """
+    Append-only JSONL journal of finished documents, keyed by (document id, input text sha256).
+    Each record is flushed and fsynced as it is written, so a crashed run loses at most the document in flight.
+    Records carry the fingerprint of the pipeline and dictionary that produced them; records with another
+    fingerprint are ignored on load, so a changed retriever, model, reranker or dictionary recomputes everything.
+    """
+
+    def __init__(self, path: Path | str, fingerprint: str = "") -> None:
+        self.path = Path(path)
+        self.fingerprint = fingerprint
+        self._lock = threading.Lock()
+        self._done: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.stale = 0
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._done)
+
+    def completed(self, doc_id: str, text_hash: str) -> Optional[Dict[str, Any]]:
+        return self._done.get((doc_id, text_hash))
+
+    def record(self, doc_id: str, text_hash: str, output: Dict[str, Any]) -> None:
+        line = json.dumps({"id": doc_id, "text_sha256": text_hash, "fingerprint": self.fingerprint, "output": output}, ensure_ascii = False)
+        with self._lock:
+            with open(self.path, "a", encoding = "utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._done[(doc_id, text_hash)] = output
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        self._drop_torn_tail()
+        with open(self.path, "r", encoding = "utf-8") as f:
+            for line_no, line in enumerate(f, start = 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    sys.stderr.write(f"Warning: Ignoring unreadable journal line {line_no} in {self.path}.\n")
+                    continue
+                if record.get("fingerprint", "") != self.fingerprint:
+                    self.stale += 1
+                    continue
+                self._done[(record["id"], record["text_sha256"])] = record["output"]
+        if self.stale:
+            sys.stderr.write(
+                f"Warning: Ignoring {self.stale} records in {self.path} written under a different pipeline, model, "
+                f"reranker or dictionary; those documents are recomputed.\n"
+            )
+
+    def _drop_torn_tail(self) -> None:
+        # a crash mid-write leaves a partial last line; cut it so new records start on a fresh line
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+                sys.stderr.write(f"Warning: Dropped partial final record from {self.path}.\n")
+
+
+class RetryFile:
+    """
+    Documents that failed in the current run, one JSON line each, rewritten at the start of every run.
+    """
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.count = 0
+        if self.path.exists():
+            self.path.unlink()
+
+    def record(self, doc_id: str, name: str, text_hash: str, error: BaseException) -> None:
+        line = json.dumps({
+            "id": doc_id,
+            "name": name,
+            "text_sha256": text_hash,
+            "error_type": type(error).__name__,
+            "error": str(error),
+        }, ensure_ascii = False)
+        with self._lock:
+            with open(self.path, "a", encoding = "utf-8") as f:
+                f.write(line + "\n")
+            self.count += 1
@@ -3,9 +3,9 @@ from __future__ import annotations
 import sys
 import csv
 from dataclasses import dataclass
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Sequence
 
-from .models import Concept
+from .models import Concept, ConceptTable
 
 
 @dataclass
@@ -14,8 +14,10 @@ class CsvSchema:
     concept_column: str = "description"
 
 
-def load_concepts_from_csv(conceptpair_csv_path: str, schema: CsvSchema, *, encoding: str = "utf-8") -> List[Concept]:
-    concepts: List[Concept] = []
+def load_concepts_from_csv(conceptpair_csv_path: str, schema: CsvSchema, *, encoding: str = "utf-8", code_system: Optional[str] = None) -> ConceptTable:
+    codes: List[str] = []
+    texts: List[str] = []
+    metadata_rows: List[Optional[tuple]] = []
 
     with open(conceptpair_csv_path, "r", encoding = encoding, newline="") as csvfile:
         reader = csv.DictReader(csvfile)
@@ -25,6 +27,9 @@ def load_concepts_from_csv(conceptpair_csv_path: str, schema: CsvSchema, *, enco
         if missing_columns:
             raise ValueError(f"CSV file is missing required columns: {', '.join(missing_columns)}")
 
+        # extra columns become metadata; names are kept once on the table, not per row
+        metadata_columns = tuple(k for k in reader.fieldnames if k not in [schema.code_column, schema.concept_column])
+
         for row_index, row in enumerate(reader, start=2):  # Start at 2 to account for header row
             code = row.get(schema.code_column or "").strip()
             concept = row.get(schema.concept_column or "").strip()
@@ -33,17 +38,20 @@ def load_concepts_from_csv(conceptpair_csv_path: str, schema: CsvSchema, *, enco
                 sys.stderr.write(f"Warning: Missing code in row {row_index}. Skipping this row.")
                 continue
 
-            metadata = {k: v for k, v in row.items() if k not in [schema.code_column, schema.concept_column]}
             if code and concept:
-                concepts.append(Concept(code=code, concept=concept, metadata=metadata))
+                codes.append(code)
+                texts.append(concept)
+                if metadata_columns:
+                    values = tuple(row.get(k) for k in metadata_columns)
+                    metadata_rows.append(values if any(values) else None)
 
-    if not concepts:
+    if not codes:
         raise ValueError("No valid concepts were loaded from the CSV file. Please check the file content and schema.")
     
-    return concepts
+    return ConceptTable(codes, texts, metadata_columns, metadata_rows if metadata_columns else None, code_system = code_system)
 
 
-def concepts_by_code(concepts: List[Concept]) -> Dict[str, List[Concept]]:
+def concepts_by_code(concepts: Sequence[Concept]) -> Dict[str, List[Concept]]:
     out: Dict[str, List[Concept]] = {}
     for concept in concepts:
         out.setdefault(concept.code, []).append(concept)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .audit_utils import sha256_text
+from .csv_loader import CsvSchema, load_concepts_from_csv
+from .models import ConceptTable, DictionaryAudit
+from .registry import create_retriever
+from .retriever.base import Retriever
+from .retriever.sharded_retriever import ShardedRetriever
+
+
+@dataclass(frozen = True)
+class DictionarySpec:
+    """
+    One named code dictionary (code system) and how its shard is indexed.
+    retriever / top_k default to the run's retriever backend and top_k; options override the run's
+    registry options for this shard only (e.g. a separate embedding_store_path).
+    """
+    name: str
+    path: str
+    code_column: str = "code"
+    concept_column: str = "description"
+    retriever: Optional[str] = None
+    top_k: Optional[int] = None
+    options: Dict[str, Any] = field(default_factory = dict)
+
+    @classmethod
+    def parse(cls, spec: str) -> "DictionarySpec":
+        """
+        Parse "name=path[,key=value...]", e.g. "icd10cm=data/icd10cm.csv,top_k=20,concept_column=long_description".
+        """
+        head, *pairs = [part.strip() for part in spec.split(",")]
+        name, sep, path = head.partition("=")
+        if not sep or not name.strip() or not path.strip():
+            raise ValueError(f"Dictionary spec '{spec}' must look like 'name=path[,key=value...]'.")
+        values: Dict[str, Any] = {}
+        for pair in pairs:
+            key, sep, value = pair.partition("=")
+            if not sep:
+                raise ValueError(f"Dictionary spec '{spec}': expected key=value, got '{pair}'.")
+            values[key.strip()] = value.strip()
+        return cls.from_dict({"name": name.strip(), "path": path.strip(), **values})
+
+    @classmethod
+    def from_dict(cls, values: Mapping[str, Any]) -> "DictionarySpec":
+        known = {"name", "path", "code_column", "concept_column", "retriever", "top_k", "options"}
+        unknown = set(values) - known
+        if unknown:
+            raise ValueError(f"Unknown dictionary settings: {', '.join(sorted(unknown))}")
+        if not values.get("name") or not values.get("path"):
+            raise ValueError("A dictionary needs a name and a path.")
+        return cls(
+            name = str(values["name"]).strip().lower(),
+            path = str(values["path"]),
+            code_column = values.get("code_column") or "code",
+            concept_column = values.get("concept_column") or "description",
+            retriever = values.get("retriever") or None,
+            top_k = int(values["top_k"]) if values.get("top_k") else None,
+            options = dict(values.get("options") or {}),
+        )
+
+    def schema(self) -> CsvSchema:
+        return CsvSchema(code_column = self.code_column, concept_column = self.concept_column)
+
+
+def load_dictionary(spec: DictionarySpec) -> ConceptTable:
+    return load_concepts_from_csv(Path(spec.path), spec.schema(), code_system = spec.name)
+
+
+def build_dictionaries(
+    specs: Sequence[DictionarySpec],
+    *,
+    retriever: str,
+    options: Optional[Dict[str, Any]] = None,
+) -> Tuple[Retriever, DictionaryAudit]:
+    """
+    Load every dictionary and index it into its own retriever shard (in parallel).
+    Returns the sharded retriever and a dictionary audit with one entry per code system.
+    """
+    names = [spec.name for spec in specs]
+    if not specs:
+        raise ValueError("At least one dictionary is required.")
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate dictionary names: {', '.join(names)}")
+
+    options = options or {}
+    tables: List[ConceptTable] = [load_dictionary(spec) for spec in specs]
+    sharded = ShardedRetriever(
+        {spec.name: create_retriever(spec.retriever or retriever, {**options, **spec.options}) for spec in specs},
+        top_k = {spec.name: spec.top_k for spec in specs if spec.top_k},
+    )
+    change = sharded.index_shards({spec.name: table for spec, table in zip(specs, tables)})
+
+    schemas = {(spec.code_column, spec.concept_column) for spec in specs}
+    code_col, concept_col = next(iter(schemas)) if len(schemas) == 1 else ("", "")
+    audit = DictionaryAudit(
+        row_count = sum(len(table) for table in tables),
+        schema = {"code_col": code_col, "concept_col": concept_col} if code_col else {},
+        code_systems = {
+            spec.name: {
+                "row_count": len(table),
+                "schema": {"code_col": spec.code_column, "concept_col": spec.concept_column},
+                "path": str(spec.path),
+                "retriever": spec.retriever or retriever,
+                "top_k": spec.top_k,
+            }
+            for spec, table in zip(specs, tables)
+        },
+        content_sha256 = sha256_text(json.dumps({spec.name: table.sha256() for spec, table in zip(specs, tables)}, sort_keys = True)),
+    )
+    if change is not None:
+        # a saved index synced to this dictionary version; the diff goes into the run's audit
+        audit.record_change(change)
+    return sharded, audit
@@ -0,0 +1,98 @@
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+from aiparser.models import Concept
+from aiparser.retriever.ann import ExactIndex, make_vector_index
+from aiparser.retriever.embedding_store import EmbeddingStore
+
+
+# Compares an ANN backend against exact search on the same store.
+# Uses an existing memory-mapped store (--store) or a clustered synthetic one.
+
+def synthetic_store(n: int, dim: int, clusters: int, seed: int) -> EmbeddingStore:
+    rng = random.Random(seed)
+    centers = [[rng.gauss(0, 1) for _ in range(dim)] for _ in range(clusters)]
+    vectors = []
+    for _ in range(n):
+        center = centers[rng.randrange(clusters)]
+        vectors.append([x + rng.gauss(0, 0.35) for x in center])
+    concepts = [Concept(code = str(i), concept = f"synthetic {i}") for i in range(n)]
+    return EmbeddingStore.from_vectors(concepts, vectors)
+
+
+def make_queries(store: EmbeddingStore, count: int, seed: int) -> List[List[float]]:
+    rng = random.Random(seed + 1)
+    queries = []
+    for _ in range(count):
+        base = store.vector(rng.randrange(len(store)))
+        queries.append([x + rng.gauss(0, 0.05) for x in base])
+    return queries
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    store = EmbeddingStore.open(args.store) if args.store else synthetic_store(args.n, args.dim, args.clusters, args.seed)
+    queries = make_queries(store, args.queries, args.seed)
+
+    exact = ExactIndex()
+    exact.build(store)
+
+    params = {"nprobe": args.nprobe}
+    if args.nlist:
+        params["nlist"] = args.nlist
+    ann = make_vector_index(args.backend, len(store), min_ann_size = 0, params = params)
+
+    start = time.perf_counter()
+    ann.build(store)
+    build_s = time.perf_counter() - start
+
+    recall_total = 0.0
+    exact_s = 0.0
+    ann_s = 0.0
+    for query in queries:
+        start = time.perf_counter()
+        truth = {i for _, i in exact.search(query, top_k = args.top_k)}
+        exact_s += time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = {i for _, i in ann.search(query, top_k = args.top_k)}
+        ann_s += time.perf_counter() - start
+
+        recall_total += len(truth & found) / len(truth) if truth else 1.0
+
+    return {
+        "rows": len(store),
+        "dim": store.dim,
+        "queries": len(queries),
+        "top_k": args.top_k,
+        "index": ann.params(),
+        "build_seconds": round(build_s, 4),
+        f"recall_at_{args.top_k}": round(recall_total / max(1, len(queries)), 4),
+        "exact_ms_per_query": round(1000 * exact_s / max(1, len(queries)), 3),
+        "ann_ms_per_query": round(1000 * ann_s / max(1, len(queries)), 3),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description = "Recall/latency of ANN retrieval versus exact search.")
+    parser.add_argument("--store", help = "path to an embedding store written by EmbeddingStore.write")
+    parser.add_argument("--backend", default = "ivf")
+    parser.add_argument("--n", type = int, default = 20000, help = "synthetic rows when --store is not given")
+    parser.add_argument("--dim", type = int, default = 64)
+    parser.add_argument("--clusters", type = int, default = 200)
+    parser.add_argument("--queries", type = int, default = 50)
+    parser.add_argument("--top-k", type = int, default = 10)
+    parser.add_argument("--nlist", type = int, default = 0)
+    parser.add_argument("--nprobe", type = int, default = 8)
+    parser.add_argument("--seed", type = int, default = 13)
+    args = parser.parse_args()
+
+    sys.stdout.write(json.dumps(run(args), indent = 2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
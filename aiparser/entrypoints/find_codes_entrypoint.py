@@ -1,20 +1,21 @@
 import json
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict
-from dataclasses import asdict
+from typing import Any, Dict, Optional
 
 
 from aiparser.csv_loader import load_concepts_from_csv, CsvSchema
+from aiparser.dictionaries import DictionarySpec, build_dictionaries
+from aiparser.metrics import ERRORS, export, observe_dictionary, watch_retriever
 from aiparser.pipeline import CodeInferencePipeline, PipelineConfig
 
-from aiparser.retriever.token_retriever import TokenRetriever
-from aiparser.retriever.openai_embeddint_retriever import OpenAIEmbeddingRetriever
-
-from aiparser.llm.mock_inference import MockCodeInferenceModel
-from aiparser.llm.openai_inference import OpenAIInferenceModel
-from aiparser.models import AuditTrail, DictionaryAudit
-from aiparser.audit_utils import sha256_text, env_fingerprint, new_run_id, utc_now_iso
+from aiparser.registry import create_model, create_retriever
+from aiparser.reranker import LogisticReranker
+from aiparser.revisions import RevisionStore
+from aiparser.models import AuditTrail, DictionaryAudit, to_jsonable
+from aiparser.serialization import compact_records, dumps
+from aiparser.audit_utils import sha256_text, env_fingerprint, group_identical_texts, new_run_id, shared_computation_note, utc_now_iso
 
 
 # (Optional) If you want audit for single-text calls later, you can re-add it.
@@ -23,36 +24,37 @@ from aiparser.audit_utils import sha256_text, env_fingerprint, new_run_id, utc_n
 def build_pipeline(options: Dict[str, Any] | None = None):
     options = options or {}
 
-    concepts_csv = options.get("concepts_csv_path") or "aiparser/data/hcpcs.csv"
-    concepts_csv_path = Path(concepts_csv)
-
-    concepts = load_concepts_from_csv(concepts_csv_path, CsvSchema())
-
     inference_model = str(options.get("inference_model", "mock")).strip().lower()
 
     # --- retriever/RAG selection ---
-    if inference_model in ("openai", "oai"):
-        retriever = OpenAIEmbeddingRetriever(
-            api_key = options.get("openai_api_key"),
-            base_url = options.get("openai_base_url") or "https://api.openai.com/v1",
-            embedding_model = options.get("openai_embedding_model") or "text-embedding-3-small",
-            batch_size = int(options.get("embedding_batch_size", 32)),
-        )
+    # backends resolve through the registry, so only the selected one is imported
+    default_retriever = "openai" if inference_model in ("openai", "oai") else "token"
+    retriever_name = options.get("retriever") or default_retriever
+
+    dictionaries = options.get("dictionaries")
+    if dictionaries:
+        # several code systems, each in its own index shard; entries are dicts or "name=path,..." strings
+        specs = [DictionarySpec.parse(d) if isinstance(d, str) else DictionarySpec.from_dict(d) for d in dictionaries]
+        retriever, dictionary_audit = build_dictionaries(specs, retriever = retriever_name, options = options)
     else:
-        retriever = TokenRetriever()
+        concepts_csv = options.get("concepts_csv_path") or "aiparser/data/hcpcs.csv"
+        concepts = load_concepts_from_csv(Path(concepts_csv), CsvSchema())
+        retriever = create_retriever(retriever_name, options)
+        change = retriever.index(concepts)
+        dictionary_audit = DictionaryAudit(
+            row_count = len(concepts),
+            schema={"code_col": CsvSchema().code_column, "concept_col": CsvSchema().concept_column},
+            content_sha256 = concepts.sha256(),
+        )
+        if change is not None:
+            dictionary_audit.record_change(change)
 
-    retriever.index(concepts)
+    watch_retriever(retriever)
+    observe_dictionary(dictionary_audit)
 
     # --- model selection ---
 
-    if inference_model in ("openai", "oai"):
-        model = OpenAIInferenceModel(
-            api_key = options.get("openai_api_key"),
-            model = options.get("openai_model") or "gpt-4o",
-            base_url = options.get("openai_base_url") or "https://api.openai.com/v1",
-        )
-    else:
-        model = MockCodeInferenceModel()
+    model = create_model(inference_model, options)
 
     top_k = int(options.get("top_k", 50))
     min_score = float(options.get("min_retrieval_score", 0.005))
@@ -60,22 +62,26 @@ def build_pipeline(options: Dict[str, Any] | None = None):
     pipeline = CodeInferencePipeline(
         retriever = retriever,
         model = model,
-        config = PipelineConfig(top_k=top_k, min_retrieval_score=min_score),
+        config = PipelineConfig(
+            top_k = top_k,
+            min_retrieval_score = min_score,
+            pack_max_chars = int(options.get("pack_max_chars", 0)),
+            pack_max_docs = int(options.get("pack_max_docs", 8)),
+            normalize_text = bool(options.get("normalize_text", True)),
+            chunk_tokens = int(options.get("chunk_tokens", 0)),
+            chunk_overlap = int(options.get("chunk_overlap", 32)),
+            rerank_max_codes = int(options.get("rerank_max_codes", 10)),
+            skip_llm_margin = float(options.get("skip_llm_margin", 0.0)),
+            skip_llm_min_probability = float(options.get("skip_llm_min_probability", 0.9)),
+        ),
         model_info = {"name": type(model).__name__, "version": "0.2"},
+        reranker = LogisticReranker.load(options["reranker_path"]) if options.get("reranker_path") else None,
     )
-    return pipeline, len(concepts)
+    return pipeline, dictionary_audit
 
 
-def drop_key_recursive(obj, key_to_drop: str):
-    if isinstance(obj, dict):
-        return {
-            k: drop_key_recursive(v, key_to_drop)
-            for k, v in obj.items()
-            if k != key_to_drop
-        }
-    if isinstance(obj, list):
-        return [drop_key_recursive(x, key_to_drop) for x in obj]
-    return obj
+# never echoed back to the caller; dropped during serialization instead of a separate walk per key
+_DROPPED_KEYS = frozenset({"input_text", "openai_api_key"})
 
 def redact_options_for_audit(options: Dict[str, Any]) -> Dict[str, Any]:
     # Shallow copy is enough for your current shape
@@ -85,48 +91,102 @@ def redact_options_for_audit(options: Dict[str, Any]) -> Dict[str, Any]:
     return redacted
 
 
-def main() -> int:
-    try:
-        payload = json.load(sys.stdin)
-    except Exception as e:
-        sys.stderr.write(f"Invalid JSON on stdin: {e}\n")
-        return 2
-    
+def find_codes(
+    pipeline: CodeInferencePipeline,
+    dictionary_audit: DictionaryAudit,
+    payload: Dict[str, Any],
+    *,
+    max_workers: Optional[int] = None,
+    revisions: Optional[RevisionStore] = None,
+) -> bytes:
+    """
+    Answer one request payload ({"text": ...} or {"items": [...]}, plus "options") with a warm pipeline.
+    Shared by the one-shot stdin entrypoint and the long-running server (which caps max_workers per request).
+    With a revision store, items are recoded incrementally against the previous version stored for their id.
+    """
     text = payload.get("text", "")
+    items = payload.get("items")
     options = payload.get("options") or {}
 
     if not isinstance(text, str):
         text = str(text)
 
-    try:
-        pipeline, len_concepts = build_pipeline(options)
+    audit_options = redact_options_for_audit(options)
+    audit = AuditTrail(
+        run_id = new_run_id(),
+        timestamp_utc = utc_now_iso(),
+        input_hash = sha256_text(json.dumps(audit_options, sort_keys = True)),
+        environment = env_fingerprint(),
+        dictionary = dictionary_audit,
+        retrieval = None,
+        model = None
+    )
 
-        dictionary_audit = DictionaryAudit(
-            row_count = len_concepts,
-            schema={"code_col": CsvSchema().code_column, "concept_col": CsvSchema().concept_column},
-        )
+    if isinstance(items, list):
+        # batch of documents in one process: identical texts are computed once,
+        # short ones may be packed into shared model calls
+        texts = [str(item.get("text") or "") for item in items]
+        hashes, groups = group_identical_texts(texts)
+        unique = [members[0] for members in groups.values()]
+        workers = max_workers if max_workers is not None else int(options.get("workers", 4))
+        if revisions is not None:
+            context = dictionary_audit.context()
+            def recode(i: int):
+                doc_id = str(items[i].get("id"))
+                raw_out = pipeline.run_incremental(doc_id, texts[i], revisions, audit_trail = audit, context = context)
+                revisions.share(doc_id, [str(items[m].get("id")) for m in groups[hashes[i]]])
+                return raw_out
+            with ThreadPoolExecutor(max_workers = max(1, workers)) as executor:
+                raw_outs = list(executor.map(recode, unique))
+        else:
+            raw_outs = pipeline.run_many([texts[i] for i in unique], [audit] * len(unique), max_workers = workers)
+        by_hash = {hashes[i]: raw_out for i, raw_out in zip(unique, raw_outs)}
+
+        batch_out = []
+        for i, item in enumerate(items):
+            filtered = to_jsonable(by_hash[hashes[i]], _DROPPED_KEYS)
+            members = groups[hashes[i]]
+            if len(members) > 1 and filtered.get("audit"):
+                filtered["audit"]["shared_computation"] = shared_computation_note(
+                    hashes[i], items[members[0]].get("id"), [items[m].get("id") for m in members]
+                )
+            batch_out.append({"id": item.get("id"), "name": item.get("name"), "result": filtered})
+        if options.get("output_format") == "compact":
+            return dumps(compact_records(batch_out))
+        return dumps(batch_out)
+
+    raw_out = pipeline.run(text, audit_trail = audit)
+    return dumps(to_jsonable(raw_out, _DROPPED_KEYS))
 
-        audit_options = redact_options_for_audit(options)
-        audit = AuditTrail(
-            run_id = new_run_id(),
-            timestamp_utc = utc_now_iso(),
-            input_hash = sha256_text(json.dumps(audit_options, sort_keys = True)),
-            environment = env_fingerprint(),
-            dictionary = dictionary_audit,
-            retrieval = None,
-            model = None
-        )
 
-        raw_out = pipeline.run(text, audit_trail = audit)
-        dict_out = asdict(raw_out)
+def main() -> int:
+    try:
+        payload = json.load(sys.stdin)
+    except Exception as e:
+        sys.stderr.write(f"Invalid JSON on stdin: {e}\n")
+        return 2
 
-        filtered = drop_key_recursive(dict_out, "input_text")
-        filtered = drop_key_recursive(filtered, "openai_api_key")
-        sys.stdout.write(json.dumps(filtered))
+    options = payload.get("options") or {}
+
+    # metrics_port serves /metrics while the worker runs, metrics_path is a textfile-collector file,
+    # metrics_log_interval_s > 0 writes a JSON summary line to stderr periodically and at exit
+    finish_metrics = export(
+        port = options.get("metrics_port"),
+        path = options.get("metrics_path"),
+        log_interval_s = float(options.get("metrics_log_interval_s", 0.0)),
+    )
+    try:
+        pipeline, dictionary_audit = build_pipeline(options)
+        # revisions_path: JSONL revision store; items are recoded incrementally by id against their previous version
+        revisions = RevisionStore(options["revisions_path"]) if options.get("revisions_path") else None
+        sys.stdout.buffer.write(find_codes(pipeline, dictionary_audit, payload, revisions = revisions))
         return 0
     except Exception as e:
+        ERRORS.inc(stage = "entrypoint", type = type(e).__name__)
         sys.stderr.write(f"Pipeline error: {e}\n")
         return 1
+    finally:
+        finish_metrics()
 
 
 
@@ -0,0 +1,201 @@
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+from aiparser.admission import LANES, AdmissionController, DeadlineExceeded, LaneConfig, Overloaded
+from aiparser.entrypoints.find_codes_entrypoint import build_pipeline, find_codes
+from aiparser.metrics import ERRORS, METRICS, Reporter
+from aiparser.revisions import RevisionStore
+
+
+# Long-running worker: the pipeline is built once and requests are admitted through priority lanes.
+#
+#   POST /find-codes   same payload as find_codes_entrypoint ({"text": ...} or {"items": [...]})
+#                      lane: "priority" field or X-Priority header (interactive | bulk; default interactive
+#                      for "text", bulk for "items"); deadline: "deadline_ms" field or X-Deadline-Ms header
+#   GET  /health       lane queue/running counts
+#   GET  /metrics      Prometheus text format
+#
+# 503 + Retry-After when a lane's queue is full, 504 as soon as the deadline passes: a request still queued
+# is cancelled, one already running finishes in the background and its result is discarded.
+# Request "options" only select the output format; pipeline options are fixed at startup (--options).
+
+_MAX_BODY_BYTES = 64 * 1024 * 1024
+# how long the handler waits for a request without a deadline
+_NO_DEADLINE_WAIT_S = 600.0
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "InferenceServer"
+
+    def do_GET(self) -> None:
+        path = self.path.split("?")[0]
+        if path == "/health":
+            self._send_json(200, {"status": "ok", "lanes": self.server.admission.stats()})
+        elif path == "/metrics":
+            self._send(200, METRICS.render().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        if self.path.split("?")[0] != "/find-codes":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0 or length > _MAX_BODY_BYTES:
+            self._send_json(413 if length > 0 else 400, {"error": f"body must be 1..{_MAX_BODY_BYTES} bytes"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length))
+            if not isinstance(payload, dict):
+                raise ValueError("payload must be a JSON object")
+            lane = self._lane(payload)
+            deadline_s = self._deadline_s(payload)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        server = self.server
+        try:
+            # one admission slot is one unit of compute, so a bulk request does not fan out to more threads
+            future = server.admission.submit(
+                lane,
+                lambda: find_codes(server.pipeline, server.dictionary_audit, payload, max_workers = 1, revisions = server.revisions),
+                deadline_s = deadline_s,
+            )
+        except Overloaded as e:
+            self._send_json(503, {"error": str(e), "lane": lane}, headers = {"Retry-After": str(int(e.retry_after_s + 0.999))})
+            return
+
+        # wait until the deadline (counted from admission, as the queue does), then give up on the request
+        wait_s = server.admission.deadline_s(lane, deadline_s)
+        try:
+            try:
+                body = future.result(timeout = wait_s if wait_s is not None else _NO_DEADLINE_WAIT_S)
+            except FutureTimeout:
+                if future.cancel():
+                    raise DeadlineExceeded(f"Deadline passed after {wait_s}s in the {lane} queue.") from None
+                if not future.done():
+                    raise
+                # finished, or failed by the queue's own deadline sweep, just as the wait ran out
+                body = future.result()
+        except DeadlineExceeded as e:
+            self._send_json(504, {"error": str(e), "lane": lane})
+            return
+        except FutureTimeout:
+            self._send_json(504, {"error": "request did not finish before its deadline", "lane": lane})
+            return
+        except Exception as e:
+            ERRORS.inc(stage = "server", type = type(e).__name__)
+            self._send_json(500, {"error": f"Pipeline error: {e}"})
+            return
+        self._send(200, body, "application/json")
+
+    def _lane(self, payload: Dict[str, Any]) -> str:
+        lane = payload.get("priority") or self.headers.get("X-Priority") or ("bulk" if isinstance(payload.get("items"), list) else "interactive")
+        lane = str(lane).strip().lower()
+        if lane not in LANES:
+            raise ValueError(f"priority must be one of: {', '.join(LANES)}")
+        return lane
+
+    def _deadline_s(self, payload: Dict[str, Any]) -> Optional[float]:
+        value = payload.get("deadline_ms")
+        if value is None:
+            value = self.headers.get("X-Deadline-Ms")
+        if value is None:
+            return None
+        try:
+            deadline_ms = float(value)
+        except (TypeError, ValueError):
+            raise ValueError("deadline_ms must be a number of milliseconds") from None
+        # an explicit 0 is an error, not "no deadline"; the comparison also rejects NaN
+        if not deadline_ms > 0:
+            raise ValueError("deadline_ms must be positive")
+        return deadline_ms / 1000.0
+
+    def _send_json(self, status: int, obj: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        self._send(status, json.dumps(obj).encode("utf-8"), "application/json", headers)
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class InferenceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, options: Dict[str, Any], admission: AdmissionController) -> None:
+        self.pipeline, self.dictionary_audit = build_pipeline(options)
+        self.revisions = RevisionStore(options["revisions_path"]) if options.get("revisions_path") else None
+        self.admission = admission
+        super().__init__(address, _Handler)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description = "Serve code inference over HTTP with priority lanes and admission control.")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8765)
+    parser.add_argument("--options", default = None, help = "JSON file with pipeline options (same keys as the entrypoint's options)")
+    parser.add_argument("--workers", type = int, default = 4, help = "documents/requests computed at once")
+    parser.add_argument("--bulk-workers", type = int, default = None, help = "workers bulk requests may occupy (default: workers - 1)")
+    parser.add_argument("--interactive-queue", type = int, default = None, help = "queued interactive requests before 503 (default: 4 x workers)")
+    parser.add_argument("--bulk-queue", type = int, default = 16, help = "queued bulk requests before 503")
+    parser.add_argument("--interactive-deadline", type = float, default = 30.0, help = "default seconds an interactive request may wait to start")
+    parser.add_argument("--bulk-deadline", type = float, default = 0.0, help = "default seconds a bulk request may wait to start (0: no deadline)")
+    parser.add_argument("--metrics-log-interval", type = float, default = 60.0, help = "seconds between JSON metrics summaries on stderr (0 disables)")
+    args = parser.parse_args()
+
+    options: Dict[str, Any] = {}
+    if args.options:
+        with open(args.options, "r", encoding = "utf-8") as f:
+            options = json.load(f)
+
+    workers = args.workers
+    try:
+        admission = AdmissionController(workers, {
+            "interactive": LaneConfig(
+                max_queue = args.interactive_queue or 4 * workers,
+                max_running = workers,
+                default_deadline_s = args.interactive_deadline or None,
+            ),
+            "bulk": LaneConfig(
+                max_queue = args.bulk_queue,
+                max_running = args.bulk_workers if args.bulk_workers is not None else workers - 1,
+                default_deadline_s = args.bulk_deadline or None,
+            ),
+        })
+    except ValueError as e:
+        parser.error(str(e))
+
+    start = time.perf_counter()
+    server = InferenceServer((args.host, args.port), options, admission)
+    sys.stderr.write(f"Pipeline ready in {time.perf_counter() - start:.1f}s; serving on http://{args.host}:{server.server_address[1]}\n")
+
+    reporter = Reporter(args.metrics_log_interval).start() if args.metrics_log_interval > 0 else None
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        admission.close(wait = False)
+        if reporter is not None:
+            reporter.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,86 @@
+import argparse
+import csv
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Set
+
+from aiparser.csv_loader import CsvSchema, load_concepts_from_csv
+from aiparser.input_csv_loader import InputCsvSchema, load_input_data_from_csv
+from aiparser.registry import create_retriever
+from aiparser.reranker import LogisticReranker, candidate_features
+from aiparser.text_utils import analyze
+
+
+# Trains the candidate reranker offline: every retrieved code of a labeled policy is one row,
+# positive when the code is among the policy's labeled HCPCS / ICD-10 codes.
+
+def load_labels(path: Path) -> Dict[str, Set[str]]:
+    labels: Dict[str, Set[str]] = {}
+    with open(path, "r", encoding = "utf-8", newline = "") as f:
+        for row in csv.DictReader(f):
+            codes = set()
+            for column in ("hcpcs_codes", "icd_10_codes"):
+                codes.update(c.strip() for c in (row.get(column) or "").split("|") if c.strip())
+            labels[row["policy_id"]] = codes
+    return labels
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    labels = load_labels(Path(args.labels))
+    inputs = [i for i in load_input_data_from_csv(args.texts, InputCsvSchema(id_column = args.id_column, name_column = args.name_column, text_column = args.text_column)) if i.id in labels]
+    if not inputs:
+        raise ValueError(f"No policy in {args.texts} has labels in {args.labels}.")
+
+    retriever = create_retriever(args.retriever)
+    retriever.index(load_concepts_from_csv(Path(args.dictionary), CsvSchema()))
+
+    rows: List[List[float]] = []
+    targets: List[int] = []
+    for input in inputs:
+        stream = analyze(input.text)
+        retrieved = [r for r in retriever.retrieve(stream.text, top_k = args.top_k, tokens = stream) if r.score >= args.min_score]
+        for candidate in candidate_features(stream, retrieved):
+            rows.append(candidate.features)
+            targets.append(1 if candidate.code in labels[input.id] else 0)
+
+    reranker = LogisticReranker.fit(rows, targets, epochs = args.epochs, learning_rate = args.learning_rate, l2 = args.l2)
+    reranker.training.update({"documents": len(inputs), "retriever": args.retriever, "top_k": args.top_k})
+    reranker.save(args.out)
+
+    predictions = [reranker.probability(row) >= 0.5 for row in rows]
+    true_pos = sum(1 for p, y in zip(predictions, targets) if p and y)
+    return {
+        "documents": len(inputs),
+        "rows": len(rows),
+        "positives": sum(targets),
+        "precision": round(true_pos / max(1, sum(predictions)), 4),
+        "recall": round(true_pos / max(1, sum(targets)), 4),
+        "weights": dict(zip(reranker.feature_names, (round(w, 4) for w in reranker.weights))),
+        "out": str(args.out),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description = "Train the candidate reranker from labeled policies.")
+    parser.add_argument("--labels", default = "aiparser/data/policies_cleaned_labels.csv")
+    parser.add_argument("--texts", default = "aiparser/data/policies_cleaned_mini.csv", help = "policy texts, joined to the labels on id = policy_id")
+    parser.add_argument("--id-column", default = "id")
+    parser.add_argument("--name-column", default = "name")
+    parser.add_argument("--text-column", default = "text")
+    parser.add_argument("--dictionary", default = "aiparser/data/hcpcs.csv")
+    parser.add_argument("--retriever", default = "token", help = "registered retriever backend used at inference time")
+    parser.add_argument("--top-k", type = int, default = 50)
+    parser.add_argument("--min-score", type = float, default = 0.005)
+    parser.add_argument("--epochs", type = int, default = 500)
+    parser.add_argument("--learning-rate", type = float, default = 0.5)
+    parser.add_argument("--l2", type = float, default = 0.01)
+    parser.add_argument("--out", default = "reranker.json")
+    args = parser.parse_args()
+
+    sys.stdout.write(json.dumps(run(args), indent = 2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
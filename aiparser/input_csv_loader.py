@@ -1,13 +1,24 @@
 from __future__ import annotations
 
 import csv
+import glob
+import gzip
+import hashlib
+import io
 import sys
-from dataclasses import dataclass
-from typing import List, Dict, Optional
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Deque, Iterator, List, Optional, Sequence
 
 from .models import Input
 
 
+# files picked up when a directory is given as input
+INPUT_SUFFIXES = (".csv", ".csv.gz")
+
+
 @dataclass
 class InputCsvSchema:
     id_column: str = "policy_id"
@@ -15,34 +26,126 @@ class InputCsvSchema:
     text_column: str = "cleaned_policy_text"
 
 
-def load_input_data_from_csv(input_csv_path: str, schema: InputCsvSchema, *, encoding: str = "utf-8") -> List[Dict[str, str]]:
-    inputs: List[Input] = []
+@dataclass
+class InputFile:
+    # one parsed input file; sha256 is over the bytes as received (compressed if gzipped), for provenance
+    path: str
+    sha256: str
+    inputs: List[Input] = field(default_factory = list)
+    skipped_rows: int = 0
+
+
+def expand_input_paths(specs: Sequence[str]) -> List[Path]:
+    """
+    Files, directories (every *.csv / *.csv.gz below them) and glob patterns, in a stable order without repeats.
+    """
+    paths: List[Path] = []
+    for spec in specs:
+        path = Path(spec)
+        if path.is_dir():
+            matches = sorted(p for p in path.rglob("*") if p.is_file() and p.name.endswith(INPUT_SUFFIXES))
+        elif any(c in str(spec) for c in "*?["):
+            matches = sorted(Path(p) for p in glob.glob(str(spec), recursive = True) if Path(p).is_file())
+        elif path.is_file():
+            matches = [path]
+        else:
+            raise FileNotFoundError(f"Input '{spec}' does not exist.")
+        if not matches:
+            raise FileNotFoundError(f"No input files match '{spec}'.")
+        paths.extend(matches)
+    return list(dict.fromkeys(paths))
+
+
+def read_input_file(input_csv_path: Path | str, schema: InputCsvSchema, *, encoding: str = "utf-8") -> InputFile:
     csv.field_size_limit(100 * 1024 * 1024)  # Increase field size limit to handle large text fields
 
-    with open(input_csv_path, "r", encoding = encoding, newline="") as csvfile:
-        reader = csv.DictReader(csvfile)
-        if not reader.fieldnames:
-            raise ValueError("CSV file must have a header row with column names.")
-        missing_columns = [col for col in [schema.id_column, schema.name_column, schema.text_column] if col not in reader.fieldnames]
-        if missing_columns:
-            raise ValueError(f"CSV file is missing required columns: {', '.join(missing_columns)}")
+    path = str(input_csv_path)
+    raw = Path(path).read_bytes()
+    data = gzip.decompress(raw) if path.endswith(".gz") else raw
+    parsed = InputFile(path = path, sha256 = hashlib.sha256(raw).hexdigest())
+
+    reader = csv.DictReader(io.StringIO(data.decode(encoding), newline = ""))
+    if not reader.fieldnames:
+        raise ValueError(f"{path}: CSV file must have a header row with column names.")
+    missing_columns = [col for col in [schema.id_column, schema.name_column, schema.text_column] if col not in reader.fieldnames]
+    if missing_columns:
+        raise ValueError(f"{path}: CSV file is missing required columns: {', '.join(missing_columns)}")
 
-        for row_index, row in enumerate(reader, start=2):  # Start at 2 to account for header row
-            input_id = row.get(schema.id_column or "").strip()
-            name = row.get(schema.name_column or "").strip()
-            text = row.get(schema.text_column or "").strip()
+    for row_index, row in enumerate(reader, start=2):  # Start at 2 to account for header row
+        input_id = (row.get(schema.id_column) or "").strip()
+        name = (row.get(schema.name_column) or "").strip()
+        text = (row.get(schema.text_column) or "").strip()
 
-            if not id:
-                sys.stderr.write(f"Warning: Missing id in row {row_index}. Skipping this row.")
-                continue
-            if not text:
-                sys.stderr.write(f"Warning: Missing text in row {row_index}. Skipping this row.")
-                continue
+        if not input_id:
+            sys.stderr.write(f"Warning: Missing id in {path} row {row_index}. Skipping this row.")
+            parsed.skipped_rows += 1
+            continue
+        if not text:
+            sys.stderr.write(f"Warning: Missing text in {path} row {row_index}. Skipping this row.")
+            parsed.skipped_rows += 1
+            continue
 
-            inputs.append(Input(id=input_id, name=name, text=text))
+        parsed.inputs.append(Input(id=input_id, name=name, text=text))
+    return parsed
 
 
+def load_input_data_from_csv(input_csv_path: Path | str, schema: InputCsvSchema, *, encoding: str = "utf-8") -> List[Input]:
+    inputs = read_input_file(input_csv_path, schema, encoding = encoding).inputs
     if not inputs:
         raise ValueError("No valid inputs were loaded from the CSV file. Please check the file content and schema.")
-    
-    return inputs
\ No newline at end of file
+    return inputs
+
+
+class InputFileQueue:
+    """
+    Parses input files in worker processes and yields them in the given order. At most max_pending files are
+    parsed ahead of the consumer, so memory stays bounded while the pipeline works on earlier files.
+    Parsing starts on construction, so it overlaps whatever the caller does before iterating.
+    """
+
+    def __init__(self, paths: Sequence[Path], schema: InputCsvSchema, *, workers: int = 4, max_pending: Optional[int] = None, encoding: str = "utf-8") -> None:
+        self.paths = list(paths)
+        self._schema = schema
+        self._encoding = encoding
+        self._next = 0
+        self._pending: Deque[Future] = deque()
+        self._closed = False
+        # a single file is read in-process; worker startup would cost more than it saves
+        self._executor = ProcessPoolExecutor(max_workers = workers) if workers > 1 and len(self.paths) > 1 else None
+        self._max_pending = max(1, max_pending if max_pending is not None else 2 * max(1, workers))
+        self._fill()
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __iter__(self) -> Iterator[InputFile]:
+        try:
+            if self._closed:
+                return
+            if self._executor is None:
+                for path in self.paths:
+                    yield read_input_file(path, self._schema, encoding = self._encoding)
+                return
+            while self._pending:
+                parsed = self._pending.popleft().result()
+                self._fill()
+                yield parsed
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        # idempotent; a closed queue yields nothing more
+        self._closed = True
+        if self._executor is not None:
+            for future in self._pending:
+                future.cancel()
+            self._pending.clear()
+            self._executor.shutdown(wait = True)
+            self._executor = None
+
+    def _fill(self) -> None:
+        if self._executor is None:
+            return
+        while len(self._pending) < self._max_pending and self._next < len(self.paths):
+            self._pending.append(self._executor.submit(read_input_file, self.paths[self._next], self._schema, encoding = self._encoding))
+            self._next += 1
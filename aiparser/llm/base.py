@@ -2,12 +2,35 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Any, Dict, List, Optional
 
-from ..models import RetrievedConcept, InferredCode
+from ..models import RetrievedConcept, InferredCode, InferenceRequest, ModelAudit
 
 
 class CodeInferenceModel(ABC):
     @abstractmethod
-    def infer_codes(self, input_text: str, retrieved_concepts: List[RetrievedConcept]) -> List[InferredCode]:
-        ...
\ No newline at end of file
+    def infer_codes(
+        self,
+        input_text: str,
+        retrieved_concepts: List[RetrievedConcept],
+        *,
+        audit: Optional[ModelAudit] = None,
+    ) -> List[InferredCode]:
+        # implementations may record per-call decisions on audit (e.g. audit.params)
+        ...
+
+    def settings(self) -> Dict[str, Any]:
+        # configuration that changes what infer_codes() returns; part of the pipeline fingerprint
+        return {}
+
+    @property
+    def supports_packing(self) -> bool:
+        # False makes the pipeline send every document on its own (as with pack_max_chars = 0)
+        return True
+
+    def infer_codes_batch(self, requests: List[InferenceRequest]) -> Dict[str, List[InferredCode]]:
+        # models that can pack several documents into one call override this
+        return {
+            request.doc_id: self.infer_codes(request.input_text, request.retrieved, audit = request.audit)
+            for request in requests
+        }
@@ -1,15 +1,21 @@
 from __future__ import annotations
 
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from .base import CodeInferenceModel
-from ..models import RetrievedConcept, InferredCode
+from ..models import RetrievedConcept, InferredCode, ModelAudit
 
 
 class MockCodeInferenceModel(CodeInferenceModel):
 
 
-    def infer_codes(self, input_text: str, retrieved_concepts: List[RetrievedConcept]) -> List[InferredCode]:
+    def infer_codes(
+        self,
+        input_text: str,
+        retrieved_concepts: List[RetrievedConcept],
+        *,
+        audit: Optional[ModelAudit] = None,
+    ) -> List[InferredCode]:
         by_code: Dict[str, List[RetrievedConcept]] = {}
         for rc in retrieved_concepts:
             by_code.setdefault(rc.concept.code, []).append(rc)
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+import types
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+
+CHAT_COMPLETIONS_ENDPOINT = "/v1/chat/completions"
+
+_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def _write_json_atomic(path: Path, data: Dict[str, Any]) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding = "utf-8") as f:
+        json.dump(data, f, indent = 2)
+    os.replace(tmp, path)
+
+
+class BatchJob:
+    """
+    Offline OpenAI batch job rooted in a job directory.
+    Every step records its progress in state.json, so a restarted process resumes where it stopped:
+    requests already written are not rewritten, a submitted batch is not resubmitted,
+    and downloaded results are reused.
+    """
+
+    def __init__(
+        self,
+        job_dir: Path | str,
+        client: Any,
+        *,
+        endpoint: str = CHAT_COMPLETIONS_ENDPOINT,
+        completion_window: str = "24h",
+        poll_interval_s: float = 30.0,
+    ) -> None:
+        self.job_dir = Path(job_dir)
+        self.job_dir.mkdir(parents = True, exist_ok = True)
+        self._client = client
+        self._endpoint = endpoint
+        self._completion_window = completion_window
+        self._poll_interval_s = max(0.0, float(poll_interval_s))
+
+        self.requests_path = self.job_dir / "requests.jsonl"
+        self.results_path = self.job_dir / "results.jsonl"
+        self.errors_path = self.job_dir / "errors.jsonl"
+        self._state_path = self.job_dir / "state.json"
+        self.state: Dict[str, Any] = self._load_state()
+
+    @property
+    def batch_id(self) -> Optional[str]:
+        return self.state.get("batch_id")
+
+    def check_inputs(self, key: Dict[str, Any]) -> None:
+        """
+        Ties the job directory to one set of inputs: the first call records `key` in state.json, later runs over the
+        same directory must pass an equal key, so prepared requests and results are never reused for other inputs.
+        """
+        recorded = self.state.get("inputs")
+        if recorded is None:
+            if self.state.get("requests_written"):
+                raise ValueError(f"Batch job {self.job_dir} was prepared without a record of its inputs; use a new job directory.")
+            self._save_state(inputs = key)
+            return
+        differing = sorted(k for k in set(recorded) | set(key) if recorded.get(k) != key.get(k))
+        if differing:
+            raise ValueError(f"Batch job {self.job_dir} was prepared for other inputs ({', '.join(differing)} differ); use a new job directory.")
+
+    def write_requests(self, requests: Iterable[Tuple[str, Dict[str, Any]]]) -> Path:
+        if self.state.get("requests_written"):
+            return self.requests_path
+
+        count = 0
+        tmp = self.requests_path.with_name(self.requests_path.name + ".tmp")
+        with open(tmp, "w", encoding = "utf-8") as f:
+            for custom_id, body in requests:
+                line = {"custom_id": custom_id, "method": "POST", "url": self._endpoint, "body": body}
+                f.write(json.dumps(line, ensure_ascii = False) + "\n")
+                count += 1
+        os.replace(tmp, self.requests_path)
+
+        self._save_state(requests_written = True, request_count = count)
+        return self.requests_path
+
+    def submit(self) -> str:
+        if self.batch_id:
+            return self.batch_id
+        if not self.state.get("requests_written"):
+            raise RuntimeError("Batch requests must be written before the job is submitted.")
+
+        if not self.state.get("input_file_id"):
+            with open(self.requests_path, "rb") as f:
+                uploaded = self._client.files.create(file = f, purpose = "batch")
+            self._save_state(input_file_id = uploaded.id)
+
+        batch = self._client.batches.create(
+            input_file_id = self.state["input_file_id"],
+            endpoint = self._endpoint,
+            completion_window = self._completion_window,
+            metadata = {"job_dir": self.job_dir.name},
+        )
+        self._save_state(batch_id = batch.id, status = batch.status)
+        return batch.id
+
+    def poll(self) -> str:
+        batch = self._client.batches.retrieve(self.batch_id)
+        self._save_state(
+            status = batch.status,
+            output_file_id = getattr(batch, "output_file_id", None),
+            error_file_id = getattr(batch, "error_file_id", None),
+        )
+        return batch.status
+
+    def wait(self, timeout_s: Optional[float] = None) -> str:
+        start = time.monotonic()
+        while True:
+            # always poll at least once so output/error file ids are recorded
+            status = self.poll()
+            if status in _TERMINAL_STATUSES:
+                return status
+            if timeout_s is not None and time.monotonic() - start > timeout_s:
+                raise TimeoutError(f"Batch {self.batch_id} still '{status}' after {timeout_s} seconds.")
+            sys.stderr.write(f"Batch {self.batch_id} status: {status}\n")
+            time.sleep(self._poll_interval_s)
+
+    def results(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Map custom_id -> {"content": str} for successful requests or {"error": ...} for failed ones.
+        """
+        if self.state.get("status") != "completed":
+            raise RuntimeError(f"Batch {self.batch_id} is '{self.state.get('status')}', not completed.")
+
+        if not self.state.get("results_downloaded"):
+            self._download(self.state.get("output_file_id"), self.results_path)
+            self._download(self.state.get("error_file_id"), self.errors_path)
+            self._save_state(results_downloaded = True)
+
+        out: Dict[str, Dict[str, Any]] = {}
+        for path in (self.results_path, self.errors_path):
+            if not path.exists():
+                continue
+            with open(path, "r", encoding = "utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    out[record["custom_id"]] = self._result_entry(record)
+        return out
+
+    def _download(self, file_id: Optional[str], path: Path) -> None:
+        if not file_id:
+            return
+        content = self._client.files.content(file_id)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding = "utf-8") as f:
+            f.write(content.text)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _result_entry(record: Dict[str, Any]) -> Dict[str, Any]:
+        response = record.get("response") or {}
+        if record.get("error") or response.get("status_code") != 200:
+            return {"error": record.get("error") or response.get("body")}
+        body = response.get("body") or {}
+        choices = body.get("choices") or [{}]
+        return {
+            "content": ((choices[0].get("message") or {}).get("content") or "").strip(),
+            "usage": body.get("usage"),
+        }
+
+    def _load_state(self) -> Dict[str, Any]:
+        if self._state_path.exists():
+            with open(self._state_path, "r", encoding = "utf-8") as f:
+                return json.load(f)
+        return {}
+
+    def _save_state(self, **updates: Any) -> None:
+        self.state.update(updates)
+        _write_json_atomic(self._state_path, self.state)
+
+
+class LocalBatchClient:
+    """
+    In-process stand-in for the OpenAI files/batches surface used by BatchJob.
+    Requests are answered by `responder(request_line) -> chat completion body` when the batch is created.
+    """
+
+    def __init__(self, root: Path | str, responder: Callable[[Dict[str, Any]], Dict[str, Any]]) -> None:
+        self._root = Path(root)
+        self._root.mkdir(parents = True, exist_ok = True)
+        self._responder = responder
+        self.files = types.SimpleNamespace(create = self._create_file, content = self._file_content)
+        self.batches = types.SimpleNamespace(create = self._create_batch, retrieve = self._retrieve_batch)
+
+    def _create_file(self, *, file: Any, purpose: str) -> Any:
+        file_id = f"file-local-{uuid.uuid4().hex}"
+        (self._root / file_id).write_bytes(file.read())
+        return types.SimpleNamespace(id = file_id, purpose = purpose)
+
+    def _file_content(self, file_id: str) -> Any:
+        return types.SimpleNamespace(text = (self._root / file_id).read_text(encoding = "utf-8"))
+
+    def _create_batch(self, *, input_file_id: str, endpoint: str, completion_window: str, metadata: Optional[Dict[str, Any]] = None) -> Any:
+        batch_id = f"batch-local-{uuid.uuid4().hex}"
+        output_file_id = f"file-local-{uuid.uuid4().hex}"
+
+        with open(self._root / input_file_id, "r", encoding = "utf-8") as src, open(self._root / output_file_id, "w", encoding = "utf-8") as dst:
+            for line in src:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                try:
+                    response = {"status_code": 200, "request_id": uuid.uuid4().hex, "body": self._responder(request)}
+                    error = None
+                except Exception as e:
+                    response, error = None, {"code": type(e).__name__, "message": str(e)}
+                dst.write(json.dumps({"id": uuid.uuid4().hex, "custom_id": request["custom_id"], "response": response, "error": error}) + "\n")
+
+        batch = {"id": batch_id, "status": "completed", "output_file_id": output_file_id, "error_file_id": None}
+        _write_json_atomic(self._root / f"{batch_id}.json", batch)
+        return types.SimpleNamespace(**batch)
+
+    def _retrieve_batch(self, batch_id: str) -> Any:
+        with open(self._root / f"{batch_id}.json", "r", encoding = "utf-8") as f:
+            return types.SimpleNamespace(**json.load(f))
@@ -1,14 +1,18 @@
 from __future__ import annotations
 
+import dataclasses
 import json
 import os
 import sys
-from typing import Any, Dict, List, Optional
+import threading
+from typing import Any, Dict, List, Optional, Tuple
 
 from openai import OpenAI
 
 from .base import CodeInferenceModel
-from ..models import RetrievedConcept, InferredCode
+from ..metrics import RETRIES, record_usage
+from ..models import RetrievedConcept, InferredCode, InferenceRequest, ModelAudit
+from .prompt_budget import PromptBudget, estimate_tokens, select_passages, size_candidates, text_token_budget
 
 
 DEFAULT_PROMPT = (
@@ -45,34 +49,21 @@ def build_infer_schema(name: str = "inferred_codes_response") -> Dict[str, Any]:
         },
     }
 
-def _candidates_for_prompt(retrieved: List[RetrievedConcept], max_codes: int = 30, max_per_code: int = 3):
-    """
-    Convert RetrievedConcept list into compact candidates to keep prompt size bounded.
-    Group by code, keep top concepts per code by retrieval score.
-    """
-    by_code: Dict[str, List[RetrievedConcept]] = {}
-    for retrieved_concept in retrieved:
-        code = retrieved_concept.concept.code
-        by_code.setdefault(code, []).append(retrieved_concept)
-
-    # sort each code bucket by score desc, keep top per code
-    items = []
-    for code, concepts in by_code.items():
-        concepts_sorted = sorted(concepts, key = lambda x: x.score, reverse = True)[:max_per_code]
-        items.append(
-            {
-                "code": code,
-                "concepts": [c.concept.concept for c in concepts_sorted],
-                "best_retrieval_score": float(concepts_sorted[0].score) if concepts_sorted else 0.0,
-            }
-        )
-
-    items.sort(key = lambda x: x["best_retrieval_score"], reverse = True)
+def _inferred_items_schema() -> Dict[str, Any]:
+    return build_infer_schema()["schema"]["properties"]["inferred"]
 
-    for r in items:
-        r.pop("best_retrieval_score", None)
-
-    return items[:max_codes]
+def build_packed_infer_schema(doc_ids: List[str], name: str = "packed_inferred_codes_response") -> Dict[str, Any]:
+    # one required property per document id, each holding that document's inferred array
+    return {
+        "name": name,
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {doc_id: _inferred_items_schema() for doc_id in doc_ids},
+            "required": list(doc_ids),
+        },
+    }
 
 def _best_retrieval_score_by_code(retrieved: List[RetrievedConcept]) -> Dict[str, float]:
     best: Dict[str, float] = {}
@@ -139,6 +130,49 @@ def _build_prompt(input_text: str, candidates: List[Any]) -> str:
         "code (string), confidence (number 0..1), score (number 0..1), matched_concepts (string[]), justification (string).\n"
     )
 
+def _build_packed_prompt(documents: List[Tuple[str, str, List[Any]]]) -> str:
+    sections = []
+    for doc_id, input_text, candidates in documents:
+        sections.append(
+            f"DOCUMENT {doc_id}\n"
+            "TEXT:\n"
+            f"{input_text}\n"
+            "CANDIDATE CODES AND CONCEPTS:\n"
+            f"{json.dumps(candidates, ensure_ascii=False)}\n"
+        )
+    return (
+        "Each document below has its own text and candidate list. Code every document independently, "
+        "choosing only from that document's candidates.\n\n"
+        + "\n".join(sections)
+        + "\nReturn one JSON object keyed by document id. Each value is an array of items with:\n"
+        "code (string), confidence (number 0..1), score (number 0..1), matched_concepts (string[]), justification (string).\n"
+    )
+
+def _parse_inferred(items: List[Dict[str, Any]], best_retrieved_scores: Dict[str, float]) -> List[InferredCode]:
+    out: List[InferredCode] = []
+    for item in items:
+        code = str(item.get("code", "")).strip()
+        if not code:
+            continue
+
+        confidence = float(item.get("confidence", 0.0))
+        score = float(item.get("score", best_retrieved_scores.get(code, 0.0)))
+        matched_concepts = list(item.get("matched_concepts", []) or [])
+        justification = str(item.get("justification", "")).strip()
+
+        out.append(
+            InferredCode(
+                code = code,
+                confidence = round(confidence, 2),
+                score = score,
+                matched_concepts = matched_concepts,
+                justification = justification
+            )
+        )
+    
+    out.sort(key = lambda x: x.score, reverse = True)
+    return out
+
 
 class OpenAIInferenceModel(CodeInferenceModel):
 
@@ -150,64 +184,164 @@ class OpenAIInferenceModel(CodeInferenceModel):
         timeout_s: float = 120.0,
         custom_prompt: Optional[str] = None,
         custom_schema: Optional[Dict[str, Any]] = None,
+        prompt_budget: Optional[PromptBudget] = None,
     ) -> None:
         self._model = _set_model(model)
         self._prompt = _set_prompt(custom_prompt)
         self._schema = _set_schema(custom_schema)
+        # packed calls answer in the packed schema, so a custom schema is only honoured by single calls
+        self._custom_schema = self._schema is custom_schema
         self._api_key = _set_api_key(api_key)
         self._base_url = _set_base_url(base_url)
         self._timeout_s = timeout_s
+        self._budget = prompt_budget or PromptBudget()
+
+        self._client: Optional[OpenAI] = None
+        self._client_lock = threading.Lock()
 
+    def settings(self) -> Dict[str, Any]:
+        return {
+            "model": self._model,
+            "prompt": self._prompt,
+            "schema": self._schema,
+            "budget": dataclasses.asdict(self._budget),
+        }
 
-    def infer_codes(self, input_text: str, retrieved_concepts: List[RetrievedConcept]) -> List[InferredCode]:
-        self._client = _set_client(self._api_key, self._base_url)
-        
-        candidates = _candidates_for_prompt(
-            retrieved_concepts,
-            max_codes=30,
-            max_per_code=3,
+    @property
+    def client(self) -> OpenAI:
+        return self._get_client()
+
+    def _get_client(self) -> OpenAI:
+        # created once on first use and shared by every thread calling infer_codes
+        with self._client_lock:
+            if self._client is None:
+                self._client = _set_client(self._api_key, self._base_url)
+            return self._client
+
+
+    def infer_codes(
+        self,
+        input_text: str,
+        retrieved_concepts: List[RetrievedConcept],
+        *,
+        audit: Optional[ModelAudit] = None,
+    ) -> List[InferredCode]:
+        client = self._get_client()
+
+        request = self.build_chat_request(input_text, retrieved_concepts, audit = audit)
+        response = client.chat.completions.create(**request, timeout = self._timeout_s)
+        record_usage(getattr(response, "usage", None))
+
+        content = (response.choices[0].message.content or "").strip()
+        return self.parse_chat_content(content, retrieved_concepts)
+
+    def build_chat_request(
+        self,
+        input_text: str,
+        retrieved_concepts: List[RetrievedConcept],
+        *,
+        audit: Optional[ModelAudit] = None,
+    ) -> Dict[str, Any]:
+        # chat.completions body, shared by the interactive path and offline batch jobs
+        candidates, candidate_decisions = size_candidates(retrieved_concepts, self._budget)
+
+        prompt_text, text_decisions = select_passages(
+            input_text,
+            candidates,
+            text_token_budget(candidates, self._prompt, self._budget),
+            self._budget,
         )
-        best_retrieved_scores = _best_retrieval_score_by_code(retrieved_concepts)
+        use_case_prompt = _build_prompt(prompt_text, candidates)
 
-        use_case_prompt = _build_prompt(input_text, candidates)
+        if audit is not None:
+            audit.params = {
+                **(audit.params or {}),
+                "temperature": 0.0,
+                "max_prompt_tokens": self._budget.max_prompt_tokens,
+                "prompt_tokens_estimate": estimate_tokens(self._prompt) + estimate_tokens(use_case_prompt),
+                **candidate_decisions,
+                **text_decisions,
+            }
 
-        response = self._client.chat.completions.create(
-            model = self._model,
-            temperature = 0.0,
-            response_format = {"type": "json_schema", "json_schema": self._schema},
-            messages = [
+        return {
+            "model": self._model,
+            "temperature": 0.0,
+            "response_format": {"type": "json_schema", "json_schema": self._schema},
+            "messages": [
                 {"role": "system", "content": self._prompt},
                 {"role": "user", "content": use_case_prompt},
             ],
-            timeout = self._timeout_s,
-        )
+        }
 
-        content = (response.choices[0].message.content or "").strip()
-        
+    def parse_chat_content(self, content: str, retrieved_concepts: List[RetrievedConcept]) -> List[InferredCode]:
         # Strict JSON parse TODO add better error handling and validation
         data = json.loads(content)
-        inferred = data.get("inferred", []) or []
+        return _parse_inferred(data.get("inferred", []) or [], _best_retrieval_score_by_code(retrieved_concepts))
 
-        out: List[InferredCode] = []
-        for item in inferred:
-            code = str(item.get("code", "")).strip()
-            if not code:
-                continue
+    @property
+    def supports_packing(self) -> bool:
+        return not self._custom_schema
 
-            confidence = float(item.get("confidence", 0.0))
-            score = float(item.get("score", best_retrieved_scores.get(code, 0.0)))
-            matched_concepts = list(item.get("matched_concepts", []) or [])
-            justification = str(item.get("justification", "")).strip()
-
-            out.append(
-                InferredCode(
-                    code = code,
-                    confidence = round(confidence, 2),
-                    score = score,
-                    matched_concepts = matched_concepts,
-                    justification = justification
-                )
+    def infer_codes_batch(self, requests: List[InferenceRequest]) -> Dict[str, List[InferredCode]]:
+        if len(requests) <= 1 or self._custom_schema:
+            return super().infer_codes_batch(requests)
+
+        client = self._get_client()
+
+        # short ids keep the schema keys safe regardless of caller document ids
+        pack_ids = [f"doc{i}" for i in range(len(requests))]
+        documents = []
+        for pack_id, request in zip(pack_ids, requests):
+            # each document is sized and trimmed exactly as its own single call would be
+            candidates, candidate_decisions = size_candidates(request.retrieved, self._budget)
+            prompt_text, text_decisions = select_passages(
+                request.input_text,
+                candidates,
+                text_token_budget(candidates, self._prompt, self._budget),
+                self._budget,
             )
-        
-        out.sort(key = lambda x: x.score, reverse = True)
-        return out
\ No newline at end of file
+            documents.append((pack_id, prompt_text, candidates))
+            if request.audit is not None:
+                request.audit.params = {
+                    **(request.audit.params or {}),
+                    "temperature": 0.0,
+                    "packed": True,
+                    "pack_size": len(requests),
+                    "pack_slot": pack_id,
+                    "max_prompt_tokens": self._budget.max_prompt_tokens,
+                    **candidate_decisions,
+                    **text_decisions,
+                }
+
+        try:
+            response = client.chat.completions.create(
+                model = self._model,
+                temperature = 0.0,
+                response_format = {"type": "json_schema", "json_schema": build_packed_infer_schema(pack_ids)},
+                messages = [
+                    {"role": "system", "content": self._prompt},
+                    {"role": "user", "content": _build_packed_prompt(documents)},
+                ],
+                timeout = self._timeout_s,
+            )
+            record_usage(getattr(response, "usage", None))
+            data = json.loads((response.choices[0].message.content or "").strip())
+            if not isinstance(data, dict):
+                raise ValueError("Packed response root is not an object")
+        except (json.JSONDecodeError, ValueError) as e:
+            sys.stderr.write(f"Packed inference response unusable ({e}); falling back to single calls.\n")
+            RETRIES.inc(operation = "packed_inference", type = type(e).__name__)
+            data = {}
+
+        out: Dict[str, List[InferredCode]] = {}
+        for pack_id, request in zip(pack_ids, requests):
+            items = data.get(pack_id)
+            if isinstance(items, list):
+                out[request.doc_id] = _parse_inferred(items, _best_retrieval_score_by_code(request.retrieved))
+                continue
+
+            # missing or malformed slot, recode that document on its own
+            if request.audit is not None:
+                request.audit.params = {**(request.audit.params or {}), "packed": False, "pack_fallback": True}
+            out[request.doc_id] = self.infer_codes(request.input_text, request.retrieved, audit = request.audit)
+        return out
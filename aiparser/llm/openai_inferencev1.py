@@ -7,7 +7,7 @@ from typing import Any, Dict, List, Optional
 from openai import OpenAI
 
 from .base import CodeInferenceModel
-from ..models import RetrievedConcept, InferredCode
+from ..models import RetrievedConcept, InferredCode, ModelAudit
 
 
 _SYSTEM = (
@@ -83,7 +83,13 @@ class OpenAIInferenceModel(CodeInferenceModel):
         self._model = model or os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
         self._timeout_s = timeout_s
 
-    def infer_codes(self, input_text: str, retrieved_concepts: List[RetrievedConcept]) -> List[InferredCode]:
+    def infer_codes(
+        self,
+        input_text: str,
+        retrieved_concepts: List[RetrievedConcept],
+        *,
+        audit: Optional[ModelAudit] = None,
+    ) -> List[InferredCode]:
         # Options later: for now fixed caps to keep prompt stable
         candidates = _candidates_for_prompt(
             retrieved_concepts,
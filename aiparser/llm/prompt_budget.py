@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import json
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+from ..models import RetrievedConcept
+from ..text_utils import WORD_REGEX
+
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?;:])\s+")
+
+# rough local estimate for GPT-style BPE on English/medical text, errs on the high side
+_CHARS_PER_TOKEN = 3.6
+_PROMPT_OVERHEAD_TOKENS = 120
+
+
+@dataclass(frozen = True)
+class PromptBudget:
+    max_prompt_tokens: int = 6000
+    max_candidate_tokens: int = 1500
+    min_codes: int = 5
+    max_codes: int = 30
+    max_per_code: int = 3
+    score_ratio: float = 0.35
+    passage_chars: int = 700
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    return int(math.ceil(len(text) / _CHARS_PER_TOKEN))
+
+
+def size_candidates(retrieved: List[RetrievedConcept], budget: PromptBudget) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Group retrieved concepts by code and size the list from the score distribution:
+    keep codes within score_ratio of the best one, cut at the largest score gap past min_codes,
+    then trim to the candidate token budget.
+    """
+    by_code: Dict[str, List[RetrievedConcept]] = {}
+    for rc in retrieved:
+        by_code.setdefault(rc.concept.code, []).append(rc)
+
+    items = []
+    for code, concepts in by_code.items():
+        concepts_sorted = sorted(concepts, key = lambda x: x.score, reverse = True)[: budget.max_per_code]
+        item = {"code": code, "concepts": [c.concept.concept for c in concepts_sorted]}
+        if concepts_sorted[0].concept.code_system:
+            item["system"] = concepts_sorted[0].concept.code_system
+        items.append((float(concepts_sorted[0].score), item))
+    items.sort(key = lambda x: x[0], reverse = True)
+    items = items[: budget.max_codes]
+
+    keep = len(items)
+    if items and items[0][0] > 0:
+        floor = items[0][0] * budget.score_ratio
+        keep = max(min(budget.min_codes, len(items)), sum(1 for score, _ in items if score >= floor))
+
+        # largest relative drop after min_codes marks the knee of the distribution
+        best_gap, knee = 0.0, keep
+        for i in range(max(1, budget.min_codes), keep):
+            prev = items[i - 1][0]
+            gap = (prev - items[i][0]) / prev if prev > 0 else 0.0
+            if gap > best_gap:
+                best_gap, knee = gap, i
+        if best_gap >= 0.5:
+            keep = knee
+
+    selected: List[Dict[str, Any]] = []
+    used_tokens = 0
+    for _, item in items[:keep]:
+        cost = estimate_tokens(json.dumps(item, ensure_ascii = False))
+        if selected and used_tokens + cost > budget.max_candidate_tokens:
+            break
+        selected.append(item)
+        used_tokens += cost
+
+    decisions = {
+        "retrieved_codes": len(by_code),
+        "candidate_codes": len(selected),
+        "candidate_tokens": used_tokens,
+        "score_floor": round(items[0][0] * budget.score_ratio, 6) if items else 0.0,
+    }
+    return selected, decisions
+
+
+def _hard_split(sentence: str, passage_chars: int) -> List[str]:
+    # run-on text without sentence ends: cut at the last space before the limit, or mid-word if there is none
+    pieces = []
+    while len(sentence) > passage_chars:
+        cut = sentence.rfind(" ", 0, passage_chars + 1)
+        if cut <= 0:
+            cut = passage_chars
+        pieces.append(sentence[:cut].rstrip())
+        sentence = sentence[cut:].lstrip()
+    if sentence:
+        pieces.append(sentence)
+    return pieces
+
+
+def _passages(text: str, passage_chars: int) -> List[str]:
+    passage_chars = max(1, passage_chars)
+    passages: List[str] = []
+    current = ""
+    for long_sentence in _SENTENCE_SPLIT.split(text):
+        for sentence in _hard_split(long_sentence, passage_chars):
+            if current and len(current) + len(sentence) + 1 > passage_chars:
+                passages.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}" if current else sentence
+    if current:
+        passages.append(current)
+    return passages
+
+
+def select_passages(text: str, candidates: List[Dict[str, Any]], token_budget: int, budget: PromptBudget) -> Tuple[str, Dict[str, Any]]:
+    """
+    Trim text to the passages that best overlap the candidate codes/concepts, kept in document order.
+    Text already inside the budget is returned untouched.
+    """
+    original_tokens = estimate_tokens(text)
+    if original_tokens <= token_budget:
+        return text, {"text_tokens": original_tokens, "text_trimmed": False}
+
+    codes = {c["code"].lower() for c in candidates}
+    vocab = {m.group(0).lower() for c in candidates for concept in c["concepts"] for m in WORD_REGEX.finditer(concept)}
+
+    passages = _passages(text, budget.passage_chars)
+    scored = []
+    for i, passage in enumerate(passages):
+        words = [m.group(0).lower() for m in WORD_REGEX.finditer(passage)]
+        if not words:
+            continue
+        overlap = len(vocab.intersection(words)) / math.sqrt(len(words))
+        code_hits = sum(1 for w in words if w in codes)
+        scored.append((overlap + 2.0 * code_hits, i))
+    scored.sort(key = lambda x: (-x[0], x[1]))
+
+    chosen = []
+    used = 0
+    for _, i in scored:
+        cost = estimate_tokens(passages[i])
+        if used + cost > token_budget:
+            continue
+        chosen.append(i)
+        used += cost
+
+    if chosen or not passages:
+        trimmed = "\n...\n".join(passages[i] for i in sorted(chosen))
+    else:
+        # nothing fits whole: the model still gets the best passage, cut to the budget
+        best = scored[0][1] if scored else 0
+        trimmed = passages[best][: int(token_budget * _CHARS_PER_TOKEN) or budget.passage_chars]
+        chosen = [best]
+        used = estimate_tokens(trimmed)
+    return trimmed, {
+        "text_tokens": used,
+        "text_tokens_original": original_tokens,
+        "text_trimmed": True,
+        "passages_kept": len(chosen),
+        "passages_total": len(passages),
+    }
+
+
+def text_token_budget(candidates: List[Dict[str, Any]], system_prompt: str, budget: PromptBudget) -> int:
+    candidate_tokens = estimate_tokens(json.dumps(candidates, ensure_ascii = False))
+    return max(0, budget.max_prompt_tokens - candidate_tokens - estimate_tokens(system_prompt) - _PROMPT_OVERHEAD_TOKENS)
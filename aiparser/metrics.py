@@ -0,0 +1,394 @@
+from __future__ import annotations
+
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# In-process counters, gauges and histograms rendered in the Prometheus text exposition format.
+# Stdlib only: served from a local port, written to a textfile-collector file, or summarized to a log stream.
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+
+    def samples(self) -> List[Tuple[str, Labels, float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for name, labels, value in self.samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str) -> None:
+        super().__init__(name, help)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(_labels(labels), 0.0)
+
+    def samples(self) -> List[Tuple[str, Labels, float]]:
+        with self._lock:
+            return [(self.name, labels, value) for labels, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str) -> None:
+        super().__init__(name, help)
+        self._values: Dict[Labels, float] = {}
+        # callbacks read at render time (memory, cache stats owned by other objects)
+        self._collectors: List[Callable[[], Dict[Labels, float]]] = []
+
+    def add_collector(self, collect: Callable[[], Dict[Labels, float]]) -> None:
+        with self._lock:
+            self._collectors.append(collect)
+
+    def set(self, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._values[_labels(labels)] = float(value)
+
+    def samples(self) -> List[Tuple[str, Labels, float]]:
+        with self._lock:
+            values = dict(self._values)
+            collectors = list(self._collectors)
+        for collect in collectors:
+            values.update(collect())
+        return [(self.name, labels, value) for labels, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, help)
+        self._bounds = tuple(sorted(buckets))
+        # labels -> (per-bucket counts + overflow, sum, count)
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _labels(labels)
+        slot = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self._bounds) + 1), [0.0, 0.0])
+            series[0][slot] += 1
+            series[1][0] += value
+            series[1][1] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def summary(self, **labels: Any) -> Dict[str, float]:
+        with self._lock:
+            series = self._series.get(_labels(labels))
+            if series is None:
+                return {"count": 0}
+            counts, (total, count) = list(series[0]), list(series[1])
+        return {"count": int(count), "mean": total / count if count else 0.0, "p50": self._quantile(counts, count, 0.5), "p99": self._quantile(counts, count, 0.99)}
+
+    def samples(self) -> List[Tuple[str, Labels, float]]:
+        out = []
+        with self._lock:
+            series = sorted((labels, list(counts), list(totals)) for labels, (counts, totals) in self._series.items())
+        for labels, counts, (total, count) in series:
+            cumulative = 0
+            for bound, n in zip(self._bounds + (float("inf"),), counts):
+                cumulative += n
+                out.append((f"{self.name}_bucket", labels + (("le", _format_value(bound)),), cumulative))
+            out.append((f"{self.name}_sum", labels, total))
+            out.append((f"{self.name}_count", labels, count))
+        return out
+
+    def _quantile(self, counts: List[int], count: float, q: float) -> float:
+        # upper bound of the bucket holding the q-quantile
+        rank = q * count
+        cumulative = 0
+        for bound, n in zip(self._bounds + (float("inf"),), counts):
+            cumulative += n
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    def __init__(self, namespace: str = "aiparser") -> None:
+        self._namespace = namespace
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._get(name, lambda full: Counter(full, help))
+
+    def gauge(self, name: str, help: str, collect: Optional[Callable[[], Dict[Labels, float]]] = None) -> Gauge:
+        gauge = self._get(name, lambda full: Gauge(full, help))
+        if collect is not None:
+            gauge.add_collector(collect)
+        return gauge
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get(name, lambda full: Histogram(full, help, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+    def write_textfile(self, path: Path | str) -> None:
+        # atomic replace, so a textfile collector never reads a half-written file
+        path = Path(path)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(self.render(), encoding = "utf-8")
+        os.replace(tmp, path)
+
+    def _get(self, name: str, make: Callable[[str], _Metric]) -> Any:
+        full = f"{self._namespace}_{name}"
+        with self._lock:
+            metric = self._metrics.get(full)
+            if metric is None:
+                metric = self._metrics[full] = make(full)
+            return metric
+
+
+def _process_memory() -> Dict[Labels, float]:
+    values = {}
+    if resource is not None:
+        # ru_maxrss is in KiB on Linux
+        values[_labels({"kind": "max_rss"})] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024.0
+    try:
+        with open("/proc/self/statm", "r") as f:
+            values[_labels({"kind": "rss"})] = float(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    return values
+
+
+METRICS = MetricsRegistry()
+
+REQUESTS = METRICS.counter("requests_total", "Documents submitted to the pipeline.")
+ERRORS = METRICS.counter("errors_total", "Failed pipeline calls by stage and exception type.")
+STAGE_SECONDS = METRICS.histogram("stage_seconds", "Latency per pipeline stage.")
+CANDIDATES = METRICS.histogram("candidates_per_query", "Retrieved candidates per document after the score filter.", COUNT_BUCKETS)
+LLM_TOKENS = METRICS.counter("llm_tokens_total", "LLM tokens reported by the API, by kind (prompt/completion).")
+LLM_SKIPPED = METRICS.counter("llm_skipped_total", "Documents answered by the reranker without a model call.")
+RETRIES = METRICS.counter("retries_total", "Retried remote calls by operation.")
+INDEX_CONCEPTS = METRICS.gauge("index_concepts", "Indexed dictionary rows by code system.")
+MEMORY_BYTES = METRICS.gauge("process_memory_bytes", "Resident memory of the worker process.", _process_memory)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Time one pipeline stage and count exceptions escaping it by type.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        ERRORS.inc(stage = name, type = type(e).__name__)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage = name)
+
+
+def record_usage(usage: Any) -> None:
+    # OpenAI usage object or its dict form (batch output)
+    if usage is None:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = usage.get(kind) if isinstance(usage, dict) else getattr(usage, kind, None)
+        if value:
+            LLM_TOKENS.inc(float(value), kind = kind.split("_")[0])
+
+
+def register_cache(name: str, stats: Callable[[], Dict[str, Any]]) -> None:
+    """
+    Expose a cache's stats() dict (hits, misses, entries, hit_rate, ...) as aiparser_cache_<key>{cache=name}.
+    """
+    def collect(key: str) -> Callable[[], Dict[Labels, float]]:
+        return lambda: {_labels({"cache": name}): float(stats().get(key) or 0.0)}
+
+    for key in ("hits", "disk_hits", "misses", "evictions", "entries", "hit_rate"):
+        METRICS.gauge(f"cache_{key}", f"Cache {key.replace('_', ' ')} from the owning cache's stats().", collect(key))
+
+
+def summary() -> Dict[str, Any]:
+    """
+    Compact JSON-able view for the periodic structured log line.
+    """
+    stages = {}
+    for _, labels, _ in STAGE_SECONDS.samples():
+        stage = dict(labels).get("stage")
+        if stage and stage not in stages:
+            stages[stage] = {k: round(v, 4) for k, v in STAGE_SECONDS.summary(stage = stage).items()}
+    return {
+        "event": "metrics",
+        "timestamp": time.time(),
+        "requests": sum(v for _, _, v in REQUESTS.samples()),
+        "errors": {dict(labels).get("type", ""): v for _, labels, v in ERRORS.samples()},
+        "stages": stages,
+        "llm_tokens": {dict(labels).get("kind", ""): v for _, labels, v in LLM_TOKENS.samples()},
+        "llm_skipped": sum(v for _, _, v in LLM_SKIPPED.samples()),
+        "retries": sum(v for _, _, v in RETRIES.samples()),
+        "memory_bytes": {dict(labels)["kind"]: v for labels, v in _process_memory().items()},
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def serve(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serve /metrics on a daemon thread for the life of the process; returns the server (shutdown() stops it).
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target = server.serve_forever, name = "metrics-http", daemon = True).start()
+    return server
+
+
+class Reporter:
+    """
+    Periodically writes summary() as one JSON line (and refreshes the textfile, when given).
+    """
+
+    def __init__(self, interval_s: float, *, stream: TextIO = sys.stderr, textfile: Optional[Path | str] = None) -> None:
+        self._interval_s = max(0.1, float(interval_s))
+        self._stream = stream
+        self._textfile = textfile
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target = self._loop, name = "metrics-reporter", daemon = True)
+
+    def start(self) -> "Reporter":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        # one final report so short runs still log their totals
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.report()
+
+    def report(self) -> None:
+        self._stream.write(json.dumps(summary()) + "\n")
+        self._stream.flush()
+        if self._textfile:
+            METRICS.write_textfile(self._textfile)
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self._interval_s):
+            self.report()
+
+
+def watch_retriever(retriever: Any, name: str = "default") -> None:
+    """
+    Register the query caches of a retriever (and of the shards / sources it wraps) with the metrics.
+    """
+    shards = getattr(retriever, "shards", None)
+    if isinstance(shards, dict):
+        for shard_name, shard in shards.items():
+            watch_retriever(shard, shard_name)
+        return
+    for source in getattr(retriever, "retrievers", None) or []:
+        watch_retriever(source, name)
+    stats = getattr(retriever, "cache_stats", None)
+    if callable(stats):
+        register_cache(f"query_embeddings:{name}", stats)
+
+
+def observe_dictionary(dictionary_audit: Any) -> None:
+    # index size per code system (or one "default" series for a single-dictionary run)
+    systems = getattr(dictionary_audit, "code_systems", None)
+    if systems:
+        for name, info in systems.items():
+            INDEX_CONCEPTS.set(info.get("row_count") or 0, code_system = name)
+    elif dictionary_audit is not None:
+        INDEX_CONCEPTS.set(dictionary_audit.row_count, code_system = "default")
+
+
+def export(*, port: Optional[int] = None, path: Optional[Path | str] = None, log_interval_s: float = 0.0) -> Callable[[], None]:
+    """
+    Start the requested exporters; the returned callback flushes them at the end of a run
+    (final summary line, final textfile).
+    """
+    server = serve(int(port)) if port else None
+    reporter = Reporter(log_interval_s, textfile = path).start() if log_interval_s and log_interval_s > 0 else None
+
+    def finish() -> None:
+        if reporter is not None:
+            reporter.stop()
+        elif path:
+            METRICS.write_textfile(path)
+        if server is not None:
+            server.shutdown()
+
+    return finish
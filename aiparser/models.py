@@ -1,44 +1,147 @@
 from __future__ import annotations
 
-from dataclasses import asdict, dataclass
-from typing import Any, Dict, List, Optional
+import hashlib
+import json
+from dataclasses import dataclass, fields, is_dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union, overload
 
 
 
-@dataclass
+@dataclass(slots = True)
 class Input:
     id: str
     name: str
     text: str
 
-@dataclass
+@dataclass(slots = True)
 class Output:
     id: str
     name: str
     inferred_codes: List[Dict[str, Any]] = None
     audit: Optional[Dict[str, Any]] = None
 
-@dataclass
+@dataclass(frozen = True, slots = True)
 class Concept:
     code: str
     concept: str
     metadata: Optional[Dict[str, Any]] = None
+    # dictionary the code comes from (e.g. "hcpcs", "icd10cm") when several are loaded
+    code_system: Optional[str] = None
 
-@dataclass
+class ConceptTable(Sequence[Concept]):
+    """
+    Columnar concept dictionary: codes and descriptions as flat lists, metadata column names stored once
+    and per-row metadata values only when a row has any. The code system is stored once for a single-system
+    table and per row only for a mixed one. Concept objects are built on access.
+    """
+
+    __slots__ = ("codes", "texts", "metadata_columns", "code_system", "_metadata_rows", "_code_systems")
+
+    def __init__(
+        self,
+        codes: List[str],
+        texts: List[str],
+        metadata_columns: Tuple[str, ...] = (),
+        metadata_rows: Optional[List[Optional[Tuple[Any, ...]]]] = None,
+        *,
+        code_system: Optional[str] = None,
+        code_systems: Optional[List[Optional[str]]] = None,
+    ) -> None:
+        if len(codes) != len(texts):
+            raise ValueError("ConceptTable codes and texts must have the same length.")
+        self.codes = codes
+        self.texts = texts
+        self.metadata_columns = tuple(metadata_columns)
+        self.code_system = code_system
+        self._metadata_rows = metadata_rows if metadata_columns else None
+        self._code_systems = code_systems
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @overload
+    def __getitem__(self, i: int) -> Concept: ...
+    @overload
+    def __getitem__(self, i: slice) -> "ConceptTable": ...
+    def __getitem__(self, i: Union[int, slice]) -> Union[Concept, "ConceptTable"]:
+        if isinstance(i, slice):
+            rows = self._metadata_rows[i] if self._metadata_rows is not None else None
+            systems = self._code_systems[i] if self._code_systems is not None else None
+            return ConceptTable(self.codes[i], self.texts[i], self.metadata_columns, rows, code_system = self.code_system, code_systems = systems)
+        return Concept(
+            code = self.codes[i],
+            concept = self.texts[i],
+            metadata = self.metadata(i),
+            code_system = self._code_systems[i] if self._code_systems is not None else self.code_system,
+        )
+
+    def __iter__(self) -> Iterator[Concept]:
+        for i in range(len(self.codes)):
+            yield self[i]
+
+    def sha256(self) -> str:
+        # content hash of every row, so two loads of the same dictionary version compare equal
+        rows = [self.codes, self.texts, self.metadata_columns, self._metadata_rows, self.code_system, self._code_systems]
+        return hashlib.sha256(json.dumps(rows, default = str).encode("utf-8")).hexdigest()
+
+    def metadata(self, i: int) -> Optional[Dict[str, Any]]:
+        if self._metadata_rows is None:
+            return None
+        values = self._metadata_rows[i]
+        return dict(zip(self.metadata_columns, values)) if values is not None else None
+
+    @classmethod
+    def from_concepts(cls, concepts: Sequence[Concept]) -> "ConceptTable":
+        if isinstance(concepts, ConceptTable):
+            return concepts
+
+        columns: Dict[str, None] = {}
+        for c in concepts:
+            for key in (c.metadata or {}):
+                columns.setdefault(key, None)
+        metadata_columns = tuple(columns)
+
+        rows = None
+        if metadata_columns:
+            rows = [
+                tuple((c.metadata or {}).get(k) for k in metadata_columns) if c.metadata else None
+                for c in concepts
+            ]
+
+        systems = {c.code_system for c in concepts}
+        code_system = next(iter(systems)) if len(systems) == 1 else None
+        return cls(
+            [c.code for c in concepts],
+            [c.concept for c in concepts],
+            metadata_columns,
+            rows,
+            code_system = code_system,
+            code_systems = [c.code_system for c in concepts] if len(systems) > 1 else None,
+        )
+
+@dataclass(frozen = True, slots = True)
 class RetrievedConcept:
     concept: Concept
     score: float
     code: Optional[str] = None
 
-@dataclass
+@dataclass(frozen = True, slots = True)
 class InferredCode:
     code: str
     confidence: str
     score: float
     matched_concepts: List[str]
     justification: str
+    code_system: Optional[str] = None
 
-@dataclass
+@dataclass(slots = True)
+class InferenceRequest:
+    doc_id: str
+    input_text: str
+    retrieved: List[RetrievedConcept]
+    audit: Optional[ModelAudit] = None
+
+@dataclass(slots = True)
 class InferenceResult:
     input_text:str
     inferred: List[InferredCode]
@@ -48,29 +151,33 @@ class InferenceResult:
     def to_json_dict(self) -> Dict[str, Any]:
         return {
             "input_text": self.input_text,
-            "inferred_codes": [asdict(x) for x in self.inferred],
-            "audit": self.audit.to_json_dict() if self.audit else None,
+            "inferred_codes": to_jsonable(self.inferred),
+            "audit": to_jsonable(self.audit),
             "model_info": self.model_info or {}
         }
     
 
-@dataclass
+@dataclass(frozen = True, slots = True)
 class RetrievalCandidateAudit:
     code: str
     concept: str
     retrieval_score: float
 
 
-@dataclass
+@dataclass(slots = True)
 class RetrievalAudit:
     retriever_name: str
     retreiver_version: str
     top_k: int
     min_retrieval_score: float
     candidates: List[RetrievalCandidateAudit]
+    # reranker decisions (codes kept, top probabilities, margin, whether the LLM was skipped)
+    rerank: Optional[Dict[str, Any]] = None
+    # incremental runs: distinct sections, how many were retrieved again, whether a previous version was found
+    sections: Optional[Dict[str, Any]] = None
 
 
-@dataclass
+@dataclass(slots = True)
 class ModelAudit:
     model_name: str
     model_version: str
@@ -82,13 +189,49 @@ class ModelAudit:
     model_info: Optional[Dict[str, Any]] = None
 
 
-@dataclass
+@dataclass(frozen = True, slots = True)
+class DictionaryChangeSet:
+    added: List[str]
+    removed: List[str]
+    updated: List[str]
+    row_count: int
+    timestamp_utc: Optional[str] = None
+
+    def is_empty(self) -> bool:
+        return not (self.added or self.removed or self.updated)
+
+
+@dataclass(slots = True)
+class InputFileAudit:
+    # provenance of one input file: sha256 of its bytes as received, valid documents in it and rows skipped
+    path: str
+    sha256: str
+    documents: int
+    skipped_rows: int = 0
+
+
+@dataclass(slots = True)
 class DictionaryAudit:
     row_count: int
     schema: Dict[str, str]
+    changes: Optional[List[DictionaryChangeSet]] = None
+    # per code system: row_count, schema, source path, retriever and top_k budget (multi-dictionary runs only)
+    code_systems: Optional[Dict[str, Dict[str, Any]]] = None
+    # sha256 of the loaded rows; identifies the dictionary version whether or not an index diff was recorded
+    content_sha256: Optional[str] = None
 
+    def context(self) -> str:
+        # what stored results are keyed on: the content hash, or the whole audit for dictionaries loaded without one
+        return self.content_sha256 or json.dumps(to_jsonable(self), sort_keys = True)
 
-@dataclass
+    def record_change(self, change: DictionaryChangeSet) -> None:
+        if change.is_empty():
+            return
+        self.row_count = change.row_count
+        self.changes = (self.changes or []) + [change]
+
+
+@dataclass(slots = True)
 class AuditTrail:
     run_id: str
     timestamp_utc: str
@@ -96,4 +239,47 @@ class AuditTrail:
     dictionary: Optional[DictionaryAudit] = None
     retrieval: Optional[RetrievalAudit] = None
     model: Optional[ModelAudit] = None
-    environment: Dict[str, Any] = None
\ No newline at end of file
+    environment: Dict[str, Any] = None
+    # set when identical input texts in a batch were computed once and fanned out
+    shared_computation: Optional[Dict[str, Any]] = None
+
+
+@dataclass(slots = True)
+class RunManifest:
+    # run-level audit written once per run; per-document audits reference it by run_id
+    run_id: str
+    timestamp_utc: str
+    audit_level: str
+    input_hash: str
+    document_count: int
+    dictionary: Optional[DictionaryAudit] = None
+    environment: Dict[str, Any] = None
+    pipeline: Optional[Dict[str, Any]] = None
+    # documents restored from a checkpoint written by earlier runs keep those runs' ids
+    resumed_run_ids: Optional[List[str]] = None
+    # "i/N" for one shard of a partitioned run; a merged run lists its shards' run ids instead
+    shard: Optional[str] = None
+    shard_run_ids: Optional[Dict[str, str]] = None
+    # one entry per input file, in ingestion order; input_hash covers them all when there are several
+    input_files: Optional[List[InputFileAudit]] = None
+
+_FIELD_NAMES: Dict[type, Tuple[str, ...]] = {}
+
+def to_jsonable(obj: Any, exclude: frozenset = frozenset()) -> Any:
+    """
+    Single-pass conversion of model objects to JSON-ready dicts/lists.
+    Unlike dataclasses.asdict, leaf values are not deep-copied and field names are cached per class.
+    Keys in `exclude` are dropped at every level.
+    """
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    if isinstance(obj, (list, tuple, ConceptTable)):
+        return [to_jsonable(x, exclude) for x in obj]
+    if isinstance(obj, dict):
+        return {k: to_jsonable(v, exclude) for k, v in obj.items() if k not in exclude}
+    if is_dataclass(obj):
+        names = _FIELD_NAMES.get(type(obj))
+        if names is None:
+            names = _FIELD_NAMES.setdefault(type(obj), tuple(f.name for f in fields(obj)))
+        return {name: to_jsonable(getattr(obj, name), exclude) for name in names if name not in exclude}
+    return obj
@@ -1,23 +1,65 @@
 from __future__ import annotations
 import sys
 import json
+import hashlib
 
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-from .models import InferenceResult, RetrievedConcept, RetrievalCandidateAudit
+from .models import InferenceRequest, InferenceResult, InferredCode, RetrievedConcept, RetrievalCandidateAudit, to_jsonable
 from .retriever.base import Retriever
 from .llm.base import CodeInferenceModel
 from .models import AuditTrail, RetrievalAudit, ModelAudit
+from .metrics import CANDIDATES, LLM_SKIPPED, REQUESTS, stage
+from .reranker import LogisticReranker, rerank_candidates
+from .revisions import Revision, RevisionStore
+from .text_utils import TokenStream, analyze, token_sections, token_windows
 
 
-@dataclass
+@dataclass(frozen = True)
 class PipelineConfig:
     top_k: int = 15
     min_retrieval_score: float = 0.005
+    # run_many packs inputs up to pack_max_chars long into shared model calls (0 disables packing)
+    pack_max_chars: int = 0
+    pack_max_docs: int = 8
+    # input text is normalized and tokenized once; retrievers and the chunker share the token stream
+    normalize_text: bool = True
+    # retrieve per window of chunk_tokens tokens and merge (0 retrieves over the whole text)
+    chunk_tokens: int = 0
+    chunk_overlap: int = 32
+    # with a reranker, only the rerank_max_codes most probable codes go to the model
+    rerank_max_codes: int = 10
+    # skip the model when the reranker's confident codes beat every other code by this probability margin (0 disables)
+    skip_llm_margin: float = 0.0
+    skip_llm_min_probability: float = 0.9
+    # run_incremental retrieves per section of at most section_max_tokens tokens
+    section_max_tokens: int = 256
+
+
+def tag_code_systems(inferred: List[InferredCode], retrieved: Sequence[RetrievedConcept]) -> List[InferredCode]:
+    # inferred codes inherit the code system of the retrieved concept they came from
+    systems: Dict[str, str] = {}
+    for r in retrieved:
+        if r.concept.code_system is not None:
+            systems.setdefault(r.concept.code, r.concept.code_system)
+    if not systems:
+        return inferred
+    return [
+        replace(c, code_system = systems[c.code]) if c.code_system is None and c.code in systems else c
+        for c in inferred
+    ]
+
+
+def _candidate_fingerprint(retrieved: Sequence[RetrievedConcept]) -> str:
+    # the candidate set the model would see, independent of order and score jitter
+    keys = sorted({(r.concept.code_system or "", r.concept.code, r.concept.concept) for r in retrieved})
+    return hashlib.sha256(json.dumps(keys).encode("utf-8")).hexdigest()
 
 
 class CodeInferencePipeline:
+    # all per-call state lives in locals, so one warm pipeline can be shared across threads
     def __init__(
         self,
         retriever: Retriever,
@@ -25,17 +67,237 @@ class CodeInferencePipeline:
         config: PipelineConfig = PipelineConfig(),
         audit_trail: AuditTrail = None,
         *,
-        model_info: Optional[Dict[str, Any]] = None
+        model_info: Optional[Dict[str, Any]] = None,
+        reranker: Optional[LogisticReranker] = None,
     ) -> None:
         self._retriever = retriever
+        self._reranker = reranker
         self._model = model
         self._config = config
-        self._audit_trail = audit_trail
-        self._model_info = model_info or {}
+        self._audit_trail = audit_trail # template only, copied per call and never mutated
+        self._model_info = dict(model_info or {})
+
+    @property
+    def config(self) -> PipelineConfig:
+        return self._config
+
+    def describe(self) -> Dict[str, Any]:
+        # run-level settings shared by every per-call audit, for the run manifest
+        return {
+            "retrieval": {
+                "retriever_name": type(self._retriever).__name__,
+                "retreiver_version": "1.0",
+                "top_k": self._config.top_k,
+                "min_retrieval_score": self._config.min_retrieval_score,
+            },
+            "model": {
+                "model_name": type(self._model).__name__,
+                "model_version": "1.0",
+                "model_info": dict(self._model_info),
+            },
+            "config": to_jsonable(self._config),
+            "reranker": dict(self._reranker.training, type = "logistic") if self._reranker is not None else None,
+        }
+
+    def analyze(self, input_text: str) -> TokenStream:
+        with stage("analyze"):
+            return analyze(input_text, normalize = self._config.normalize_text)
 
     def run(self, input_text: str, audit_trail: AuditTrail = None) -> InferenceResult:
-        retrieved_raw = self._retriever.retrieve(input_text, top_k=self._config.top_k)
+        stream = self.analyze(input_text)
+        retrieved, audit, accepted = self.screen(input_text, audit_trail, stream = stream)
+
+        if accepted is not None:
+            inferred = accepted
+        else:
+            with stage("model"):
+                inferred = self._model.infer_codes(stream.text, retrieved, audit = audit.model if audit is not None else None)
+
+        return InferenceResult(
+            input_text = input_text,
+            inferred = tag_code_systems(inferred, retrieved),
+            audit = audit
+        )
+
+    def run_incremental(
+        self,
+        doc_id: str,
+        input_text: str,
+        store: RevisionStore,
+        audit_trail: AuditTrail = None,
+        *,
+        context: str = "",
+    ) -> InferenceResult:
+        """
+        run() for a revised document: sections whose text is unchanged since the version in `store` reuse their
+        retrieval results, only changed sections are retrieved again, and the model is called only when the
+        fused candidate set differs from the one it saw last time. Retrieval is always per section, so the first
+        version of a document costs about as much as chunked retrieval. `context` names anything else the stored
+        results depend on (e.g. the dictionary version); a change there recodes the document in full.
+        """
+        stream = self.analyze(input_text)
+        context = self.fingerprint(context)
+        previous = store.get(doc_id, context)
+        cached = previous.sections if previous is not None else {}
+
+        sections = token_sections(stream, self._config.section_max_tokens)
+        hashes = [hashlib.sha256(s.text.encode("utf-8")).hexdigest() for s in sections]
+        # repeated sections (page headers) are retrieved once
+        changed = {h: s for h, s in zip(hashes, sections) if h not in cached}
+        with stage("retrieve"):
+            fresh = self._retriever.retrieve_many([s.text for s in changed.values()], top_k = self._config.top_k, tokens = list(changed.values())) if changed else []
+        by_hash = {**cached, **dict(zip(changed, fresh))}
+        retrieved_raw = self._fuse([by_hash[h] for h in dict.fromkeys(hashes)])
+
+        retrieved, audit, accepted = self.screen(input_text, audit_trail, stream = stream, retrieved_raw = retrieved_raw)
+        candidates = _candidate_fingerprint(retrieved)
+        if audit is not None:
+            audit.retrieval.sections = {"total": len(set(hashes)), "retrieved": len(changed), "previous_version": previous is not None}
+
+        if accepted is not None:
+            inferred = accepted
+        elif previous is not None and previous.candidates == candidates:
+            inferred = previous.inferred
+            LLM_SKIPPED.inc()
+            if audit is not None:
+                audit.model.params = {"skipped": "unchanged_candidates"}
+        else:
+            with stage("model"):
+                inferred = self._model.infer_codes(stream.text, retrieved, audit = audit.model if audit is not None else None)
+        inferred = tag_code_systems(inferred, retrieved)
+
+        store.put(doc_id, Revision(
+            context = context,
+            sections = {h: by_hash[h] for h in hashes},
+            candidates = candidates,
+            inferred = inferred,
+        ))
+        return InferenceResult(input_text = input_text, inferred = inferred, audit = audit)
+
+    def fingerprint(self, context: str = "") -> str:
+        # pipeline settings that make stored retrieval or model results stale when they change:
+        # the run description plus backend settings and reranker weights, which describe() leaves out
+        reranker = self._reranker
+        settings = json.dumps([
+            self.describe(),
+            self._retriever.settings(),
+            self._model.settings(),
+            [reranker.weights, reranker.bias, reranker.means, reranker.scales] if reranker is not None else None,
+            context,
+        ], sort_keys = True, default = str)
+        return hashlib.sha256(settings.encode("utf-8")).hexdigest()
+
+    def run_many(
+        self,
+        input_texts: Sequence[str],
+        audit_trails: Optional[Sequence[Optional[AuditTrail]]] = None,
+        *,
+        max_workers: int = 4,
+    ) -> List[InferenceResult]:
+        if audit_trails is not None and len(audit_trails) != len(input_texts):
+            raise ValueError("audit_trails must have one entry per input text.")
+        trails = list(audit_trails) if audit_trails is not None else [None] * len(input_texts)
+
+        packable = [
+            i for i, text in enumerate(input_texts)
+            if self._config.pack_max_chars > 0 and len(text) <= self._config.pack_max_chars and self._model.supports_packing
+        ]
+        if len(packable) < 2:
+            packable = []
+
+        if max_workers <= 1 and not packable:
+            return [self.run(text, audit_trail = trail) for text, trail in zip(input_texts, trails)]
+
+        results: List[Optional[InferenceResult]] = [None] * len(input_texts)
+        packed = set(packable)
+        pack_size = max(1, self._config.pack_max_docs)
+
+        # results come back in input order
+        with ThreadPoolExecutor(max_workers = max(1, max_workers)) as executor:
+            single = {
+                i: executor.submit(self.run, input_texts[i], trails[i])
+                for i in range(len(input_texts)) if i not in packed
+            }
+            packs = [
+                executor.submit(self._run_pack, [(i, input_texts[i], trails[i]) for i in packable[start : start + pack_size]])
+                for start in range(0, len(packable), pack_size)
+            ]
+
+            for i, future in single.items():
+                results[i] = future.result()
+            for future in packs:
+                for i, result in future.result():
+                    results[i] = result
+
+        return results
+
+    def _run_pack(self, items: List[Tuple[int, str, Optional[AuditTrail]]]) -> List[Tuple[int, InferenceResult]]:
+        streams = {i: self.analyze(text) for i, text, _ in items}
+        prepared = [(i, text, *self.screen(text, trail, stream = streams[i])) for i, text, trail in items]
+        requests = [
+            InferenceRequest(
+                doc_id = str(i),
+                input_text = streams[i].text,
+                retrieved = retrieved,
+                audit = audit.model if audit is not None else None,
+            )
+            for i, text, retrieved, audit, accepted in prepared if accepted is None
+        ]
+        inferred = {}
+        if requests:
+            with stage("model_packed"):
+                inferred = self._model.infer_codes_batch(requests)
+
+        return [
+            (i, InferenceResult(
+                input_text = text,
+                inferred = tag_code_systems(accepted if accepted is not None else inferred.get(str(i), []), retrieved),
+                audit = audit,
+            ))
+            for i, text, retrieved, audit, accepted in prepared
+        ]
+
+    def prepare(
+        self,
+        input_text: str,
+        audit_trail: Optional[AuditTrail] = None,
+        *,
+        stream: Optional[TokenStream] = None,
+    ) -> Tuple[List[RetrievedConcept], Optional[AuditTrail]]:
+        # retrieval half of run(): filtered (and reranked) candidates plus the per-call audit, model not invoked yet
+        retrieved, audit, _ = self.screen(input_text, audit_trail, stream = stream)
+        return retrieved, audit
+
+    def screen(
+        self,
+        input_text: str,
+        audit_trail: Optional[AuditTrail] = None,
+        *,
+        stream: Optional[TokenStream] = None,
+        retrieved_raw: Optional[List[RetrievedConcept]] = None,
+    ) -> Tuple[List[RetrievedConcept], Optional[AuditTrail], Optional[List[InferredCode]]]:
+        # prepare() plus the reranker's verdict: accepted codes when the model call can be skipped, else None
+        REQUESTS.inc()
+        stream = stream if stream is not None else self.analyze(input_text)
+        if retrieved_raw is None:
+            with stage("retrieve"):
+                retrieved_raw = self._retrieve(stream)
         retrieved = [r for r in retrieved_raw if r.score >= self._config.min_retrieval_score]
+        CANDIDATES.observe(len(retrieved))
+
+        accepted, decisions = None, None
+        if self._reranker is not None:
+            with stage("rerank"):
+                retrieved, accepted, decisions = rerank_candidates(
+                    self._reranker,
+                    stream,
+                    retrieved,
+                    max_codes = self._config.rerank_max_codes,
+                    accept_margin = self._config.skip_llm_margin,
+                    accept_min_probability = self._config.skip_llm_min_probability,
+                )
+            if accepted is not None:
+                LLM_SKIPPED.inc()
 
         # sys.stderr.write(f"Retrieved {len(retrieved)} concepts after applying min_retrieval_score filter.")
         retrieval_audit = RetrievalAudit(
@@ -43,30 +305,61 @@ class CodeInferencePipeline:
             retreiver_version = "1.0", # hardcoded for now, should be dynamic
             top_k = self._config.top_k,
             min_retrieval_score = self._config.min_retrieval_score,
-            candidates = self._to_candidate_audit(retrieved_raw)
+            candidates = self._to_candidate_audit(retrieved_raw),
+            rerank = decisions,
         )
 
-        if audit_trail is not None:
-            self._audit_trail = audit_trail
-
-        if self._audit_trail is not None:
-            self._audit_trail.retrieval = retrieval_audit
-
-        if self._audit_trail is not None:
-            self._audit_trail.model = ModelAudit(
+        audit = self._call_audit(audit_trail)
+        if audit is not None:
+            audit.retrieval = retrieval_audit
+            audit.model = ModelAudit(
                 model_name = type(self._model).__name__,
                 model_version = "1.0", # hardcoded for now, should be dynamic
-                model_info = self._model_info
+                model_info = dict(self._model_info),
+                params = {"skipped": "reranker"} if accepted is not None else None,
             )
 
+        return retrieved, audit, accepted
 
-        inferred = self._model.infer_codes(input_text, retrieved)
+    def _retrieve(self, stream: TokenStream) -> List[RetrievedConcept]:
+        top_k = self._config.top_k
+        windows = token_windows(stream, self._config.chunk_tokens, self._config.chunk_overlap)
+        if len(windows) == 1:
+            return self._retriever.retrieve(stream.text, top_k = top_k, tokens = stream)
 
-        return InferenceResult(
-            input_text = input_text,
-            inferred = inferred,
-            audit = self._audit_trail
-        )
+        return self._fuse(self._retriever.retrieve_many([w.text for w in windows], top_k = top_k, tokens = windows))
+
+    def _fuse(self, per_window: Sequence[List[RetrievedConcept]]) -> List[RetrievedConcept]:
+        # a concept keeps its best score over all windows
+        best: Dict[Tuple[str, str], RetrievedConcept] = {}
+        # sharded retrievers return per-code-system budgets, so each system keeps as many as any one window returned
+        limits: Dict[Optional[str], int] = {None: self._config.top_k}
+        for retrieved in per_window:
+            counts: Dict[Optional[str], int] = {}
+            for r in retrieved:
+                key = (r.concept.code, r.concept.concept)
+                if key not in best or r.score > best[key].score:
+                    best[key] = r
+                counts[r.concept.code_system] = counts.get(r.concept.code_system, 0) + 1
+            for system, count in counts.items():
+                if system is not None:
+                    limits[system] = max(limits.get(system, 0), count)
+
+        kept: Dict[Optional[str], int] = {}
+        merged = []
+        for r in sorted(best.values(), key = lambda r: r.score, reverse = True):
+            system = r.concept.code_system
+            if kept.get(system, 0) < limits[system]:
+                kept[system] = kept.get(system, 0) + 1
+                merged.append(r)
+        return merged
+
+    def _call_audit(self, audit_trail: Optional[AuditTrail]) -> Optional[AuditTrail]:
+        template = audit_trail if audit_trail is not None else self._audit_trail
+        if template is None:
+            return None
+        # shallow copy: shared run-level blocks (dictionary, environment) are read-only
+        return replace(template, retrieval = None, model = None)
     
     
     
@@ -78,4 +371,4 @@ class CodeInferencePipeline:
                 retrieval_score=float(r.score),
             )
             for r in retrieved
-        ]
\ No newline at end of file
+        ]
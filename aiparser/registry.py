@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import importlib
+import threading
+from importlib.metadata import entry_points
+from typing import Any, Callable, Dict, Union
+
+from .llm.base import CodeInferenceModel
+from .retriever.base import Retriever
+
+
+# Backends are registered by name and only imported when selected, so e.g. the mock path never loads the openai SDK.
+# A factory is a callable taking the options dict, or a lazy "package.module:attribute" string pointing at one.
+# Third-party packages can also publish factories under the "aiparser.retrievers" / "aiparser.models" entry point groups.
+
+Factory = Union[str, Callable[[Dict[str, Any]], Any]]
+
+_RETRIEVER_GROUP = "aiparser.retrievers"
+_MODEL_GROUP = "aiparser.models"
+
+_lock = threading.Lock()
+_retrievers: Dict[str, Factory] = {}
+_models: Dict[str, Factory] = {}
+
+
+def register_retriever(name: str, factory: Factory) -> None:
+    with _lock:
+        _retrievers[_key(name)] = factory
+
+
+def register_model(name: str, factory: Factory) -> None:
+    with _lock:
+        _models[_key(name)] = factory
+
+
+def create_retriever(name: str, options: Dict[str, Any] | None = None) -> Retriever:
+    return _resolve(_retrievers, _RETRIEVER_GROUP, name)(options or {})
+
+
+def create_model(name: str, options: Dict[str, Any] | None = None) -> CodeInferenceModel:
+    return _resolve(_models, _MODEL_GROUP, name)(options or {})
+
+
+def available_retrievers() -> list[str]:
+    return sorted(_retrievers)
+
+
+def available_models() -> list[str]:
+    return sorted(_models)
+
+
+def _key(name: str) -> str:
+    return str(name or "").strip().lower()
+
+
+def _load(spec: str) -> Callable[[Dict[str, Any]], Any]:
+    module_name, _, attr = spec.partition(":")
+    if not attr:
+        raise ValueError(f"Factory spec '{spec}' must look like 'package.module:attribute'.")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def _resolve(registry: Dict[str, Factory], group: str, name: str) -> Callable[[Dict[str, Any]], Any]:
+    key = _key(name)
+    with _lock:
+        factory = registry.get(key)
+        if factory is None:
+            for ep in entry_points(group = group):
+                if _key(ep.name) == key:
+                    factory = ep.value
+                    break
+        if factory is None:
+            raise ValueError(f"Unknown backend '{name}'. Registered: {', '.join(sorted(registry)) or 'none'}")
+        if isinstance(factory, str):
+            factory = _load(factory)
+            registry[key] = factory
+    return factory
+
+
+# --- built-in factories (imports stay inside so unused backends are never loaded) ---
+
+def _token_retriever(options: Dict[str, Any]) -> Retriever:
+    from .retriever.token_retriever import TokenRetriever
+    return TokenRetriever()
+
+
+def _openai_embedding_retriever(options: Dict[str, Any]) -> Retriever:
+    from .retriever.openai_embeddint_retriever import OpenAIEmbeddingRetriever
+    return OpenAIEmbeddingRetriever(
+        api_key = options.get("openai_api_key"),
+        base_url = options.get("openai_base_url") or "https://api.openai.com/v1",
+        embedding_model = options.get("openai_embedding_model") or "text-embedding-3-small",
+        batch_size = int(options.get("embedding_batch_size", 128)),
+        store_path = options.get("embedding_store_path"),
+        store_dtype = options.get("embedding_store_dtype") or "float32",
+        ann_backend = options.get("ann_backend") or "exact",
+        ann_min_size = int(options.get("ann_min_size", 5000)),
+        ann_params = options.get("ann_params"),
+        max_concurrency = int(options.get("embedding_concurrency", 4)),
+        requests_per_minute = options.get("embedding_requests_per_minute"),
+        max_retries = int(options.get("embedding_max_retries", 3)),
+        query_cache_size = int(options.get("query_cache_size", 4096)),
+        query_cache_path = options.get("query_cache_path"),
+    )
+
+
+def _minhash_retriever(options: Dict[str, Any]) -> Retriever:
+    from .retriever.minhash_retriever import MinHashRetriever
+    return MinHashRetriever(
+        ngram = int(options.get("minhash_ngram", 3)),
+        bands = int(options.get("minhash_bands", 20)),
+        rows_per_band = int(options.get("minhash_rows_per_band", 3)),
+        window_words = int(options.get("minhash_window_words", 4)),
+    )
+
+
+def _fusion_retriever(options: Dict[str, Any]) -> Retriever:
+    from .retriever.fusion_retriever import FusionRetriever
+    names = options.get("fusion_retrievers") or "token,minhash"
+    if isinstance(names, str):
+        names = [n.strip() for n in names.split(",") if n.strip()]
+    return FusionRetriever(
+        [create_retriever(name, options) for name in names],
+        weights = options.get("fusion_weights"),
+        depth = options.get("fusion_depth"),
+    )
+
+
+def _mock_model(options: Dict[str, Any]) -> CodeInferenceModel:
+    from .llm.mock_inference import MockCodeInferenceModel
+    return MockCodeInferenceModel()
+
+
+def _openai_model(options: Dict[str, Any]) -> CodeInferenceModel:
+    from .llm.openai_inference import OpenAIInferenceModel
+    from .llm.prompt_budget import PromptBudget
+    return OpenAIInferenceModel(
+        api_key = options.get("openai_api_key"),
+        model = options.get("openai_model") or "gpt-4o",
+        base_url = options.get("openai_base_url") or "https://api.openai.com/v1",
+        prompt_budget = PromptBudget(
+            max_prompt_tokens = int(options.get("prompt_token_budget", PromptBudget.max_prompt_tokens)),
+            max_codes = int(options.get("max_candidate_codes", PromptBudget.max_codes)),
+        ),
+    )
+
+
+register_retriever("token", _token_retriever)
+register_retriever("openai", _openai_embedding_retriever)
+register_retriever("oai", _openai_embedding_retriever)
+register_retriever("minhash", _minhash_retriever)
+register_retriever("fusion", _fusion_retriever)
+register_model("mock", _mock_model)
+register_model("openai", _openai_model)
+register_model("oai", _openai_model)
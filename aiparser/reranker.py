@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from .models import InferredCode, RetrievedConcept
+from .text_utils import TokenStream, tokenize
+
+
+FEATURES = (
+    "best_score",           # best retrieval score of any concept of the code
+    "relative_score",       # best score / top score in the document
+    "inverse_rank",         # 1 / rank of the code in retrieval order
+    "concept_hits",         # log1p(number of retrieved concepts for the code)
+    "code_mentioned",       # code literally appears in the text
+    "code_mentions",        # log1p(number of literal mentions)
+    "first_mention",        # 1.0 at the start of the document, falling to 0.0 at the end (0 if absent)
+    "token_overlap",        # share of the best concept's tokens that occur in the document
+)
+
+
+@dataclass(slots = True)
+class CodeCandidate:
+    code: str
+    concepts: List[RetrievedConcept]
+    features: List[float]
+
+
+def _token_strings(stream: TokenStream) -> FrozenSet[str]:
+    # compared as strings: unknown tokens get negative ids that are only unique within one stream
+    return frozenset(stream.text[start:end].lower() for start, end in zip(stream.starts, stream.ends))
+
+
+def candidate_features(stream: TokenStream, retrieved: Sequence[RetrievedConcept]) -> List[CodeCandidate]:
+    """
+    Group retrieved concepts by code (in retrieval order) and compute one feature row per code.
+    """
+    by_code: Dict[str, List[RetrievedConcept]] = {}
+    for r in retrieved:
+        by_code.setdefault(r.concept.code, []).append(r)
+    if not by_code:
+        return []
+
+    text = stream.text
+    text_len = max(1, len(text))
+    doc_tokens = _token_strings(stream)
+    top_score = max((r.score for r in retrieved), default = 0.0) or 1.0
+
+    candidates = []
+    for rank, (code, concepts) in enumerate(by_code.items(), start = 1):
+        best = max(concepts, key = lambda r: r.score)
+        mentions = [m.start() for m in re.finditer(rf"(?<![A-Za-z0-9]){re.escape(code)}(?![A-Za-z0-9])", text)]
+        concept_tokens = _token_strings(tokenize(best.concept.concept.lower()))
+        overlap = len(concept_tokens & doc_tokens) / len(concept_tokens) if concept_tokens else 0.0
+
+        candidates.append(CodeCandidate(code = code, concepts = concepts, features = [
+            float(best.score),
+            float(best.score) / top_score,
+            1.0 / rank,
+            math.log1p(len(concepts)),
+            1.0 if mentions else 0.0,
+            math.log1p(len(mentions)),
+            1.0 - mentions[0] / text_len if mentions else 0.0,
+            overlap,
+        ]))
+    return candidates
+
+
+@dataclass
+class LogisticReranker:
+    """
+    Logistic regression over standardized candidate features; scoring a code is one dot product.
+    """
+    weights: List[float]
+    bias: float
+    means: List[float]
+    scales: List[float]
+    feature_names: Tuple[str, ...] = FEATURES
+    training: Dict[str, Any] = field(default_factory = dict)
+
+    def probability(self, features: Sequence[float]) -> float:
+        z = self.bias
+        for w, x, mean, scale in zip(self.weights, features, self.means, self.scales):
+            z += w * (x - mean) / scale
+        return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z))))
+
+    def rank(self, stream: TokenStream, retrieved: Sequence[RetrievedConcept]) -> List[Tuple[float, CodeCandidate]]:
+        scored = [(self.probability(c.features), c) for c in candidate_features(stream, retrieved)]
+        scored.sort(key = lambda x: x[0], reverse = True)
+        return scored
+
+    def save(self, path: Path | str) -> None:
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding = "utf-8") as f:
+            json.dump({
+                "type": "logistic",
+                "feature_names": list(self.feature_names),
+                "weights": self.weights,
+                "bias": self.bias,
+                "means": self.means,
+                "scales": self.scales,
+                "training": self.training,
+            }, f, indent = 2)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path | str) -> "LogisticReranker":
+        with open(path, "r", encoding = "utf-8") as f:
+            data = json.load(f)
+        if tuple(data.get("feature_names") or ()) != FEATURES:
+            raise ValueError(f"Reranker file {path} was trained on different features; retrain it.")
+        return cls(
+            weights = [float(w) for w in data["weights"]],
+            bias = float(data["bias"]),
+            means = [float(m) for m in data["means"]],
+            scales = [float(s) for s in data["scales"]],
+            training = data.get("training") or {},
+        )
+
+    @classmethod
+    def fit(
+        cls,
+        rows: Sequence[Sequence[float]],
+        labels: Sequence[int],
+        *,
+        epochs: int = 500,
+        learning_rate: float = 0.5,
+        l2: float = 0.01,
+    ) -> "LogisticReranker":
+        """
+        Full-batch gradient descent with L2 regularization; positives are up-weighted to balance the classes.
+        """
+        if not rows:
+            raise ValueError("No training rows.")
+        n, dim = len(rows), len(rows[0])
+        means = [sum(r[j] for r in rows) / n for j in range(dim)]
+        scales = [math.sqrt(sum((r[j] - means[j]) ** 2 for r in rows) / n) or 1.0 for j in range(dim)]
+        xs = [[(r[j] - means[j]) / scales[j] for j in range(dim)] for r in rows]
+
+        positives = sum(labels)
+        if positives in (0, n):
+            raise ValueError(f"Training rows need both classes; got {positives} positives out of {n}.")
+        pos_weight = (n - positives) / positives
+
+        weights = [0.0] * dim
+        bias = 0.0
+        for _ in range(max(1, epochs)):
+            grad_w = [0.0] * dim
+            grad_b = 0.0
+            total = 0.0
+            for x, y in zip(xs, labels):
+                z = bias + sum(w * v for w, v in zip(weights, x))
+                p = 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z))))
+                sample_weight = pos_weight if y else 1.0
+                err = (p - y) * sample_weight
+                total += sample_weight
+                grad_b += err
+                for j in range(dim):
+                    grad_w[j] += err * x[j]
+            weights = [w - learning_rate * (g / total + l2 * w) for w, g in zip(weights, grad_w)]
+            bias -= learning_rate * grad_b / total
+
+        return cls(
+            weights = weights, bias = bias, means = means, scales = scales,
+            training = {"rows": n, "positives": positives, "epochs": epochs, "l2": l2},
+        )
+
+
+def rerank_candidates(
+    reranker: LogisticReranker,
+    stream: TokenStream,
+    retrieved: Sequence[RetrievedConcept],
+    *,
+    max_codes: int,
+    accept_margin: float = 0.0,
+    accept_min_probability: float = 0.9,
+) -> Tuple[List[RetrievedConcept], Optional[List[InferredCode]], Dict[str, Any]]:
+    """
+    Keep the max_codes most probable codes (each concept re-scored with its code's probability).
+    When accept_margin > 0 and the codes at or above accept_min_probability are separated from every other
+    code by at least that margin, they are returned as accepted inferences and the LLM can be skipped.
+    """
+    ranked = reranker.rank(stream, retrieved)
+    kept = ranked[: max(1, max_codes)]
+
+    reranked = [
+        RetrievedConcept(concept = r.concept, score = p, code = r.code)
+        for p, candidate in kept
+        for r in sorted(candidate.concepts, key = lambda r: r.score, reverse = True)
+    ]
+
+    decisions: Dict[str, Any] = {
+        "reranker": "logistic",
+        "codes_in": len(ranked),
+        "codes_kept": len(kept),
+        "top_probabilities": [round(p, 4) for p, _ in kept[:5]],
+    }
+
+    accepted = None
+    if accept_margin > 0 and ranked:
+        confident = [(p, c) for p, c in ranked if p >= accept_min_probability]
+        rest_best = ranked[len(confident)][0] if len(confident) < len(ranked) else 0.0
+        margin = (confident[-1][0] - rest_best) if confident else 0.0
+        decisions["margin"] = round(margin, 4)
+        if confident and margin >= accept_margin:
+            accepted = [
+                InferredCode(
+                    code = c.code,
+                    confidence = round(p, 2),
+                    score = p,
+                    matched_concepts = [r.concept.concept for r in c.concepts[:3]],
+                    justification = f"Accepted by the local reranker with probability {p:.2f} (margin {margin:.2f}); LLM skipped.",
+                )
+                for p, c in confident
+            ]
+            decisions["llm_skipped"] = True
+
+    return reranked, accepted, decisions
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import heapq
+import json
+import math
+import os
+import random
+import struct
+import sys
+from abc import ABC, abstractmethod
+from array import array
+from operator import mul
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .embedding_store import EmbeddingStore, _normalize
+
+
+class VectorIndex(ABC):
+    @abstractmethod
+    def build(self, store: EmbeddingStore) -> None:
+        ...
+
+    @abstractmethod
+    def search(self, query: Sequence[float], *, top_k: int = 10) -> List[Tuple[float, int]]:
+        ...
+
+    def params(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__}
+
+    def load(self, path: Path, store: EmbeddingStore) -> bool:
+        # reuse a saved build for this exact store; False means build() is needed
+        return False
+
+    def save(self, path: Path) -> None:
+        pass
+
+
+class ExactIndex(VectorIndex):
+    def __init__(self) -> None:
+        self._store: Optional[EmbeddingStore] = None
+
+    def build(self, store: EmbeddingStore) -> None:
+        self._store = store
+
+    def search(self, query: Sequence[float], *, top_k: int = 10) -> List[Tuple[float, int]]:
+        if self._store is None:
+            return []
+        return heapq.nlargest(max(1, top_k), self._store.scores(query), key = lambda x: x[0])
+
+
+class IVFIndex(VectorIndex):
+    """
+    Inverted-file index: spherical k-means partitions the store into nlist cells,
+    queries only scan the nprobe cells whose centroids are closest.
+    Raise nprobe for recall, lower it for latency.
+    """
+
+    def __init__(
+        self,
+        *,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        kmeans_iters: int = 10,
+        sample_size: int = 20000,
+        seed: int = 13,
+    ) -> None:
+        self._nlist = nlist
+        self._nprobe = max(1, int(nprobe))
+        self._kmeans_iters = max(1, int(kmeans_iters))
+        self._sample_size = max(1, int(sample_size))
+        self._seed = seed
+
+        self._store: Optional[EmbeddingStore] = None
+        self._centroids: List[List[float]] = []
+        self._lists: List[array] = []
+
+    def build(self, store: EmbeddingStore) -> None:
+        self._store = store
+        n = len(store)
+        if n == 0:
+            self._centroids, self._lists = [], []
+            return
+
+        nlist = self._nlist or int(math.sqrt(n))
+        nlist = max(1, min(nlist, n))
+
+        rng = random.Random(self._seed)
+        sample = rng.sample(range(n), min(n, max(nlist, self._sample_size)))
+        sample_vecs = [list(store.vector(i)) for i in sample]
+
+        centroids = [list(v) for v in rng.sample(sample_vecs, nlist)]
+        for _ in range(self._kmeans_iters):
+            sums = [[0.0] * store.dim for _ in range(nlist)]
+            counts = [0] * nlist
+            for vec in sample_vecs:
+                c = self._nearest_centroid(vec, centroids)
+                counts[c] += 1
+                acc = sums[c]
+                for d, x in enumerate(vec):
+                    acc[d] += x
+            for c in range(nlist):
+                # empty cells keep their previous centroid
+                if counts[c]:
+                    centroids[c] = _normalize(sums[c])
+
+        lists = [array("i") for _ in range(nlist)]
+        for i in range(n):
+            lists[self._nearest_centroid(store.vector(i), centroids)].append(i)
+
+        self._centroids = centroids
+        self._lists = lists
+
+    def search(self, query: Sequence[float], *, top_k: int = 10) -> List[Tuple[float, int]]:
+        store = self._store
+        if store is None or not self._centroids:
+            return []
+
+        query_unit = _normalize(query)
+        cells = heapq.nlargest(
+            min(self._nprobe, len(self._centroids)),
+            range(len(self._centroids)),
+            key = lambda c: _dot(query_unit, self._centroids[c]),
+        )
+        scored = ((store.score(query_unit, i), i) for c in cells for i in self._lists[c])
+        return heapq.nlargest(max(1, top_k), scored, key = lambda x: x[0])
+
+    def params(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self).__name__,
+            "nlist": len(self._centroids),
+            "nprobe": self._nprobe,
+            "kmeans_iters": self._kmeans_iters,
+        }
+
+    def _build_key(self, store: EmbeddingStore) -> Dict[str, Any]:
+        # everything the clustering depends on; nprobe is query-time only
+        return {
+            "store": store.fingerprint,
+            "nlist": self._nlist,
+            "kmeans_iters": self._kmeans_iters,
+            "sample_size": self._sample_size,
+            "seed": self._seed,
+            "byteorder": sys.byteorder,
+        }
+
+    def save(self, path: Path) -> None:
+        # layout: magic | uint32 header length | json header | float32 centroids | int32 cell members
+        store = self._store
+        if store is None or store.fingerprint is None:
+            return
+        header = dict(self._build_key(store), dim = store.dim, sizes = [len(ids) for ids in self._lists])
+        raw = json.dumps(header, sort_keys = True).encode("utf-8")
+        centroids = array("f")
+        for centroid in self._centroids:
+            centroids.extend(centroid)
+
+        path = Path(path)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(_IVF_MAGIC + struct.pack("<I", len(raw)) + raw)
+            f.write(centroids.tobytes())
+            for ids in self._lists:
+                f.write(ids.tobytes())
+        os.replace(tmp, path)
+
+    def load(self, path: Path, store: EmbeddingStore) -> bool:
+        path = Path(path)
+        if store.fingerprint is None or not path.exists():
+            return False
+        try:
+            data = path.read_bytes()
+            if data[: len(_IVF_MAGIC)] != _IVF_MAGIC:
+                return False
+            (header_len,) = struct.unpack_from("<I", data, len(_IVF_MAGIC))
+            offset = len(_IVF_MAGIC) + 4
+            header = json.loads(data[offset : offset + header_len].decode("utf-8"))
+            key = self._build_key(store)
+            if {k: header.get(k) for k in key} != key or header.get("dim") != store.dim or sum(header["sizes"]) != len(store):
+                # saved for another store or other build settings
+                return False
+
+            offset += header_len
+            sizes = header["sizes"]
+            centroids = array("f")
+            centroids.frombytes(data[offset : offset + centroids.itemsize * len(sizes) * store.dim])
+            offset += centroids.itemsize * len(centroids)
+            lists = []
+            for size in sizes:
+                ids = array("i")
+                ids.frombytes(data[offset : offset + ids.itemsize * size])
+                offset += ids.itemsize * size
+                lists.append(ids)
+        except (ValueError, KeyError, TypeError, struct.error):
+            # unreadable or truncated file: rebuild and overwrite it
+            return False
+        if len(centroids) != len(sizes) * store.dim or [len(ids) for ids in lists] != sizes:
+            return False
+
+        self._store = store
+        self._centroids = [list(centroids[c * store.dim : (c + 1) * store.dim]) for c in range(len(sizes))]
+        self._lists = lists
+        return True
+
+    @staticmethod
+    def _nearest_centroid(vec: Sequence[float], centroids: List[List[float]]) -> int:
+        best, best_score = 0, -math.inf
+        for c, centroid in enumerate(centroids):
+            score = _dot(vec, centroid)
+            if score > best_score:
+                best, best_score = c, score
+        return best
+
+
+_IVF_MAGIC = b"APIVF001"
+
+
+def _dot(a: Sequence[float], b: Sequence[float]) -> float:
+    return sum(map(mul, a, b))
+
+
+_BACKENDS = {
+    "exact": ExactIndex,
+    "ivf": IVFIndex,
+}
+
+
+def make_vector_index(
+    backend: str,
+    size: int,
+    *,
+    min_ann_size: int = 5000,
+    params: Optional[Dict[str, Any]] = None,
+) -> VectorIndex:
+    backend = (backend or "exact").strip().lower()
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown ANN backend '{backend}'. Expected one of: {', '.join(_BACKENDS)}")
+
+    # small dictionaries are faster (and exact) with a plain scan
+    if backend == "exact" or size < min_ann_size:
+        return ExactIndex()
+    return _BACKENDS[backend](**(params or {}))
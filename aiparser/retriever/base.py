@@ -1,17 +1,136 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
-from ..models import RetrievedConcept, Concept
+from ..audit_utils import utc_now_iso
+from ..models import RetrievedConcept, Concept, DictionaryChangeSet
+from ..text_utils import TokenStream
 
 
 class Retriever(ABC):
     @abstractmethod
-    def index(self, concepts: List[Concept]) -> None:
+    def index(self, concepts: List[Concept]) -> Optional[DictionaryChangeSet]:
+        # None for a first build; re-indexing (or syncing a saved index) returns what changed against the previous dictionary
         ...
 
 
     @abstractmethod
-    def retrieve(self, input_text: str, *, top_k: int = 10) -> List[RetrievedConcept]:
-        ...
\ No newline at end of file
+    def retrieve(self, input_text: str, *, top_k: int = 10, tokens: Optional[TokenStream] = None) -> List[RetrievedConcept]:
+        # tokens: the pipeline's normalized token stream for input_text, when it has one
+        ...
+
+    def retrieve_many(
+        self,
+        input_texts: Sequence[str],
+        *,
+        top_k: int = 10,
+        tokens: Optional[Sequence[TokenStream]] = None,
+    ) -> List[List[RetrievedConcept]]:
+        # several queries at once (e.g. the chunks of one document); backends override to batch remote calls
+        streams = tokens if tokens is not None else [None] * len(input_texts)
+        return [self.retrieve(text, top_k = top_k, tokens = stream) for text, stream in zip(input_texts, streams)]
+
+
+    def settings(self) -> Dict[str, Any]:
+        # configuration that changes what retrieve() returns; part of the pipeline fingerprint
+        return {}
+
+    def apply_changes(self, upserts: List[Concept], removed_codes: Iterable[str]) -> DictionaryChangeSet:
+        raise NotImplementedError(f"{type(self).__name__} does not support incremental index updates.")
+
+    def update(self, concepts: List[Concept]) -> DictionaryChangeSet:
+        # adds new codes and replaces the rows of existing ones
+        return self.apply_changes(concepts, ())
+
+    def remove(self, codes: Iterable[str]) -> DictionaryChangeSet:
+        return self.apply_changes([], codes)
+
+
+def stale_codes(current: Sequence[Concept], concepts: Sequence[Concept]) -> List[str]:
+    # codes in the current rows that a full replacement by `concepts` drops
+    new_codes = {c.code for c in concepts}
+    return sorted({c.code for c in current if c.code not in new_codes})
+
+
+def diff_concepts(current: Sequence[Concept], concepts: Sequence[Concept]) -> DictionaryChangeSet:
+    # change set of replacing the current rows by `concepts`
+    return plan_changes(list(current), list(concepts), stale_codes(current, concepts))[2]
+
+
+def combine_changes(changes: Sequence[Optional[DictionaryChangeSet]]) -> Optional[DictionaryChangeSet]:
+    # one change set for several indexes (shards or fused backends over disjoint rows); None when none changed
+    changes = [c for c in changes if c is not None]
+    if not changes:
+        return None
+    return DictionaryChangeSet(
+        added = [code for c in changes for code in c.added],
+        removed = [code for c in changes for code in c.removed],
+        updated = [code for c in changes for code in c.updated],
+        row_count = sum(c.row_count for c in changes),
+        timestamp_utc = max((c.timestamp_utc for c in changes if c.timestamp_utc), default = None),
+    )
+
+
+def plan_changes(
+    current: List[Concept],
+    upserts: List[Concept],
+    removed_codes: Iterable[str],
+) -> Tuple[List[Concept], List[Optional[int]], DictionaryChangeSet]:
+    """
+    Merge upserts/removals (by code) into the current concept rows.
+    Returns the new rows, the index of each new row in `current` (None when it must be re-indexed) and the change set.
+    Codes whose text is unchanged keep their existing index entries; a code whose rows only changed metadata or
+    code system is still reported as updated, and its new rows replace the old ones without re-indexing.
+    """
+    removed = {code for code in removed_codes}
+    incoming: Dict[str, List[Concept]] = {}
+    for concept in upserts:
+        incoming.setdefault(concept.code, []).append(concept)
+
+    existing: Dict[str, List[Tuple[int, Concept]]] = {}
+    for i, concept in enumerate(current):
+        existing.setdefault(concept.code, []).append((i, concept))
+
+    added = [code for code in incoming if code not in existing and code not in removed]
+    kept = [code for code in incoming if code in existing and code not in removed]
+    reindexed = {code for code in kept if [c.concept for _, c in existing[code]] != [c.concept for c in incoming[code]]}
+    updated = [
+        code for code in kept
+        if code in reindexed
+        or [(c.metadata, c.code_system) for _, c in existing[code]] != [(c.metadata, c.code_system) for c in incoming[code]]
+    ]
+
+    rows: List[Concept] = []
+    sources: List[Optional[int]] = []
+    emitted = set()
+    seen: Dict[str, int] = {}
+    for i, concept in enumerate(current):
+        code = concept.code
+        if code in removed:
+            continue
+        if code not in reindexed:
+            # same text: keep the index entry, but take the incoming row so metadata edits land
+            position = seen.get(code, 0)
+            seen[code] = position + 1
+            rows.append(incoming[code][position] if code in incoming else concept)
+            sources.append(i)
+            continue
+        # changed codes are re-emitted at the position of their first old row
+        if code not in emitted:
+            emitted.add(code)
+            rows.extend(incoming[code])
+            sources.extend([None] * len(incoming[code]))
+
+    for code in added:
+        rows.extend(incoming[code])
+        sources.extend([None] * len(incoming[code]))
+
+    change = DictionaryChangeSet(
+        added = added,
+        removed = sorted(code for code in removed if code in existing),
+        updated = updated,
+        row_count = len(rows),
+        timestamp_utc = utc_now_iso(),
+    )
+    return rows, sources, change
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence
+
+from ..metrics import RETRIES
+
+
+# client errors that will fail the same way on every attempt
+_NON_RETRYABLE_STATUS = {400, 401, 403, 404, 422}
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all workers: on average `rate_per_s` acquisitions per second, bursts up to `burst`.
+    """
+
+    def __init__(self, rate_per_s: float, burst: int = 1) -> None:
+        if rate_per_s <= 0:
+            raise ValueError("rate_per_s must be positive.")
+        self._rate = float(rate_per_s)
+        self._burst = max(1, int(burst))
+        self._tokens = float(self._burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self._rate
+            time.sleep(wait)
+
+
+def _retryable(error: BaseException) -> bool:
+    return getattr(error, "status_code", None) not in _NON_RETRYABLE_STATUS
+
+
+def embed_in_batches(
+    embed_batch: Callable[[List[str]], List[List[float]]],
+    texts: Sequence[str],
+    *,
+    batch_size: int,
+    max_in_flight: int = 4,
+    rate_limiter: Optional[RateLimiter] = None,
+    max_retries: int = 3,
+    backoff_s: float = 0.5,
+) -> List[List[float]]:
+    """
+    Embed texts with up to max_in_flight batch requests outstanding, returning vectors in input order.
+    A failed batch is retried on its own with exponential backoff; the build only fails if a batch
+    runs out of attempts or hits a non-retryable client error.
+    """
+    batches = [list(texts[start : start + batch_size]) for start in range(0, len(texts), max(1, batch_size))]
+    results: List[Optional[List[List[float]]]] = [None] * len(batches)
+
+    def run(b: int) -> None:
+        for attempt in range(max_retries + 1):
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            try:
+                vectors = embed_batch(batches[b])
+            except Exception as e:
+                if attempt >= max_retries or not _retryable(e):
+                    raise RuntimeError(f"Embedding batch {b + 1}/{len(batches)} failed after {attempt + 1} attempts: {e}") from e
+                sys.stderr.write(f"Warning: Embedding batch {b + 1}/{len(batches)} failed ({type(e).__name__}), retrying.\n")
+                RETRIES.inc(operation = "embedding_batch", type = type(e).__name__)
+                time.sleep(backoff_s * (2 ** attempt))
+                continue
+            if len(vectors) != len(batches[b]):
+                raise RuntimeError(f"Expected {len(batches[b])} embeddings for batch {b + 1} but got {len(vectors)}")
+            results[b] = vectors
+            return
+
+    if max_in_flight <= 1 or len(batches) <= 1:
+        for b in range(len(batches)):
+            run(b)
+    else:
+        with ThreadPoolExecutor(max_workers = max_in_flight) as executor:
+            futures = [executor.submit(run, b) for b in range(len(batches))]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    return [vector for batch in results for vector in batch]
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import dbm
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from ..audit_utils import sha256_text
+from ..text_utils import normalize_text
+
+
+def cache_key(model: str, text: str) -> str:
+    return sha256_text(f"{model}\x00{normalize_text(text)}")
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU of query embeddings keyed by (embedding model, normalized text hash).
+    With spill_path set, entries evicted from memory are kept in an on-disk dbm file and promoted back on a hit.
+    """
+
+    def __init__(self, max_entries: int = 4096, spill_path: Optional[Path | str] = None) -> None:
+        self._max_entries = max(1, int(max_entries))
+        self._entries: "OrderedDict[str, array]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._spill = dbm.open(str(spill_path), "c") if spill_path else None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector.tolist()
+
+            raw = self._spill.get(key) if self._spill is not None else None
+            if raw is None:
+                self.misses += 1
+                return None
+            vector = array("f")
+            vector.frombytes(raw)
+            self.disk_hits += 1
+            self._insert(key, vector)
+            return vector.tolist()
+
+    def put(self, key: str, vector: Sequence[float]) -> List[float]:
+        # returns the vector as stored (float32), so a fresh query scores exactly like a later cached one
+        stored = array("f", vector)
+        with self._lock:
+            self._insert(key, stored)
+        return stored.tolist()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self._max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+
+    def _insert(self, key: str, vector: array) -> None:
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            old_key, old_vector = self._entries.popitem(last = False)
+            self.evictions += 1
+            if self._spill is not None:
+                self._spill[old_key] = old_vector.tobytes()
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from operator import mul
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from ..models import Concept, ConceptTable
+
+
+# file layout: magic | uint32 header length | json header | padding | rows | (int8 only) per-row scales
+_MAGIC = b"APEMB001"
+_ALIGN = 64
+_DTYPES = ("float32", "float16", "int8")
+# a reader that lands between the two renames of a write retries this often before giving up
+_OPEN_ATTEMPTS = 5
+
+
+def _concepts_path(path: Path) -> Path:
+    return path.with_name(path.name + ".concepts.json")
+
+
+def _normalize(vec: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(float(x) * float(x) for x in vec))
+    if norm <= 0:
+        return [0.0] * len(vec)
+    return [float(x) / norm for x in vec]
+
+
+def _encode_rows(vectors: Sequence[Sequence[float]], dim: int, dtype: str) -> Tuple[bytes, bytes]:
+    if dtype == "float32":
+        data = array("f")
+        for vec in vectors:
+            data.extend(_normalize(vec))
+        return data.tobytes(), b""
+
+    if dtype == "float16":
+        row_struct = struct.Struct(f"<{dim}e")
+        return b"".join(row_struct.pack(*_normalize(vec)) for vec in vectors), b""
+
+    data = array("b")
+    scales = array("f")
+    for vec in vectors:
+        unit = _normalize(vec)
+        peak = max((abs(x) for x in unit), default = 0.0)
+        scale = peak / 127.0 if peak > 0 else 1.0
+        data.extend(max(-127, min(127, int(round(x / scale)))) for x in unit)
+        scales.append(scale)
+    return data.tobytes(), scales.tobytes()
+
+
+def _header_bytes(header: Dict[str, Any]) -> bytes:
+    raw = json.dumps(header, sort_keys = True).encode("utf-8")
+    prefix = len(_MAGIC) + 4
+    pad = (-(prefix + len(raw))) % _ALIGN
+    return _MAGIC + struct.pack("<I", len(raw) + pad) + raw + b" " * pad
+
+
+class _TableMismatch(Exception):
+    pass
+
+
+class EmbeddingStore:
+    """
+    Read-only store of L2-normalized concept embeddings.
+    File-backed stores are memory-mapped so every worker process on a host shares the same page cache.
+    """
+
+    def __init__(
+        self,
+        concepts: Sequence[Concept],
+        buffer: Any,
+        *,
+        dim: int,
+        dtype: str,
+        model: Optional[str] = None,
+        data_offset: int = 0,
+        mapping: Optional[mmap.mmap] = None,
+        fingerprint: Optional[str] = None,
+    ) -> None:
+        if dtype not in _DTYPES:
+            raise ValueError(f"Unsupported embedding dtype '{dtype}'. Expected one of: {', '.join(_DTYPES)}")
+
+        self.concepts = ConceptTable.from_concepts(concepts)
+        self.dim = dim
+        self.dtype = dtype
+        self.model = model
+        # content identity of a file-backed store; indexes derived from it are saved under this key
+        self.fingerprint = fingerprint
+        self._mapping = mapping
+
+        count = len(concepts)
+        view = memoryview(buffer)[data_offset:]
+        if dtype == "float32":
+            self._rows = view[: count * dim * 4].cast("f")
+            self._scales = None
+        elif dtype == "float16":
+            self._rows = view[: count * dim * 2]
+            self._row_struct = struct.Struct(f"<{dim}e")
+            self._scales = None
+        else:
+            self._rows = view[: count * dim].cast("b")
+            self._scales = view[count * dim : count * dim + count * 4].cast("f")
+
+    def __len__(self) -> int:
+        return len(self.concepts)
+
+    @property
+    def nbytes(self) -> int:
+        return self._rows.nbytes + (self._scales.nbytes if self._scales is not None else 0)
+
+    def vector(self, i: int) -> Sequence[float]:
+        dim = self.dim
+        if self.dtype == "float32":
+            return self._rows[i * dim : (i + 1) * dim]
+        if self.dtype == "float16":
+            return self._row_struct.unpack_from(self._rows, i * dim * 2)
+        scale = self._scales[i]
+        return [x * scale for x in self._rows[i * dim : (i + 1) * dim]]
+
+    def score(self, query_unit: Sequence[float], i: int) -> float:
+        dim = self.dim
+        if self.dtype == "int8":
+            return self._scales[i] * sum(map(mul, query_unit, self._rows[i * dim : (i + 1) * dim]))
+        return sum(map(mul, query_unit, self.vector(i)))
+
+    def scores(self, query: Sequence[float]) -> Iterator[Tuple[float, int]]:
+        query_unit = _normalize(query)
+        for i in range(len(self.concepts)):
+            yield self.score(query_unit, i), i
+
+    def close(self) -> None:
+        self._rows.release()
+        if self._scales is not None:
+            self._scales.release()
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+
+    @classmethod
+    def from_vectors(
+        cls,
+        concepts: Sequence[Concept],
+        vectors: Sequence[Sequence[float]],
+        *,
+        dtype: str = "float32",
+        model: Optional[str] = None,
+    ) -> "EmbeddingStore":
+        dim = cls._check_shape(concepts, vectors, dtype)
+        rows, scales = _encode_rows(vectors, dim, dtype)
+        return cls(concepts, rows + scales, dim = dim, dtype = dtype, model = model)
+
+    @classmethod
+    def write(
+        cls,
+        path: Path | str,
+        concepts: Sequence[Concept],
+        vectors: Sequence[Sequence[float]],
+        *,
+        dtype: str = "float32",
+        model: Optional[str] = None,
+    ) -> None:
+        path = Path(path)
+        dim = cls._check_shape(concepts, vectors, dtype)
+        rows, scales = _encode_rows(vectors, dim, dtype)
+        header = {
+            "dim": dim,
+            "count": len(concepts),
+            "dtype": dtype,
+            "model": model,
+            "byteorder": sys.byteorder,
+        }
+        table = json.dumps({
+            "model": model,
+            "rows": [[c.code, c.concept, c.metadata] for c in concepts],
+        }, ensure_ascii = False).encode("utf-8")
+        # the data header pins the exact concept table and vectors it was written with
+        header["table_sha256"] = hashlib.sha256(table).hexdigest()
+        header["data_sha256"] = hashlib.sha256(rows + scales).hexdigest()
+
+        # write to temp files and rename so readers never map a half-written store
+        path.parent.mkdir(parents = True, exist_ok = True)
+        tmp_data = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_table = path.with_name(f"{_concepts_path(path).name}.{os.getpid()}.tmp")
+        with open(tmp_data, "wb") as f:
+            f.write(_header_bytes(header))
+            f.write(rows)
+            f.write(scales)
+        with open(tmp_table, "wb") as f:
+            f.write(table)
+        os.replace(tmp_table, _concepts_path(path))
+        os.replace(tmp_data, path)
+
+    @classmethod
+    def open(cls, path: Path | str) -> "EmbeddingStore":
+        path = Path(path)
+        for attempt in range(_OPEN_ATTEMPTS):
+            try:
+                return cls._open_once(path)
+            except _TableMismatch:
+                # the data file and concept table are renamed separately; a concurrent write settles quickly
+                if attempt == _OPEN_ATTEMPTS - 1:
+                    raise ValueError(f"Concept table for {path} does not match its embeddings (store rewritten while opening?).") from None
+                time.sleep(0.05 * (attempt + 1))
+
+    @classmethod
+    def _open_once(cls, path: Path) -> "EmbeddingStore":
+        with open(path, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+        try:
+            if mapping[: len(_MAGIC)] != _MAGIC:
+                raise ValueError(f"{path} is not an embedding store file.")
+            (header_len,) = struct.unpack_from("<I", mapping, len(_MAGIC))
+            offset = len(_MAGIC) + 4
+            raw_header = bytes(mapping[offset : offset + header_len])
+            header = json.loads(raw_header.decode("utf-8"))
+            if header.get("byteorder") != sys.byteorder and header.get("dtype") != "float16":
+                raise ValueError(f"{path} was written on a {header.get('byteorder')}-endian host.")
+
+            raw_table = _concepts_path(path).read_bytes()
+            # stores written before the hash was recorded fall back to the row count check below
+            if header.get("table_sha256") and hashlib.sha256(raw_table).hexdigest() != header["table_sha256"]:
+                raise _TableMismatch()
+            table = json.loads(raw_table.decode("utf-8"))
+            concepts = ConceptTable.from_concepts([
+                Concept(code = code, concept = concept, metadata = metadata or None) for code, concept, metadata in table["rows"]
+            ])
+            if len(concepts) != header["count"]:
+                raise ValueError(f"Concept table for {path} has {len(concepts)} rows, expected {header['count']}.")
+
+            return cls(
+                concepts,
+                mapping,
+                dim = int(header["dim"]),
+                dtype = header["dtype"],
+                model = header.get("model"),
+                data_offset = offset + header_len,
+                mapping = mapping,
+                fingerprint = hashlib.sha256(raw_header).hexdigest() if header.get("data_sha256") else None,
+            )
+        except Exception:
+            mapping.close()
+            raise
+
+    @staticmethod
+    def _check_shape(concepts: Sequence[Concept], vectors: Sequence[Sequence[float]], dtype: str) -> int:
+        if dtype not in _DTYPES:
+            raise ValueError(f"Unsupported embedding dtype '{dtype}'. Expected one of: {', '.join(_DTYPES)}")
+        if len(vectors) != len(concepts):
+            raise RuntimeError(f"Expected {len(concepts)} embeddings but got {len(vectors)}")
+        dim = len(vectors[0]) if vectors else 0
+        if any(len(v) != dim for v in vectors):
+            raise ValueError("All embedding vectors must have the same dimension.")
+        return dim
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .base import Retriever
+from ..models import Concept, DictionaryChangeSet, RetrievedConcept
+from ..text_utils import TokenStream
+
+
+class FusionRetriever(Retriever):
+    """
+    Combines several retrievers as candidate sources with weighted reciprocal rank fusion.
+    Raw scores are not comparable across sources (whole-document Jaccard vs n-gram similarity vs cosine),
+    so each source contributes weight / (rank_constant + rank). The sum is scaled so a concept ranked first
+    by every source scores 1.0.
+    """
+
+    def __init__(
+        self,
+        retrievers: Sequence[Retriever],
+        *,
+        weights: Optional[Sequence[float]] = None,
+        rank_constant: int = 60,
+        depth: Optional[int] = None,
+    ) -> None:
+        if not retrievers:
+            raise ValueError("FusionRetriever needs at least one retriever.")
+        if weights is not None and len(weights) != len(retrievers):
+            raise ValueError("weights must have one entry per retriever.")
+        self._retrievers = list(retrievers)
+        self._weights = [float(w) for w in weights] if weights is not None else [1.0] * len(retrievers)
+        self._rank_constant = max(0, int(rank_constant))
+        # how many candidates to pull from each source (default: top_k)
+        self._depth = depth
+
+    @property
+    def retrievers(self) -> List[Retriever]:
+        return list(self._retrievers)
+
+    def settings(self) -> Dict[str, Any]:
+        return {
+            "retrievers": [[type(r).__name__, r.settings()] for r in self._retrievers],
+            "weights": self._weights,
+            "rank_constant": self._rank_constant,
+            "depth": self._depth,
+        }
+
+    def index(self, concepts: List[Concept]) -> Optional[DictionaryChangeSet]:
+        # every backend holds the same rows, so they report the same change
+        changes = [retriever.index(concepts) for retriever in self._retrievers]
+        return changes[0]
+
+    def apply_changes(self, upserts: List[Concept], removed_codes: Iterable[str]) -> DictionaryChangeSet:
+        removed_codes = list(removed_codes)
+        changes = [retriever.apply_changes(upserts, removed_codes) for retriever in self._retrievers]
+        return changes[0]
+
+    def retrieve(self, input_text: str, *, top_k: int = 10, tokens: Optional[TokenStream] = None) -> List[RetrievedConcept]:
+        top_k = max(1, top_k)
+        depth = max(top_k, self._depth or 0)
+        return self._fuse([r.retrieve(input_text, top_k = depth, tokens = tokens) for r in self._retrievers], top_k)
+
+    def retrieve_many(
+        self,
+        input_texts: Sequence[str],
+        *,
+        top_k: int = 10,
+        tokens: Optional[Sequence[TokenStream]] = None,
+    ) -> List[List[RetrievedConcept]]:
+        top_k = max(1, top_k)
+        depth = max(top_k, self._depth or 0)
+        per_source = [r.retrieve_many(input_texts, top_k = depth, tokens = tokens) for r in self._retrievers]
+        return [self._fuse([source[q] for source in per_source], top_k) for q in range(len(input_texts))]
+
+    def _fuse(self, ranked_lists: List[List[RetrievedConcept]], top_k: int) -> List[RetrievedConcept]:
+        k = self._rank_constant
+        best_possible = sum(w / (k + 1) for w in self._weights)
+
+        fused: Dict[Tuple[str, str], float] = {}
+        concepts: Dict[Tuple[str, str], Concept] = {}
+        for weight, ranked in zip(self._weights, ranked_lists):
+            seen = set()
+            for rank, r in enumerate(ranked, start = 1):
+                key = (r.concept.code, r.concept.concept)
+                if key in seen:
+                    continue
+                seen.add(key)
+                fused[key] = fused.get(key, 0.0) + weight / (k + rank)
+                concepts.setdefault(key, r.concept)
+
+        top = sorted(fused.items(), key = lambda x: x[1], reverse = True)[:top_k]
+        return [RetrievedConcept(concept = concepts[key], score = score / best_possible) for key, score in top]
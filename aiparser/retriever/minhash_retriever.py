@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import random
+import threading
+import zlib
+from dataclasses import dataclass
+from operator import eq
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .base import Retriever, diff_concepts, plan_changes
+from ..models import Concept, ConceptTable, DictionaryChangeSet, RetrievedConcept
+from ..text_utils import TokenStream, analyze, normalize_text, tokenize
+
+
+_PRIME = (1 << 61) - 1
+_STOPWORDS = frozenset({"and", "are", "but", "for", "from", "has", "its", "not", "only", "the", "this", "was", "when", "with"})
+
+Signature = Tuple[int, ...]
+
+
+def _words(stream: TokenStream) -> List[str]:
+    text = stream.text
+    return [
+        word for word in (text[s:e].lower() for s, e in zip(stream.starts, stream.ends))
+        if len(word) >= 3 and word not in _STOPWORDS
+    ]
+
+
+def _grams(word: str, n: int) -> List[int]:
+    # boundary markers make shared prefixes ("quant" / "quantitative") share grams
+    padded = f"^{word}$"
+    if len(padded) <= n:
+        return [zlib.crc32(padded.encode("utf-8"))]
+    return [zlib.crc32(padded[i : i + n].encode("utf-8")) for i in range(len(padded) - n + 1)]
+
+
+@dataclass(frozen = True)
+class _MinHashIndex:
+    concepts: Sequence[Concept]
+    signatures: List[Optional[Signature]]
+    # (band, band values) -> concept rows
+    buckets: Dict[Tuple[int, Signature], List[int]]
+
+
+class MinHashRetriever(Retriever):
+    """
+    Offline fuzzy retriever over character n-grams of each word.
+    Concepts are indexed as MinHash signatures in LSH buckets; a document is scanned with word windows whose
+    signatures are the elementwise min of per-word signatures (the MinHash of the union of their n-grams),
+    so only concepts sharing a bucket with some window are scored.
+    Scores are estimated n-gram Jaccard similarities between a window and a concept.
+    """
+
+    def __init__(
+        self,
+        *,
+        ngram: int = 3,
+        bands: int = 20,
+        rows_per_band: int = 3,
+        window_words: int = 4,
+        window_step: int = 2,
+        seed: int = 13,
+        word_cache_size: int = 200000,
+    ) -> None:
+        self._ngram = max(2, int(ngram))
+        self._bands = max(1, int(bands))
+        self._rows = max(1, int(rows_per_band))
+        self._window_words = max(1, int(window_words))
+        self._window_step = max(1, int(window_step))
+
+        self._seed = seed
+        rng = random.Random(seed)
+        self._perms = [
+            (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME))
+            for _ in range(self._bands * self._rows)
+        ]
+
+        # per-word signatures are shared by the dictionary and every document window
+        self._word_signatures: Dict[str, Signature] = {}
+        self._word_cache_size = max(1, int(word_cache_size))
+
+        self._index = _MinHashIndex(concepts = ConceptTable([], []), signatures = [], buckets = {})
+        self._write_lock = threading.Lock()
+
+    def settings(self) -> Dict[str, Any]:
+        return {
+            "ngram": self._ngram,
+            "bands": self._bands,
+            "rows_per_band": self._rows,
+            "window_words": self._window_words,
+            "window_step": self._window_step,
+            "seed": self._seed,
+        }
+
+    def index(self, concepts: List[Concept]) -> Optional[DictionaryChangeSet]:
+        with self._write_lock:
+            previous = self._index.concepts
+            table = ConceptTable.from_concepts(concepts)
+            self._index = self._build(table, [self._text_signature(text) for text in table.texts])
+        # a rebuild is cheap, but re-indexing still reports what changed for the dictionary audit
+        return diff_concepts(previous, table) if len(previous) else None
+
+    def apply_changes(self, upserts: List[Concept], removed_codes: Iterable[str]) -> DictionaryChangeSet:
+        with self._write_lock:
+            current = self._index
+            rows, sources, change = plan_changes(current.concepts, upserts, removed_codes)
+            if change.is_empty():
+                return change
+
+            self._index = self._build(
+                ConceptTable.from_concepts(rows),
+                [
+                    current.signatures[src] if src is not None else self._text_signature(row.concept)
+                    for row, src in zip(rows, sources)
+                ],
+            )
+            return change
+
+    def retrieve(self, input_text: str, *, top_k: int = 10, tokens: Optional[TokenStream] = None) -> List[RetrievedConcept]:
+        index = self._index
+        if not index.concepts:
+            return []
+
+        words = _words(tokens if tokens is not None else analyze(input_text))
+        if not words:
+            return []
+
+        word_sigs = [self._word_signature(w) for w in words]
+        size = min(self._window_words, len(word_sigs))
+        last = len(word_sigs) - size
+        starts = list(range(0, last + 1, self._window_step))
+        if starts[-1] != last:
+            starts.append(last)
+
+        best: Dict[int, float] = {}
+        seen_windows = set()
+        for start in starts:
+            window = tuple(map(min, *word_sigs[start : start + size])) if size > 1 else word_sigs[start]
+            if window in seen_windows:
+                continue
+            seen_windows.add(window)
+
+            candidates = set()
+            for band_key in self._band_keys(window):
+                candidates.update(index.buckets.get(band_key, ()))
+            for i in candidates:
+                score = sum(map(eq, window, index.signatures[i])) / len(window)
+                if score > best.get(i, 0.0):
+                    best[i] = score
+
+        top = sorted(best.items(), key = lambda x: (-x[1], x[0]))[: max(1, top_k)]
+        return [RetrievedConcept(concept = index.concepts[i], score = score) for i, score in top]
+
+    def _build(self, concepts: ConceptTable, signatures: List[Optional[Signature]]) -> _MinHashIndex:
+        buckets: Dict[Tuple[int, Signature], List[int]] = {}
+        for i, signature in enumerate(signatures):
+            if signature is None:
+                continue
+            for band_key in self._band_keys(signature):
+                buckets.setdefault(band_key, []).append(i)
+        return _MinHashIndex(concepts = concepts, signatures = signatures, buckets = buckets)
+
+    def _band_keys(self, signature: Signature) -> List[Tuple[int, Signature]]:
+        r = self._rows
+        return [(b, signature[b * r : (b + 1) * r]) for b in range(self._bands)]
+
+    def _text_signature(self, text: str) -> Optional[Signature]:
+        words = _words(tokenize(normalize_text(text)))
+        if not words:
+            return None
+        sigs = [self._word_signature(w) for w in words]
+        return tuple(map(min, *sigs)) if len(sigs) > 1 else sigs[0]
+
+    def _word_signature(self, word: str) -> Signature:
+        signature = self._word_signatures.get(word)
+        if signature is None:
+            grams = _grams(word, self._ngram)
+            signature = tuple(min((a * g + b) % _PRIME for g in grams) for a, b in self._perms)
+            if len(self._word_signatures) >= self._word_cache_size:
+                self._word_signatures.clear()
+            self._word_signatures[word] = signature
+        return signature
@@ -1,29 +1,34 @@
 from __future__ import annotations
 
-import math
 import threading
-from typing import List, Optional, Tuple
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
 from openai import OpenAI
 
-from .base import Retriever
-from ..models import Concept, RetrievedConcept
+from .ann import VectorIndex, make_vector_index
+from .base import Retriever, plan_changes, stale_codes
+from .embedding_batches import RateLimiter, embed_in_batches
+from .embedding_cache import QueryEmbeddingCache, cache_key
+from .embedding_store import EmbeddingStore
+from ..models import Concept, DictionaryChangeSet, RetrievedConcept
+from ..text_utils import TokenStream
 
 
-def _cosine(vec1: List[float], vec2: List[float]) -> float:
-    dot = 0.0
-    nvec1 = 0.0
-    nvec2 = 0.0
+def _same_concepts(stored: List[Concept], concepts: List[Concept]) -> bool:
+    if len(stored) != len(concepts):
+        return False
+    return all(
+        s.code == c.code and s.concept == c.concept and s.metadata == c.metadata and s.code_system == c.code_system
+        for s, c in zip(stored, concepts)
+    )
 
-    for i in range(len(vec1)):
-        vec1_i = float(vec1[i])
-        vec2_i = float(vec2[i])
-        dot += vec1_i * vec2_i
-        nvec1 += vec1_i * vec1_i
-        nvec2 += vec2_i * vec2_i
-    
-    denom = math.sqrt(nvec1) * math.sqrt(nvec2)
-    return dot / denom if denom > 0 else 0.0
+
+@dataclass(frozen = True)
+class _EmbeddingIndex:
+    store: EmbeddingStore
+    vector_index: VectorIndex
 
 
 class OpenAIEmbeddingRetriever(Retriever):
@@ -35,67 +40,203 @@ class OpenAIEmbeddingRetriever(Retriever):
         base_url: str = "https://api.openai.com/v1",
         embedding_model: str = "text-embedding-3-small",
         batch_size: int = 128,
+        store_path: Optional[str] = None,
+        store_dtype: str = "float32",
+        ann_backend: str = "exact",
+        ann_min_size: int = 5000,
+        ann_params: Optional[Dict[str, Any]] = None,
+        max_concurrency: int = 4,
+        requests_per_minute: Optional[float] = None,
+        max_retries: int = 3,
+        query_cache_size: int = 4096,
+        query_cache_path: Optional[str] = None,
     ) -> None:
         self._client = OpenAI(api_key = api_key, base_url = base_url)
         self._embedding_model = embedding_model
         self._batch_size = max(1, int(batch_size))
 
-        self._concepts: List[Concept] = []
-        self._vectors: List[List[float]] = []
-        self._indexed = False
+        # index builds keep up to max_concurrency embedding requests in flight, paced by requests_per_minute
+        self._max_concurrency = max(1, int(max_concurrency))
+        self._rate_limiter = RateLimiter(requests_per_minute / 60.0, burst = self._max_concurrency) if requests_per_minute else None
+        self._max_retries = max(0, int(max_retries))
+
+        # repeated query texts (retries, duplicate policies, boilerplate chunks) reuse their embedding
+        self.query_cache = QueryEmbeddingCache(query_cache_size, query_cache_path) if query_cache_size > 0 else None
+
+        # when store_path is set the embeddings live in a memory-mapped file shared by all workers on the host
+        self._store_path = Path(store_path) if store_path else None
+        self._store_dtype = store_dtype
+
+        self._ann_backend = ann_backend
+        self._ann_min_size = max(0, int(ann_min_size))
+        self._ann_params = dict(ann_params or {})
+
+        # live index snapshot, swapped atomically so in-flight retrieve() calls keep a consistent view
+        self._index: Optional[_EmbeddingIndex] = None
 
         self._lock = threading.Lock()
 
-    def index(self, concepts: List[Concept]) -> None:
-        with self._lock:
-            if self._indexed: # TODO - support re-indexing with new concepts
-                return
-            
-            self._concepts = concepts
-            texts = [c.concept for c in concepts]
-
-            vectors: List[List[float]] = []
-            for start in range(0, len(texts), self._batch_size):
-                batch = texts[start : start + self._batch_size]
-                response = self._client.embeddings.create(
-                    input = batch,
-                    model = self._embedding_model,
-                )
-                for item in response.data:
-                    vectors.append(list(item.embedding))
+    def settings(self) -> Dict[str, Any]:
+        return {
+            "embedding_model": self._embedding_model,
+            "store_dtype": self._store_dtype,
+            "ann_backend": self._ann_backend,
+            "ann_min_size": self._ann_min_size,
+            "ann_params": self._ann_params,
+        }
 
-            if len(vectors) != len(concepts):
-                raise RuntimeError(
-                    f"Expected {len(concepts)} embeddings but got {len(vectors)}"
-                )
-            
-            self._vectors = vectors
-            self._indexed = True
+    def index(self, concepts: List[Concept]) -> Optional[DictionaryChangeSet]:
+        if self._index is not None:
+            # already indexed: only embed rows that differ from the live index
+            return self.apply_changes(concepts, stale_codes(self._index.store.concepts, concepts))
 
-    def retrieve(self, input_text: str, *, top_k: int = 10) -> List[RetrievedConcept]:
-        if not self._indexed or not self._concepts or not self._vectors:
-            return []
+        with self._lock:
+            store = self._open_existing_store()
+            if store is None:
+                self._index = self._build_index(self._build_store(concepts, self._embed([c.concept for c in concepts])))
+                return None
+            if _same_concepts(store.concepts, concepts):
+                self._index = self._build_index(store)
+                return None
+
+            # the saved store holds an earlier version of the dictionary: embed only the rows changed since
+            synced, change = self._apply(store, concepts, stale_codes(store.concepts, concepts))
+            if synced is not store:
+                store.close()
+            self._index = self._build_index(synced)
+            return change
+
+    def apply_changes(self, upserts: List[Concept], removed_codes: Iterable[str]) -> DictionaryChangeSet:
+        with self._lock:
+            if self._index is None:
+                raise RuntimeError("Retriever must be indexed before applying incremental changes.")
+
+            store, change = self._apply(self._index.store, upserts, removed_codes)
+            if not change.is_empty():
+                # the previous store stays mapped until in-flight readers drop their reference
+                self._index = self._build_index(store)
+            return change
+
+    def _apply(self, store: EmbeddingStore, upserts: List[Concept], removed_codes: Iterable[str]) -> Tuple[EmbeddingStore, DictionaryChangeSet]:
+        rows, sources, change = plan_changes(store.concepts, upserts, removed_codes)
+        if change.is_empty():
+            return store, change
+
+        fresh = [i for i, src in enumerate(sources) if src is None]
+        fresh_vectors = iter(self._embed([rows[i].concept for i in fresh]))
+        vectors = [
+            list(store.vector(src)) if src is not None else next(fresh_vectors)
+            for src in sources
+        ]
+        return self._build_store(rows, vectors), change
+
+    def retrieve(self, input_text: str, *, top_k: int = 10, tokens: Optional[TokenStream] = None) -> List[RetrievedConcept]:
+        return self.retrieve_many([input_text], top_k = top_k)[0]
+
+    def retrieve_many(
+        self,
+        input_texts: Sequence[str],
+        *,
+        top_k: int = 10,
+        tokens: Optional[Sequence[TokenStream]] = None,
+    ) -> List[List[RetrievedConcept]]:
+        index = self._index
+        if index is None or not len(index.store):
+            return [[] for _ in input_texts]
         
         top_k = max(1, top_k)
-
-        query = self._client.embeddings.create(
+        queries = self._query_embeddings(input_texts)
+
+        results = []
+        for query in queries:
+            top = [(score, i) for score, i in index.vector_index.search(query, top_k = top_k) if score > 0]
+            results.append([
+                RetrievedConcept(
+                    concept = index.store.concepts[i], score = float(score)
+                )
+                for score, i in top
+            ])
+        return results
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.query_cache.stats() if self.query_cache is not None else {}
+
+    def _query_embeddings(self, texts: Sequence[str]) -> List[List[float]]:
+        cache = self.query_cache
+        keys = [cache_key(self._embedding_model, text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key in found or key in missing:
+                continue
+            vector = cache.get(key) if cache is not None else None
+            if vector is None:
+                missing[key] = text
+            else:
+                found[key] = vector
+
+        # every uncached query of this call goes out in one embeddings request (split only at batch_size)
+        pending = list(missing.items())
+        for start in range(0, len(pending), self._batch_size):
+            chunk = pending[start : start + self._batch_size]
+            vectors = self._embed_batch([text for _, text in chunk])
+            for (key, _), vector in zip(chunk, vectors):
+                found[key] = cache.put(key, vector) if cache is not None else vector
+
+        return [found[key] for key in keys]
+
+    def index_params(self) -> Dict[str, Any]:
+        return self._index.vector_index.params() if self._index is not None else {}
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        return embed_in_batches(
+            self._embed_batch, texts,
+            batch_size = self._batch_size,
+            max_in_flight = self._max_concurrency,
+            rate_limiter = self._rate_limiter,
+            max_retries = self._max_retries,
+        )
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        response = self._client.embeddings.create(
+            input = batch,
             model = self._embedding_model,
-            input = input_text,
-        ).data[0].embedding
-        query_vec = list(query)
-
-        scored: List[Tuple[float, int]] = []
-        for i, concept_vec in enumerate(self._vectors):
-            score = _cosine(query_vec, concept_vec)
-            if score > 0:
-                scored.append((score, i))
-
-        scored.sort(reverse = True, key = lambda x: x[0])
-        top = scored[: top_k]
-
-        return [
-            RetrievedConcept(
-                concept = self._concepts[i], score = float(score)
+        )
+        return [list(item.embedding) for item in sorted(response.data, key = lambda item: item.index)]
+
+    def _build_store(self, concepts: List[Concept], vectors: List[List[float]]) -> EmbeddingStore:
+        if self._store_path is None:
+            return EmbeddingStore.from_vectors(
+                concepts, vectors,
+                dtype = self._store_dtype, model = self._embedding_model,
             )
-            for score, i in top
-        ]
\ No newline at end of file
+
+        EmbeddingStore.write(
+            self._store_path, concepts, vectors,
+            dtype = self._store_dtype, model = self._embedding_model,
+        )
+        return EmbeddingStore.open(self._store_path)
+
+    def _build_index(self, store: EmbeddingStore) -> _EmbeddingIndex:
+        vector_index = make_vector_index(
+            self._ann_backend, len(store),
+            min_ann_size = self._ann_min_size, params = self._ann_params,
+        )
+        # a clustering built for this exact store is saved next to it, so worker starts skip the rebuild
+        saved = self._store_path.with_name(self._store_path.name + ".ivf") if self._store_path is not None else None
+        if saved is None or not vector_index.load(saved, store):
+            vector_index.build(store)
+            if saved is not None:
+                vector_index.save(saved)
+        return _EmbeddingIndex(store = store, vector_index = vector_index)
+
+    def _open_existing_store(self) -> Optional[EmbeddingStore]:
+        if self._store_path is None or not self._store_path.exists():
+            return None
+
+        store = EmbeddingStore.open(self._store_path)
+        if store.model != self._embedding_model or store.dtype != self._store_dtype:
+            # vectors from another embedding model (or stored at another precision) cannot be reused
+            store.close()
+            return None
+        return store
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence
+
+from .base import Retriever, combine_changes
+from ..models import Concept, DictionaryChangeSet, RetrievedConcept
+from ..text_utils import TokenStream
+
+
+class ShardedRetriever(Retriever):
+    """
+    One retriever shard per code system (HCPCS, ICD-10-CM, ...), queried concurrently.
+    Each shard ranks only its own dictionary and returns up to its own top_k budget; results are merged by
+    score and tagged with the shard's code system. Concepts are routed to shards by Concept.code_system.
+    """
+
+    def __init__(
+        self,
+        shards: Mapping[str, Retriever],
+        *,
+        top_k: Optional[Mapping[str, int]] = None,
+        max_workers: Optional[int] = None,
+    ) -> None:
+        if not shards:
+            raise ValueError("ShardedRetriever needs at least one shard.")
+        self._shards = dict(shards)
+        self._budgets = {name: int(k) for name, k in (top_k or {}).items() if k}
+        unknown = set(self._budgets) - set(self._shards)
+        if unknown:
+            raise ValueError(f"top_k given for unknown code systems: {', '.join(sorted(unknown))}")
+        self._executor = ThreadPoolExecutor(max_workers = max_workers or len(self._shards), thread_name_prefix = "shard")
+
+    @property
+    def shards(self) -> Dict[str, Retriever]:
+        return dict(self._shards)
+
+    def settings(self) -> Dict[str, Any]:
+        return {
+            "shards": {name: [type(shard).__name__, shard.settings()] for name, shard in sorted(self._shards.items())},
+            "top_k": self._budgets,
+        }
+
+    def budget(self, code_system: str, top_k: int) -> int:
+        return self._budgets.get(code_system, top_k)
+
+    def index(self, concepts: List[Concept]) -> Optional[DictionaryChangeSet]:
+        return self.index_shards(self._partition(concepts))
+
+    def index_shards(self, dictionaries: Mapping[str, Sequence[Concept]]) -> Optional[DictionaryChangeSet]:
+        # one dictionary per shard, indexed concurrently; shards missing from the mapping are indexed empty
+        unknown = set(dictionaries) - set(self._shards)
+        if unknown:
+            raise ValueError(f"Unknown code systems: {', '.join(sorted(unknown))}")
+        return combine_changes(list(self._executor.map(lambda name: self._shards[name].index(dictionaries.get(name, [])), self._shards)))
+
+    def apply_changes(self, upserts: List[Concept], removed_codes: Iterable[str]) -> DictionaryChangeSet:
+        parts = self._partition(upserts)
+        removed_codes = list(removed_codes)
+        return combine_changes([shard.apply_changes(parts.get(name, []), removed_codes) for name, shard in self._shards.items()])
+
+    def retrieve(self, input_text: str, *, top_k: int = 10, tokens: Optional[TokenStream] = None) -> List[RetrievedConcept]:
+        futures = {
+            name: self._executor.submit(shard.retrieve, input_text, top_k = self.budget(name, top_k), tokens = tokens)
+            for name, shard in self._shards.items()
+        }
+        return self._merge({name: future.result() for name, future in futures.items()})
+
+    def retrieve_many(
+        self,
+        input_texts: Sequence[str],
+        *,
+        top_k: int = 10,
+        tokens: Optional[Sequence[TokenStream]] = None,
+    ) -> List[List[RetrievedConcept]]:
+        futures = {
+            name: self._executor.submit(shard.retrieve_many, input_texts, top_k = self.budget(name, top_k), tokens = tokens)
+            for name, shard in self._shards.items()
+        }
+        per_shard = {name: future.result() for name, future in futures.items()}
+        return [self._merge({name: results[q] for name, results in per_shard.items()}) for q in range(len(input_texts))]
+
+    def close(self) -> None:
+        self._executor.shutdown(wait = False)
+
+    def _partition(self, concepts: Iterable[Concept]) -> Dict[str, List[Concept]]:
+        parts: Dict[str, List[Concept]] = {}
+        default = next(iter(self._shards)) if len(self._shards) == 1 else None
+        for concept in concepts:
+            name = concept.code_system or default
+            if name not in self._shards:
+                raise ValueError(f"Concept {concept.code} has code system '{concept.code_system}', expected one of: {', '.join(self._shards)}")
+            parts.setdefault(name, []).append(concept if concept.code_system == name else replace(concept, code_system = name))
+        return parts
+
+    @staticmethod
+    def _merge(results: Dict[str, List[RetrievedConcept]]) -> List[RetrievedConcept]:
+        # backends that persist their own concept rows (e.g. embedding stores) may hand back untagged concepts
+        merged = [
+            r if r.concept.code_system == name else replace(r, concept = replace(r.concept, code_system = name))
+            for name, retrieved in results.items()
+            for r in retrieved
+        ]
+        merged.sort(key = lambda r: r.score, reverse = True)
+        return merged
@@ -1,52 +1,106 @@
 from __future__ import annotations
 
-import re
-from typing import List, Tuple
+import threading
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
-from .base import Retriever
-from ..models import Concept, RetrievedConcept
+from .base import Retriever, diff_concepts, plan_changes
+from ..models import Concept, ConceptTable, DictionaryChangeSet, RetrievedConcept
+from ..text_utils import TokenStream, analyze, normalize_text, tokenize
 
 
-_WORD_REGEX = re.compile(r"[A-Za-z0-9]+(?:[-'][A-Za-z0-9]+)?")
+def _tokens(s: str) -> array:
+    # sorted unique vocabulary ids; dictionary text grows the shared vocabulary so document streams resolve to the same ids
+    return array("i", sorted(tokenize(normalize_text(s), grow = True).id_set()))
 
-def _tokens(s: str) -> set[str]:
-    return {m.group(0).lower() for m in _WORD_REGEX.finditer(s)}
 
-
-def _jaccard(tokens1: set[str], tokens2: set[str]) -> float:
-    if not tokens1 and not tokens2:
+def _jaccard(intersection: int, size1: int, size2: int) -> float:
+    # |A ∪ B| = |A| + |B| - |A ∩ B|, so no union set is ever built
+    if not size1 and not size2:
         return 1.0
-    intersection = tokens1.intersection(tokens2)
-    union = tokens1.union(tokens2)
-    return len(intersection) / len(union) if union else 0.0
+    union = size1 + size2 - intersection
+    return intersection / union if union else 0.0
+
+
+@dataclass(frozen = True)
+class _TokenIndex:
+    concepts: Sequence[Concept]
+    concept_tokens: List[array]
+    # token id -> concept rows containing it, ascending
+    postings: Dict[int, array]
+    # rows whose description has no tokens (they only match an empty query)
+    empty_rows: array
+
+    @classmethod
+    def build(cls, concepts: Sequence[Concept], concept_tokens: List[array]) -> "_TokenIndex":
+        postings: Dict[int, array] = {}
+        empty_rows = array("i")
+        for i, tokens in enumerate(concept_tokens):
+            if not tokens:
+                empty_rows.append(i)
+            for token_id in tokens:
+                rows = postings.get(token_id)
+                if rows is None:
+                    rows = postings[token_id] = array("i")
+                rows.append(i)
+        return cls(concepts = concepts, concept_tokens = concept_tokens, postings = postings, empty_rows = empty_rows)
 
 
 class TokenRetriever(Retriever):
     def __init__(self) -> None:
-        self._concepts: List[Concept] = []
-        self._concept_tokens: List[set[str]] = []
+        # retrieve() reads the snapshot once, updates build a new one and swap it in
+        self._index = _TokenIndex.build(ConceptTable([], []), [])
+        self._write_lock = threading.Lock()
 
-    def index(self, concepts: List[Concept]) -> None:
-        self._concepts = concepts
-        self._concept_tokens = [_tokens(c.concept) for c in self._concepts]
+    def index(self, concepts: List[Concept]) -> Optional[DictionaryChangeSet]:
+        with self._write_lock:
+            previous = self._index.concepts
+            table = ConceptTable.from_concepts(concepts)
+            self._index = _TokenIndex.build(table, [_tokens(text) for text in table.texts])
+        # a rebuild is cheap, but re-indexing still reports what changed for the dictionary audit
+        return diff_concepts(previous, table) if len(previous) else None
 
-    def retrieve(self, input_text: str, *, top_k: int = 10) -> List[RetrievedConcept]:
-        if not self._concepts:
+    def apply_changes(self, upserts: List[Concept], removed_codes: Iterable[str]) -> DictionaryChangeSet:
+        with self._write_lock:
+            current = self._index
+            rows, sources, change = plan_changes(current.concepts, upserts, removed_codes)
+            if change.is_empty():
+                return change
+
+            self._index = _TokenIndex.build(
+                ConceptTable.from_concepts(rows),
+                [
+                    current.concept_tokens[src] if src is not None else _tokens(row.concept)
+                    for row, src in zip(rows, sources)
+                ],
+            )
+            return change
+
+    def retrieve(self, input_text: str, *, top_k: int = 10, tokens: Optional[TokenStream] = None) -> List[RetrievedConcept]:
+        index = self._index
+        if not index.concepts:
             return []
         
-        q = _tokens(input_text)
+        q = (tokens if tokens is not None else analyze(input_text)).id_set()
         scored: List[Tuple[float, int]] = []
-        for i, concept in enumerate(self._concept_tokens):
-            score = _jaccard(q, concept)
-            if score > 0:
-                scored.append((score, i))
-
-
+        if q:
+            # only rows sharing at least one token can score above zero; count shared tokens per row from the postings
+            postings = index.postings
+            hits = Counter(chain.from_iterable(postings[t] for t in q if t in postings))
+            q_size = len(q)
+            concept_tokens = index.concept_tokens
+            for i in sorted(hits):
+                scored.append((_jaccard(hits[i], q_size, len(concept_tokens[i])), i))
+        else:
+            scored = [(1.0, i) for i in index.empty_rows]
 
         scored.sort(reverse = True, key = lambda x: x[0])
         top = scored[: max(1, top_k)]
 
         return [
-            RetrievedConcept(concept = self._concepts[i], score = score)
+            RetrievedConcept(concept = index.concepts[i], score = score)
             for score, i in top
-        ]
\ No newline at end of file
+        ]
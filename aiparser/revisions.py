@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .models import Concept, InferredCode, RetrievedConcept, to_jsonable
+
+
+@dataclass(frozen = True)
+class Revision:
+    """
+    What the last coded version of a document left behind: per-section fingerprints with their raw retrieval
+    results, the fingerprint of the candidate set the model saw, and the codes it returned.
+    `context` identifies the pipeline and dictionary; a revision computed under another context is not reused.
+    """
+    context: str
+    sections: Dict[str, List[RetrievedConcept]]
+    candidates: str
+    inferred: List[InferredCode]
+
+
+def _concept_row(r: RetrievedConcept) -> List[Any]:
+    c = r.concept
+    return [c.code, c.concept, r.score, c.code_system, c.metadata]
+
+
+def _from_row(row: List[Any]) -> RetrievedConcept:
+    code, concept, score, code_system, metadata = row
+    return RetrievedConcept(concept = Concept(code = code, concept = concept, metadata = metadata, code_system = code_system), score = score)
+
+
+class RevisionStore:
+    """
+    Append-only JSONL store of the latest Revision per document id (the last line for an id wins).
+    Superseded lines are dropped when the file is rewritten on load once they outnumber the live ones.
+    """
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._latest: Dict[str, Revision] = {}
+        self._lines = 0
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._latest)
+
+    def get(self, doc_id: str, context: str) -> Optional[Revision]:
+        revision = self._latest.get(doc_id)
+        return revision if revision is not None and revision.context == context else None
+
+    def put(self, doc_id: str, revision: Revision) -> None:
+        line = json.dumps(self._to_record(doc_id, revision), ensure_ascii = False)
+        with self._lock:
+            with open(self.path, "a", encoding = "utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._latest[doc_id] = revision
+            self._lines += 1
+
+    def share(self, doc_id: str, other_ids: List[str]) -> None:
+        # documents whose text was computed once for several ids start their next revision from the same state
+        revision = self._latest.get(doc_id)
+        if revision is not None:
+            for other in other_ids:
+                if other != doc_id:
+                    self.put(other, revision)
+
+    @staticmethod
+    def _to_record(doc_id: str, revision: Revision) -> Dict[str, Any]:
+        return {
+            "id": doc_id,
+            "context": revision.context,
+            "sections": {h: [_concept_row(r) for r in retrieved] for h, retrieved in revision.sections.items()},
+            "candidates": revision.candidates,
+            "inferred": to_jsonable(revision.inferred),
+        }
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        with open(self.path, "r", encoding = "utf-8") as f:
+            for line_no, line in enumerate(f, start = 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    self._latest[record["id"]] = Revision(
+                        context = record["context"],
+                        sections = {h: [_from_row(row) for row in rows] for h, rows in record["sections"].items()},
+                        candidates = record["candidates"],
+                        inferred = [InferredCode(**c) for c in record["inferred"]],
+                    )
+                except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                    # includes a line torn by a crash mid-write; that document is simply recoded in full
+                    sys.stderr.write(f"Warning: Ignoring unreadable revision line {line_no} in {self.path}.\n")
+                    continue
+                self._lines += 1
+        with open(self.path, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            torn = size > 0 and f.seek(size - 1) >= 0 and f.read(1) != b"\n"
+        if torn or self._lines > 2 * len(self._latest):
+            self._rewrite()
+
+    def _rewrite(self) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding = "utf-8") as f:
+            for doc_id, revision in self._latest.items():
+                f.write(json.dumps(self._to_record(doc_id, revision), ensure_ascii = False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._lines = len(self._latest)
@@ -1,90 +1,458 @@
+import argparse
 import json
 import sys
 
+from concurrent.futures import ThreadPoolExecutor
+
 from pathlib import Path
-from dataclasses import asdict
-from typing import List, Dict, Any
+from dataclasses import replace
+from typing import List, Dict, Any, Optional
 
-from aiparser.audit_utils import sha256_file
+from aiparser.audit_levels import AUDIT_LEVELS, check_audit_level, document_audit
+from aiparser.audit_utils import group_identical_texts, sha256_text, shared_computation_note
+from aiparser.checkpoint import CheckpointJournal, RetryFile
 from aiparser.csv_loader import load_concepts_from_csv, CsvSchema
-from aiparser.input_csv_loader import InputCsvSchema, load_input_data_from_csv
-from aiparser.pipeline import CodeInferencePipeline, PipelineConfig
-from aiparser.models import AuditTrail, DictionaryAudit, InferenceResult, InferredCode, Concept, Input, Output
+from aiparser.dictionaries import DictionarySpec, build_dictionaries
+from aiparser.metrics import export, observe_dictionary, record_usage, watch_retriever
+from aiparser.input_csv_loader import InputCsvSchema, InputFile, InputFileQueue, expand_input_paths
+from aiparser.pipeline import CodeInferencePipeline, PipelineConfig, tag_code_systems
+from aiparser.models import AuditTrail, DictionaryAudit, InferredCode, Concept, Input, InputFileAudit, Output, RetrievedConcept, RunManifest, to_jsonable
 
-from aiparser.retriever.token_retriever import TokenRetriever
-from aiparser.retriever.openai_embeddint_retriever import OpenAIEmbeddingRetriever
+from aiparser.llm.base import CodeInferenceModel
 from aiparser.llm.mock_inference import MockCodeInferenceModel
-from aiparser.llm.openai_inference import OpenAIInferenceModel
+from aiparser.llm.openai_batch import BatchJob, LocalBatchClient
+from aiparser.registry import create_model, create_retriever
+from aiparser.reranker import LogisticReranker
+from aiparser.revisions import RevisionStore
+from aiparser.serialization import compact_records, write_json
+from aiparser.sharding import merge_shards, parse_shard, select_shard
 
 from aiparser.audit_utils import env_fingerprint, new_run_id, utc_now_iso
 
-def main(input: str, output: str):
+
+def run_batch_job(
+    pipeline: CodeInferencePipeline,
+    model: CodeInferenceModel,
+    inputs: List[Input],
+    audits: List[AuditTrail],
+    job: BatchJob,
+    context: str = "",
+) -> List[Output]:
+    # retrieval runs locally once; prompts and audits are persisted so a restart can skip straight to polling
+    prepared_path = job.job_dir / "prepared.jsonl"
+    # a restart must see the same documents in the same order under the same pipeline and dictionary
+    job.check_inputs({
+        "input_hash": sha256_text(json.dumps([[input.id, input.name, input.text] for input in inputs], ensure_ascii=False)),
+        "ids": [input.id for input in inputs],
+        "pipeline": pipeline.fingerprint(context),
+    })
+
+    if not job.state.get("requests_written"):
+        requests = []
+        hashes, groups = group_identical_texts([input.text for input in inputs])
+        with open(prepared_path, "w", encoding="utf-8") as f:
+            for i, (input, audit) in enumerate(zip(inputs, audits)):
+                custom_id = f"{i}:{input.id}"
+                members = groups[hashes[i]]
+                source = members[0]
+                record = {
+                    "custom_id": custom_id,
+                    "source_custom_id": f"{source}:{inputs[source].id}",
+                    "id": input.id,
+                    "name": input.name,
+                }
+                if len(members) > 1:
+                    record["shared_computation"] = shared_computation_note(hashes[i], inputs[source].id, [inputs[m].id for m in members])
+
+                if i == source:
+                    # only the first document of an identical-text group is retrieved and sent to the batch
+                    stream = pipeline.analyze(input.text)
+                    retrieved, call_audit, accepted = pipeline.screen(input.text, audit_trail = audit, stream = stream)
+                    if accepted is not None:
+                        # the reranker was confident enough that no model request is needed
+                        record["accepted"] = to_jsonable(accepted)
+                    else:
+                        body = model.build_chat_request(stream.text, retrieved, audit = call_audit.model)
+                        requests.append((custom_id, body))
+                    record["retrieved"] = [{"code": r.concept.code, "concept": r.concept.concept, "score": r.score, "code_system": r.concept.code_system} for r in retrieved]
+                    record["audit"] = to_jsonable(call_audit)
+                elif audit is not None:
+                    record["run_id"] = audit.run_id
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        job.write_requests(requests)
+
+    if job.state.get("request_count", 1):
+        job.submit()
+        status = job.wait()
+        if status != "completed":
+            raise RuntimeError(f"Batch {job.batch_id} finished with status '{status}'.")
+        batch_results = job.results()
+    else:
+        batch_results = {}
+
+    records = []
+    with open(prepared_path, "r", encoding="utf-8") as f:
+        for line in f:
+            records.append(json.loads(line))
+    sources = {record["custom_id"]: record for record in records if record["custom_id"] == record["source_custom_id"]}
+
+    outputs = []
+    for record in records:
+        source = sources[record["source_custom_id"]]
+        retrieved = [
+            RetrievedConcept(concept = Concept(code = r["code"], concept = r["concept"], code_system = r.get("code_system")), score = r["score"])
+            for r in source["retrieved"]
+        ]
+        audit = json.loads(json.dumps(source["audit"]))
+        params = audit["model"].get("params") or {}
+        if "accepted" not in source:
+            params.update({"batch_id": job.batch_id, "custom_id": source["custom_id"]})
+        if record.get("run_id"):
+            audit["run_id"] = record["run_id"]
+        if record.get("shared_computation"):
+            audit["shared_computation"] = record["shared_computation"]
+
+        result = batch_results.get(source["custom_id"], {"error": "missing from batch output"})
+        inferred: List[InferredCode] = []
+        if "accepted" in source:
+            inferred = [InferredCode(**item) for item in source["accepted"]]
+        elif "content" in result:
+            try:
+                inferred = model.parse_chat_content(result["content"], retrieved)
+            except (json.JSONDecodeError, ValueError) as e:
+                params["batch_error"] = f"unparseable response: {e}"
+            audit["model"]["raw_output"] = result["content"]
+            params["usage"] = result.get("usage")
+            record_usage(result.get("usage"))
+        else:
+            params["batch_error"] = result["error"]
+        audit["model"]["params"] = params
+
+        outputs.append(Output(
+            id = record["id"],
+            name = record["name"],
+            inferred_codes = to_jsonable(tag_code_systems(inferred, retrieved)),
+            audit = audit,
+        ))
+    return outputs
+
+
+def run_with_checkpoint(
+    pipeline: CodeInferencePipeline,
+    inputs: List[Input],
+    audits: List[AuditTrail],
+    journal: CheckpointJournal,
+    retry: RetryFile,
+    workers: int = 1,
+    revisions: RevisionStore = None,
+    revision_context: str = "",
+    computed: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> List[Output]:
+    # documents already in the journal are skipped; a failing document goes to the retry file instead of aborting the run
+    # identical texts are computed once and fanned out to every id that carries them; `computed` (text hash -> output
+    # of the document it was computed for) carries that across calls, so a text repeated in a later file is not recomputed
+    computed = computed if computed is not None else {}
+    hashes, groups = group_identical_texts([input.text for input in inputs])
+    pending = [h for h, members in groups.items() if any(journal.completed(inputs[i].id, h) is None for i in members)]
+    skipped = sum(1 for i, input in enumerate(inputs) if journal.completed(input.id, hashes[i]) is not None)
+    if skipped:
+        sys.stderr.write(
+            f"Warning: Resuming from {journal.path}: {skipped} documents are taken from an earlier run with the same "
+            f"pipeline and dictionary instead of being recomputed. Delete the journal to recompute them.\n"
+        )
+    duplicates = len(inputs) - len(groups) + sum(1 for h in groups if h in computed)
+    if duplicates:
+        sys.stderr.write(f"{duplicates} documents share text with another document and reuse its result.\n")
+
+    def process(text_hash: str) -> None:
+        members = groups[text_hash]
+        source = next((i for i in members if journal.completed(inputs[i].id, text_hash) is not None), members[0])
+        done = journal.completed(inputs[source].id, text_hash)
+        if done is None and text_hash in computed:
+            # computed for a document of an earlier file in this run
+            done = computed[text_hash]
+            if revisions is not None:
+                revisions.share(done["id"], [inputs[i].id for i in members])
+
+        if done is None:
+            input = inputs[source]
+            try:
+                if revisions is not None:
+                    # revised documents only re-retrieve changed sections and reuse the model result when the candidates match
+                    raw_out = pipeline.run_incremental(input.id, input.text, revisions, audit_trail = audits[source], context = revision_context)
+                    revisions.share(input.id, [inputs[i].id for i in members])
+                else:
+                    raw_out = pipeline.run(input.text, audit_trail = audits[source])
+            except Exception as e:
+                sys.stderr.write(f"Document {input.id} failed: {type(e).__name__}: {e}\n")
+                for i in members:
+                    retry.record(inputs[i].id, inputs[i].name, text_hash, e)
+                return
+
+            out = to_jsonable(raw_out)
+            inferred_codes = out.get("inferred", [])
+            assert isinstance(inferred_codes, list), f"Expected 'inferred' to be a list, got {type(inferred_codes)}"
+            done = to_jsonable(Output(id = input.id, name = input.name, inferred_codes = inferred_codes, audit = out.get("audit", None)))
+        computed.setdefault(text_hash, done)
+
+        group_ids = [inputs[i].id for i in members]
+        if done["id"] not in group_ids:
+            group_ids = [done["id"]] + group_ids
+        for i in members:
+            if journal.completed(inputs[i].id, text_hash) is not None:
+                continue
+            audit = dict(done["audit"]) if done["audit"] else None
+            if audit is not None and len(group_ids) > 1:
+                if audits[i] is not None:
+                    audit["run_id"] = audits[i].run_id
+                audit["shared_computation"] = shared_computation_note(text_hash, done["id"], group_ids)
+            journal.record(inputs[i].id, text_hash, {**done, "id": inputs[i].id, "name": inputs[i].name, "audit": audit})
+
+    if workers <= 1:
+        for text_hash in pending:
+            process(text_hash)
+    else:
+        with ThreadPoolExecutor(max_workers = workers) as executor:
+            list(executor.map(process, pending))
+
+    results = []
+    for input, text_hash in zip(inputs, hashes):
+        done = journal.completed(input.id, text_hash)
+        if done is not None:
+            results.append(Output(**done))
+            # documents restored from the journal can stand in for the same text in later files too
+            computed.setdefault(text_hash, done)
+    return results
+
+
+def local_batch_responder(job_dir: Path):
+    # answers batch requests with the mock model over the candidates retrieved for each document
+    mock = MockCodeInferenceModel()
+    retrieved_by_id: Dict[str, List[RetrievedConcept]] = {}
+
+    def respond(request: Dict[str, Any]) -> Dict[str, Any]:
+        if not retrieved_by_id:
+            with open(job_dir / "prepared.jsonl", "r", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if "retrieved" not in record:
+                        continue
+                    retrieved_by_id[record["custom_id"]] = [
+                        RetrievedConcept(concept = Concept(code = r["code"], concept = r["concept"]), score = r["score"])
+                        for r in record["retrieved"]
+                    ]
+        inferred = mock.infer_codes("", retrieved_by_id.get(request["custom_id"], []))
+        content = json.dumps({"inferred": to_jsonable(inferred)})
+        return {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}], "usage": None}
+
+    return respond
+
+
+def main(input: List[str] | str, output: str, workers: int = 1, batch_job: str = None, batch_local: bool = False, poll_interval_s: float = 60.0, checkpoint: str = None, retriever_name: str = "token", model_name: str = "mock", compact: bool = False, audit_level: str = "standard", reranker_path: str = None, skip_llm_margin: float = 0.0, dictionaries: List[str] = None, metrics_path: str = None, metrics_port: int = None, metrics_log_interval_s: float = 0.0, shard: str = None, merge: List[str] = None, revisions: str = None, ingest_workers: int = 4):
     # load concepts and input data initialize
     concepts_csv_path = Path("aiparser/data/hcpcs.csv")
-    input_path = Path("aiparser/" + input)
-
-    outputs_path = Path("aiparser/")
-    outputs_file_name = output
-
-    concepts = load_concepts_from_csv(concepts_csv_path, CsvSchema())
-    sys.stderr.write(f"Loaded {len(concepts)} concepts from data directory.")
-    inputs = load_input_data_from_csv(input_path, InputCsvSchema()) 
-    sys.stderr.write(f"Loaded {len(inputs)} input items from {input_path}.")
-
-    #initialize pipeline components
-    retriever = TokenRetriever() # OpenAIEmbeddingRetriever() # modular retriever that can later be swapped out for an embedding RAG retriever
-    retriever.index(concepts)
-    sys.stderr.write("[test] Retriever indexed concepts.")
-
-    model =  MockCodeInferenceModel() #  OpenAIInferenceModel() # modular inference model that can later be swapped out for an actual LLM-based inference model
-    pipeline = CodeInferencePipeline(
-        retriever = retriever,
-        model = model,
-        config = PipelineConfig(top_k=50, min_retrieval_score=0.005),
-        model_info = {"name": "OpenAIInferenceModel", "version": "1.0"}
-    )
+    output_path = Path(output)
 
-    #setup Audit Trail
-    dictionary_audit = DictionaryAudit(
-        row_count=len(concepts),
-        schema={"code_col": CsvSchema().code_column, "concept_col": CsvSchema().concept_column},
-    )
+    outputs_path = output_path.parent
+    outputs_file_name = output_path.name
 
-    # run pipeline on inputs and build results single JSON output file
-    results = []
-    for i, input in enumerate(inputs):
+    shard_index, shard_count = parse_shard(shard) if shard else (0, 1)
+    if revisions and batch_job:
+        raise ValueError("--revisions applies to interactive runs; batch jobs always code documents in full.")
+
+    # files, directories, globs and .csv.gz; parsing starts now in worker processes and overlaps indexing below
+    input_paths = expand_input_paths([input] if isinstance(input, str) else input)
+    finish_metrics = export(port = metrics_port, path = metrics_path, log_interval_s = metrics_log_interval_s)
+    queue = None
+    journal = None
+    try:
+        queue = InputFileQueue(input_paths, InputCsvSchema(), workers = ingest_workers)
+        sys.stderr.write(f"Ingesting {len(input_paths)} input files.")
+
+        if merge:
+            # combine the outputs of every shard of a partitioned run; nothing is recomputed
+            inputs = [input for parsed in queue for input in parsed.inputs]
+            manifest = merge_shards(inputs, [Path(name) for name in merge], output_path, compact = compact)
+            sys.stderr.write(f"Merged {len(merge)} shards into {manifest.document_count} documents.")
+            return
+
+        #initialize pipeline components
+        if dictionaries:
+            # one retriever shard per code system, searched concurrently
+            retriever, dictionary_audit = build_dictionaries([DictionarySpec.parse(d) for d in dictionaries], retriever = retriever_name)
+            sys.stderr.write(f"Indexed {dictionary_audit.row_count} concepts from {', '.join(dictionary_audit.code_systems)}.")
+        else:
+            concepts = load_concepts_from_csv(concepts_csv_path, CsvSchema())
+            sys.stderr.write(f"Loaded {len(concepts)} concepts from data directory.")
+            retriever = create_retriever(retriever_name) # modular retriever, "openai" swaps in the embedding RAG retriever
+            change = retriever.index(concepts)
+            sys.stderr.write("[test] Retriever indexed concepts.")
+            dictionary_audit = DictionaryAudit(
+                row_count=len(concepts),
+                schema={"code_col": CsvSchema().code_column, "concept_col": CsvSchema().concept_column},
+                content_sha256=concepts.sha256(),
+            )
+            if change is not None:
+                # a saved index was synced to this dictionary version; the diff goes into the manifest
+                dictionary_audit.record_change(change)
 
-        audit = AuditTrail(
+        watch_retriever(retriever)
+        observe_dictionary(dictionary_audit)
+
+        # offline batch jobs always build OpenAI requests; the local stand-in answers them with the mock model
+        model = create_model("openai" if batch_job else model_name) # modular inference model, "openai" swaps in the LLM-based model
+        reranker = LogisticReranker.load(reranker_path) if reranker_path else None
+        pipeline = CodeInferencePipeline(
+            retriever = retriever,
+            model = model,
+            config = PipelineConfig(top_k=50, min_retrieval_score=0.005, skip_llm_margin=skip_llm_margin),
+            model_info = {"name": type(model).__name__, "version": "1.0"},
+            reranker = reranker,
+        )
+
+        #setup Audit Trail
+        # one run id per run; per-document audits are reduced to their own deltas and reference the manifest,
+        # and carry the sha256 of the file they came from
+        check_audit_level(audit_level)
+        audit_template = AuditTrail(
             run_id=new_run_id(),
             timestamp_utc=utc_now_iso(),
-            input_hash=sha256_file(input_path),
+            input_hash=None,
             environment=env_fingerprint(),
             dictionary=dictionary_audit,
             retrieval=None,
             model=None
         )
 
-        raw_out = pipeline.run(input.text, audit_trail = audit)
-        out = asdict(raw_out)
-
-        inferred_codes = out.get("inferred_codes", [])
-        audit_trail = out.get("audit", None)
-        assert isinstance(inferred_codes, list), f"Expected 'inferred_codes' to be a list, got {type(inferred_codes)}"
-        
-        inferrence_output = Output(
-            id = input.id,
-            name = input.name,
-            inferred_codes = inferred_codes,
-            audit = audit_trail
+        input_files: List[InputFileAudit] = []
+        def take(parsed: InputFile):
+            inputs = select_shard(parsed.inputs, shard_index, shard_count) if shard else parsed.inputs
+            input_files.append(InputFileAudit(path = parsed.path, sha256 = parsed.sha256, documents = len(parsed.inputs), skipped_rows = parsed.skipped_rows))
+            sys.stderr.write(f"Loaded {len(inputs)} input items from {parsed.path}.")
+            return inputs, [replace(audit_template, input_hash = parsed.sha256)] * len(inputs)
+
+        if batch_job:
+            inputs, audits = [], []
+            for parsed in queue:
+                file_inputs, file_audits = take(parsed)
+                inputs.extend(file_inputs)
+                audits.extend(file_audits)
+            job_dir = Path(batch_job)
+            client = LocalBatchClient(job_dir / "local", local_batch_responder(job_dir)) if batch_local else model.client
+            results = run_batch_job(pipeline, model, inputs, audits, BatchJob(job_dir, client, poll_interval_s = poll_interval_s), context = dictionary_audit.context())
+        else:
+            journal_path = Path(checkpoint) if checkpoint else outputs_path / f"{outputs_file_name}.journal.jsonl"
+            outputs_path.mkdir(parents=True, exist_ok=True)
+            journal = CheckpointJournal(journal_path, fingerprint = pipeline.fingerprint(dictionary_audit.context()))
+            retry = RetryFile(outputs_path / f"{outputs_file_name}.retry.jsonl")
+            store = RevisionStore(revisions) if revisions else None
+            results = []
+            # identical texts are computed once per run, also when they sit in different files
+            computed: Dict[str, Dict[str, Any]] = {}
+            # each file goes to the pipeline as soon as it is parsed while the next ones are parsed
+            for parsed in queue:
+                file_inputs, file_audits = take(parsed)
+                results.extend(run_with_checkpoint(
+                    pipeline,
+                    file_inputs,
+                    file_audits,
+                    journal,
+                    retry,
+                    workers = workers,
+                    revisions = store,
+                    revision_context = dictionary_audit.context(),
+                    computed = computed,
+                ))
+            if retry.count:
+                sys.stderr.write(f"{retry.count} documents failed; see {retry.path}.\n")
+
+        if not any(f.documents for f in input_files):
+            raise ValueError("No valid inputs were loaded from the input files. Please check the file content and schema.")
+
+        # write the run manifest once, then results with document-level audits
+        outputs_path.mkdir(parents=True, exist_ok=True)
+        run_id = audit_template.run_id
+        resumed = sorted({r.audit["run_id"] for r in results if r.audit and r.audit.get("run_id") != run_id})
+        manifest = RunManifest(
+            run_id = run_id,
+            timestamp_utc = audit_template.timestamp_utc,
+            audit_level = audit_level,
+            # a single file keeps its own hash; several are hashed together in ingestion order
+            input_hash = input_files[0].sha256 if len(input_files) == 1 else sha256_text("\n".join(f.sha256 for f in input_files)),
+            document_count = len(results),
+            dictionary = dictionary_audit,
+            environment = audit_template.environment,
+            pipeline = pipeline.describe(),
+            resumed_run_ids = resumed or None,
+            shard = shard,
+            input_files = input_files,
         )
-        results.append(inferrence_output)
+        write_json(outputs_path / f"{outputs_file_name}.manifest.json", manifest, pretty = True)
+
+        results = [replace(r, audit = document_audit(r.audit, audit_level, run_id)) for r in results]
+        if compact:
+            write_json(output_path, compact_records(results))
+        else:
+            write_json(output_path, results, pretty = True)
+
+        # the default journal only bridges an interrupted run; once the output is complete a rerun must recompute,
+        # so it is removed. An explicit --checkpoint is kept, and so is any journal while documents still need a retry
+        if journal is not None and not checkpoint and not retry.count:
+            journal.path.unlink(missing_ok = True)
+    finally:
+        if queue is not None:
+            queue.close()
+        finish_metrics()
 
-    # write results to output file
-    outputs_path.mkdir(parents=True, exist_ok=True)
-    payload = [asdict(r) for r in results]
-    with open(outputs_path / outputs_file_name, "w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2)
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description = "Run the code inference pipeline over an input CSV.")
+    parser.add_argument("--input", nargs = "+", default = ["aiparser/data/policies_cleaned.csv"], help = "input CSV files, directories or glob patterns (.csv or .csv.gz)")
+    parser.add_argument("--output", default = "aiparser/outputs.json", help = "output JSON file")
+    parser.add_argument("--ingest-workers", type = int, default = 4, help = "processes parsing input files in parallel")
+    parser.add_argument("--workers", type = int, default = 1)
+    parser.add_argument("--retriever", default = "token", help = "registered retriever backend")
+    parser.add_argument("--model", default = "mock", help = "registered inference model backend")
+    parser.add_argument("--batch-job", default = None, help = "job directory for an offline OpenAI batch run (resumable)")
+    parser.add_argument("--batch-local", action = "store_true", help = "answer the batch job with the local stand-in instead of OpenAI")
+    parser.add_argument("--poll-interval", type = float, default = 60.0, help = "seconds between batch status polls")
+    parser.add_argument("--checkpoint", default = None, help = "checkpoint journal path, kept after the run (default: <output>.journal.jsonl next to the output, removed once every document is written)")
+    parser.add_argument("--audit-level", default = "standard", choices = AUDIT_LEVELS, help = "per-document audit detail; run-level audit goes to <output>.manifest.json")
+    parser.add_argument("--compact", action = "store_true", help = "write compact output: concepts referenced by code, run-level audit blocks stored once")
+    parser.add_argument("--reranker", default = None, help = "trained reranker file (see entrypoints/train_reranker.py); narrows candidates before the model")
+    parser.add_argument("--skip-llm-margin", type = float, default = 0.0, help = "with --reranker, accept confident codes without a model call when they lead by this probability margin")
+    parser.add_argument("--dictionary", action = "append", default = None, metavar = "NAME=PATH[,top_k=N,...]", help = "code dictionary with its own index shard (repeatable; default: HCPCS only, untagged)")
+    parser.add_argument("--metrics-path", default = None, help = "write Prometheus text-format metrics to this file (refreshed with --metrics-log-interval, final at exit)")
+    parser.add_argument("--metrics-port", type = int, default = None, help = "serve /metrics on this local port while the run is in progress")
+    parser.add_argument("--metrics-log-interval", type = float, default = 0.0, help = "seconds between JSON metrics summaries on stderr (0 disables)")
+    parser.add_argument("--revisions", default = None, help = "revision store (JSONL) keyed by document id; revised documents re-retrieve only changed sections and skip the model when candidates are unchanged")
+    parser.add_argument("--shard", default = None, metavar = "i/N", help = "process only shard i (0-based) of N, partitioned by document id hash")
+    parser.add_argument("--merge", nargs = "+", default = None, metavar = "PARTIAL", help = "merge these shard outputs into --output after checking every --input document is present once")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    main(input="data/policies_cleaned.csv", output="outputs.json")
\ No newline at end of file
+    args = parse_args()
+    main(
+        input=args.input,
+        output=args.output,
+        workers=args.workers,
+        batch_job=args.batch_job,
+        batch_local=args.batch_local,
+        poll_interval_s=args.poll_interval,
+        checkpoint=args.checkpoint,
+        retriever_name=args.retriever,
+        model_name=args.model,
+        compact=args.compact,
+        audit_level=args.audit_level,
+        reranker_path=args.reranker,
+        skip_llm_margin=args.skip_llm_margin,
+        dictionaries=args.dictionary,
+        metrics_path=args.metrics_path,
+        metrics_port=args.metrics_port,
+        metrics_log_interval_s=args.metrics_log_interval,
+        shard=args.shard,
+        merge=args.merge,
+        revisions=args.revisions,
+        ingest_workers=args.ingest_workers,
+    )
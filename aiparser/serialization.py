@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from .audit_utils import sha256_text
+from .models import to_jsonable
+
+try:  # optional fast backend; the stdlib encoder is used when it is not installed
+    import orjson
+except ImportError:
+    orjson = None
+
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+COMPACT_FORMAT = "aiparser.compact/v1"
+
+# audit blocks that are identical for every record of a run and are stored once in compact output
+_SHARED_AUDIT_KEYS = ("dictionary", "environment")
+
+
+def dumps(obj: Any, *, pretty: bool = False) -> bytes:
+    """
+    Serialize model objects or plain JSON data to UTF-8 bytes.
+    With orjson, dataclasses are encoded natively without building an intermediate dict tree.
+    """
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if pretty else 0
+        return orjson.dumps(obj, default = to_jsonable, option = option)
+    if pretty:
+        return json.dumps(to_jsonable(obj), ensure_ascii = False, indent = 2).encode("utf-8")
+    return json.dumps(to_jsonable(obj), ensure_ascii = False, separators = (",", ":")).encode("utf-8")
+
+
+def write_json(path: Path | str, obj: Any, *, pretty: bool = False) -> None:
+    with open(path, "wb") as f:
+        f.write(dumps(obj, pretty = pretty))
+
+
+def _block_ref(block: Any) -> str:
+    return sha256_text(json.dumps(block, sort_keys = True, ensure_ascii = False))[:16]
+
+
+def compact_records(records: List[Any]) -> Dict[str, Any]:
+    """
+    Compact form of a list of output records:
+    retrieval candidates reference a shared concept table as [code, description index, score]
+    instead of repeating descriptions, and run-level audit blocks (dictionary, environment,
+    model prompt template) are stored once under "shared" and referenced by {"$ref": id}.
+    """
+    concepts: Dict[str, List[str]] = {}
+    concept_index: Dict[Tuple[str, str], int] = {}
+    shared: Dict[str, Any] = {}
+
+    def share(block: Any) -> Dict[str, str]:
+        ref = _block_ref(block)
+        shared.setdefault(ref, block)
+        return {"$ref": ref}
+
+    def concept_ref(code: str, text: str) -> int:
+        key = (code, text)
+        i = concept_index.get(key)
+        if i is None:
+            texts = concepts.setdefault(code, [])
+            i = concept_index[key] = len(texts)
+            texts.append(text)
+        return i
+
+    def compact_audit(audit: Dict[str, Any]) -> Dict[str, Any]:
+        audit = dict(audit)
+        for key in _SHARED_AUDIT_KEYS:
+            if audit.get(key) is not None:
+                audit[key] = share(audit[key])
+
+        retrieval = audit.get("retrieval")
+        if retrieval and retrieval.get("candidates") is not None:
+            audit["retrieval"] = {
+                **retrieval,
+                "candidates": [
+                    [c["code"], concept_ref(c["code"], c["concept"]), c["retrieval_score"]]
+                    for c in retrieval["candidates"]
+                ],
+            }
+
+        model = audit.get("model")
+        if model and model.get("prompt_template"):
+            audit["model"] = {**model, "prompt_template": share(model["prompt_template"])}
+        return audit
+
+    out = [_map_audit(record, compact_audit) for record in to_jsonable(records)]
+    return {"format": COMPACT_FORMAT, "concepts": concepts, "shared": shared, "records": out}
+
+
+def expand_compact(doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Inverse of compact_records.
+    """
+    if doc.get("format") != COMPACT_FORMAT:
+        raise ValueError(f"Expected compact output format '{COMPACT_FORMAT}', got '{doc.get('format')}'.")
+    concepts = doc["concepts"]
+    shared = doc["shared"]
+
+    def resolve(value: Any) -> Any:
+        if isinstance(value, dict) and set(value) == {"$ref"}:
+            return shared[value["$ref"]]
+        return value
+
+    def expand_audit(audit: Dict[str, Any]) -> Dict[str, Any]:
+        audit = {k: resolve(v) for k, v in audit.items()}
+        retrieval = audit.get("retrieval")
+        if retrieval and retrieval.get("candidates") is not None:
+            audit["retrieval"] = {
+                **retrieval,
+                "candidates": [
+                    {"code": code, "concept": concepts[code][i], "retrieval_score": score}
+                    for code, i, score in retrieval["candidates"]
+                ],
+            }
+        model = audit.get("model")
+        if model and model.get("prompt_template"):
+            audit["model"] = {**model, "prompt_template": resolve(model["prompt_template"])}
+        return audit
+
+    return [_map_audit(record, expand_audit) for record in doc["records"]]
+
+
+def _map_audit(record: Dict[str, Any], fn: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+    # output records carry their audit at the top level; find_codes batch items nest it under "result"
+    if record.get("audit"):
+        return {**record, "audit": fn(record["audit"])}
+    result = record.get("result")
+    if isinstance(result, dict) and result.get("audit"):
+        return {**record, "result": {**result, "audit": fn(result["audit"])}}
+    return record
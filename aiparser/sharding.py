@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from collections import Counter
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+from .audit_utils import new_run_id, utc_now_iso
+from .models import Input, RunManifest
+from .serialization import COMPACT_FORMAT, compact_records, expand_compact, write_json
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """
+    "i/N" -> (i, N), with shards numbered 0..N-1.
+    """
+    index, sep, count = str(spec).partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError(f"Shard '{spec}' must look like 'i/N', e.g. '0/4'.") from None
+    if not sep or count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard '{spec}' must satisfy 0 <= i < N.")
+    return index, count
+
+
+def shard_of(doc_id: str, count: int) -> int:
+    # stable across processes and machines (unlike hash()), so every node computes the same partition
+    digest = hashlib.sha256(str(doc_id).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+def select_shard(inputs: Sequence[Input], index: int, count: int) -> List[Input]:
+    return [input for input in inputs if shard_of(input.id, count) == index]
+
+
+def _load_records(path: Path) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding = "utf-8") as f:
+        doc = json.load(f)
+    if isinstance(doc, dict) and doc.get("format") == COMPACT_FORMAT:
+        return expand_compact(doc)
+    if not isinstance(doc, list):
+        raise ValueError(f"{path} is not a run output (expected a list of records or compact output).")
+    return doc
+
+
+def _manifest_path(output: Path) -> Path:
+    return output.with_name(output.name + ".manifest.json")
+
+
+def _dictionary_key(dictionary: Dict[str, Any] | None) -> str:
+    # with a content hash, the change history of a persisted index (which shard synced it first) is not compared
+    if dictionary and dictionary.get("content_sha256"):
+        dictionary = {k: v for k, v in dictionary.items() if k != "changes"}
+    return json.dumps(dictionary, sort_keys = True)
+
+
+def merge_shards(
+    inputs: Sequence[Input],
+    partial_outputs: Sequence[Path | str],
+    output: Path | str,
+    *,
+    compact: bool = False,
+) -> RunManifest:
+    """
+    Combine the partial outputs of a sharded run (each with its <output>.manifest.json) into one output in input
+    order, with a single manifest. Fails unless every shard 0..N-1 is present exactly once, all shards ran over
+    the same input file and dictionary, and every input document appears exactly as often as it does in the input.
+    """
+    if not partial_outputs:
+        raise ValueError("No partial outputs to merge.")
+
+    manifests: List[Dict[str, Any]] = []
+    records_by_shard: List[List[Dict[str, Any]]] = []
+    for path in map(Path, partial_outputs):
+        with open(_manifest_path(path), "r", encoding = "utf-8") as f:
+            manifests.append(json.load(f))
+        records_by_shard.append(_load_records(path))
+
+    shards = [m.get("shard") for m in manifests]
+    if any(s is None for s in shards):
+        missing = [str(p) for p, s in zip(partial_outputs, shards) if s is None]
+        raise ValueError(f"Not sharded runs (no shard in manifest): {', '.join(missing)}")
+    parsed = [parse_shard(s) for s in shards]
+    counts = {count for _, count in parsed}
+    if len(counts) != 1:
+        raise ValueError(f"Partial outputs come from different shard counts: {', '.join(sorted(shards))}")
+    count = counts.pop()
+    present = Counter(index for index, _ in parsed)
+    missing_shards = [i for i in range(count) if present[i] == 0]
+    repeated_shards = [i for i, n in present.items() if n > 1]
+    if missing_shards or repeated_shards:
+        raise ValueError(f"Shards of {count}: missing {missing_shards or 'none'}, given more than once {repeated_shards or 'none'}.")
+
+    input_hashes = {m.get("input_hash") for m in manifests}
+    if len(input_hashes) != 1:
+        raise ValueError("Partial outputs were computed from different input files (input_hash differs).")
+    dictionaries = {_dictionary_key(m.get("dictionary")) for m in manifests}
+    if len(dictionaries) != 1:
+        raise ValueError("Partial outputs were computed against different dictionaries (dictionary differs).")
+
+    # every document id must come back exactly as often as it is in the input, from the shard that owns it
+    expected = Counter(input.id for input in inputs)
+    produced = Counter(record["id"] for records in records_by_shard for record in records)
+    missing = sorted((expected - produced).elements())
+    extra = sorted((produced - expected).elements())
+    misplaced = [
+        record["id"]
+        for (index, _), records in zip(parsed, records_by_shard)
+        for record in records
+        if shard_of(record["id"], count) != index
+    ]
+    if missing or extra or misplaced:
+        raise ValueError(
+            f"Merge check failed: {len(missing)} missing, {len(extra)} duplicated or unknown, {len(misplaced)} in the wrong shard. "
+            f"Missing: {missing[:10]} Duplicated/unknown: {extra[:10]} Misplaced: {misplaced[:10]}"
+        )
+
+    # input order; documents sharing an id keep their relative order within the owning shard
+    queues: Dict[str, List[Dict[str, Any]]] = {}
+    for records in records_by_shard:
+        for record in records:
+            queues.setdefault(record["id"], []).append(record)
+    merged = [queues[input.id].pop(0) for input in inputs]
+
+    first = manifests[0]
+    manifest = RunManifest(
+        run_id = new_run_id(),
+        timestamp_utc = utc_now_iso(),
+        audit_level = first.get("audit_level"),
+        input_hash = first.get("input_hash"),
+        document_count = len(merged),
+        dictionary = first.get("dictionary"),
+        environment = first.get("environment"),
+        pipeline = first.get("pipeline"),
+        resumed_run_ids = sorted({r for m in manifests for r in (m.get("resumed_run_ids") or [])}) or None,
+        shard_run_ids = {m["shard"]: m["run_id"] for m in sorted(manifests, key = lambda m: parse_shard(m["shard"]))},
+    )
+    if len({json.dumps(m.get("pipeline"), sort_keys = True) for m in manifests}) > 1:
+        # still mergeable, but the manifest can only describe one configuration
+        manifest = replace(manifest, pipeline = {"shards": {m["shard"]: m.get("pipeline") for m in manifests}})
+
+    output = Path(output)
+    write_json(_manifest_path(output), manifest, pretty = True)
+    if compact:
+        write_json(output, compact_records(merged))
+    else:
+        write_json(output, merged, pretty = True)
+    return manifest
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import re
+import threading
+import unicodedata
+import zlib
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+
+# words, hyphen/apostrophe compounds and dotted forms ("10.01.20", "e.g", "0.5") as single tokens
+WORD_REGEX = re.compile(r"(?:[A-Za-z0-9]+\.)*[A-Za-z0-9]+(?:[-'][A-Za-z0-9]+)?")
+
+# UTF-8 text that was decoded as cp1252/latin-1 somewhere upstream ("Â®", "â€™", "â‰¥")
+_MOJIBAKE = re.compile("[Â-ô][\u0080-¿ŒœŠšŸŽžƒˆ˜–—‘-„†-•…‰‹›€™]+")
+
+_PUNCT_MAP = str.maketrans({
+    "‘": "'", "’": "'", "‚": "'", "‛": "'",
+    "“": '"', "”": '"', "„": '"',
+    "–": "-", "—": "-", "−": "-",
+    " ": " ", " ": " ", " ": " ", "​": "",
+    "•": " ", "●": " ", "▪": " ",
+    "™": "", "®": "", "©": "",
+})
+
+_DOTTED_NUMBER = re.compile(r"\b(\d{1,2})\. (?=\d{2,4}\b)")            # "10. 01. 20" -> "10.01.20"
+_LETTER_ABBREV = re.compile(r"\b([A-Za-z])\. (?=[A-Za-z]\.)")          # "e. g." / "U. S." -> "e.g." / "U.S."
+_DOTTED_CODE = re.compile(r"\b[A-Z]{2,4}(?:\. [A-Z0-9]{2,6}){2,}\b")    # "HIM. PA. SP66" -> "HIM.PA.SP66"
+_SPACE_BEFORE_PUNCT = re.compile(r"[ \t]+([,;:)\]])")
+_SPACES = re.compile(r"[ \t\f\v]+")
+
+# section starts in policy documents: paragraph breaks, numbered parts ("II. Continued Therapy") and the
+# standard headings, which survive text cleaning even when line breaks do not
+_SECTION_START = re.compile(
+    r"\n\s*\n"
+    r"|(?<=[\s.])(?:I|II|III|IV|V|VI|VII|VIII|IX|X)\. (?=[A-Z])"
+    r"|\b(?:Description|FDA Approved Indication\(s\)|Policy/Criteria|Appendix [A-Z]|Background"
+    r"|Dosage and Administration|Product Availability|References|Coding Implications"
+    r"|Reviews, Revisions, and Approvals|Revision Log|Important Reminder)\b"
+)
+_SENTENCE_END = re.compile(r"[.;:!?](?=\s+[A-Z0-9(])")
+
+
+def _undo_mojibake(match: re.Match) -> str:
+    raw = match.group(0)
+    try:
+        data = bytes(ord(ch) if ord(ch) < 256 else ch.encode("cp1252")[0] for ch in raw)
+        return data.decode("utf-8")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return raw
+
+
+def normalize_text(text: str) -> str:
+    """
+    Repair encoding artifacts and normalize punctuation/spacing so tokens and embeddings see clean text.
+    Idempotent: normalizing normalized text returns it unchanged.
+    """
+    if not text:
+        return ""
+    text = _MOJIBAKE.sub(_undo_mojibake, text)
+    text = unicodedata.normalize("NFKC", text.translate(_PUNCT_MAP))
+    text = _DOTTED_NUMBER.sub(r"\1.", text)
+    text = _DOTTED_CODE.sub(lambda m: m.group(0).replace(". ", "."), text)
+    text = _LETTER_ABBREV.sub(r"\1.", text)
+    text = _SPACE_BEFORE_PUNCT.sub(r"\1", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+class Vocabulary:
+    """
+    Process-wide token interning: each distinct lowercase token gets a stable small int id.
+    Dictionary text grows the vocabulary; document text only looks tokens up, so it stays bounded.
+    """
+
+    def __init__(self) -> None:
+        self._ids: Dict[str, int] = {}
+        self._tokens: List[str] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def intern(self, token: str) -> int:
+        i = self._ids.get(token)
+        if i is None:
+            with self._lock:
+                i = self._ids.get(token)
+                if i is None:
+                    i = len(self._tokens)
+                    self._tokens.append(token)
+                    self._ids[token] = i
+        return i
+
+    def lookup(self, token: str) -> Optional[int]:
+        return self._ids.get(token)
+
+    def token(self, token_id: int) -> Optional[str]:
+        return self._tokens[token_id] if 0 <= token_id < len(self._tokens) else None
+
+
+VOCABULARY = Vocabulary()
+
+
+@dataclass(frozen = True, slots = True)
+class TokenStream:
+    """
+    Normalized text with its token ids and character spans, computed once per document and shared by
+    the retrievers and the chunker. Tokens unknown to the vocabulary get negative ids that are unique
+    within the stream, so they still count toward set sizes but never match dictionary tokens.
+    """
+    text: str
+    ids: array
+    starts: array
+    ends: array
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def id_set(self) -> FrozenSet[int]:
+        return frozenset(self.ids)
+
+    def window(self, start: int, end: int) -> "TokenStream":
+        end = min(end, len(self.ids))
+        if start >= end:
+            return TokenStream("", array("q"), array("q"), array("q"))
+        lo, hi = self.starts[start], self.ends[end - 1]
+        return TokenStream(
+            text = self.text[lo:hi],
+            ids = self.ids[start:end],
+            starts = array("q", (s - lo for s in self.starts[start:end])),
+            ends = array("q", (e - lo for e in self.ends[start:end])),
+        )
+
+
+def tokenize(text: str, *, vocabulary: Vocabulary = VOCABULARY, grow: bool = False) -> TokenStream:
+    ids, starts, ends = array("q"), array("q"), array("q")
+    unknown: Dict[str, int] = {}
+    for m in WORD_REGEX.finditer(text):
+        token = m.group(0).lower()
+        if grow:
+            token_id = vocabulary.intern(token)
+        else:
+            token_id = vocabulary.lookup(token)
+            if token_id is None:
+                token_id = unknown.setdefault(token, -1 - len(unknown))
+        ids.append(token_id)
+        starts.append(m.start())
+        ends.append(m.end())
+    return TokenStream(text = text, ids = ids, starts = starts, ends = ends)
+
+
+def analyze(text: str, *, normalize: bool = True) -> TokenStream:
+    return tokenize(normalize_text(text) if normalize else text)
+
+
+def token_windows(stream: TokenStream, max_tokens: int, overlap: int = 0) -> List[TokenStream]:
+    """
+    Split a token stream into windows of at most max_tokens tokens, consecutive windows sharing `overlap` tokens.
+    """
+    if max_tokens <= 0 or len(stream) <= max_tokens:
+        return [stream]
+    step = max(1, max_tokens - max(0, overlap))
+    windows = []
+    for start in range(0, len(stream), step):
+        windows.append(stream.window(start, start + max_tokens))
+        if start + max_tokens >= len(stream):
+            break
+    return windows
+
+
+def token_sections(stream: TokenStream, max_tokens: int = 256, min_tokens: int = 16) -> List[TokenStream]:
+    """
+    Split a token stream into sections at headings and paragraph breaks. Sections longer than max_tokens are
+    cut further at sentence ends chosen by the sentence's own content, and ones shorter than min_tokens join
+    the next, so editing one paragraph only changes the sections around it and the rest keep their exact text.
+    """
+    if not len(stream):
+        return [stream]
+    cuts = {0, len(stream)}
+    for m in _SECTION_START.finditer(stream.text):
+        cuts.add(bisect_left(stream.starts, m.start()))
+    bounds = sorted(cuts)
+
+    spans: List[Tuple[int, int]] = []
+    for lo, hi in zip(bounds, bounds[1:]):
+        if max_tokens <= 0 or hi - lo <= max_tokens:
+            spans.append((lo, hi))
+            continue
+        # content-defined cuts: after a sentence whose checksum is 0 mod 4, and before exceeding max_tokens
+        ends = [bisect_left(stream.starts, m.end(), lo, hi) for m in _SENTENCE_END.finditer(stream.text, stream.starts[lo], stream.ends[hi - 1])] + [hi]
+        start = previous = lo
+        for end in ends:
+            if end <= previous:
+                continue
+            if end - start > max_tokens and previous > start:
+                spans.append((start, previous))
+                start = previous
+            while end - start > max_tokens:
+                spans.append((start, start + max_tokens))
+                start += max_tokens
+            sentence = stream.text[stream.starts[previous]:stream.ends[end - 1]]
+            if zlib.crc32(sentence.encode("utf-8")) % 4 == 0 and end > start:
+                spans.append((start, end))
+                start = end
+            previous = end
+        if start < hi:
+            spans.append((start, hi))
+
+    merged: List[Tuple[int, int]] = []
+    pending = None
+    for lo, hi in spans:
+        if pending is not None:
+            lo = pending
+        if hi - lo < min_tokens and hi < len(stream):
+            pending = lo
+            continue
+        pending = None
+        merged.append((lo, hi))
+    return [stream.window(lo, hi) for lo, hi in merged]
@@ -33,7 +33,20 @@ builder.Services.AddSwaggerGen();
 // Learn more about configuring OpenAPI at https://aka.ms/aspnet/openapi
 builder.Services.AddOpenApi();
 
-builder.Services.AddSingleton<IPythonRunner, ProcessPythonRunner>(); // TODO stub
+// Python:ServerUrl points at a running `python -m aiparser.entrypoints.serve`; without it every request starts a python process
+var pythonServerUrl = builder.Configuration["Python:ServerUrl"];
+if (!string.IsNullOrWhiteSpace(pythonServerUrl))
+{
+    builder.Services.AddHttpClient<IPythonRunner, HttpPythonRunner>(client =>
+    {
+        client.BaseAddress = new Uri(pythonServerUrl.TrimEnd('/') + "/");
+        client.Timeout = TimeSpan.FromMinutes(10);
+    });
+}
+else
+{
+    builder.Services.AddSingleton<IPythonRunner, ProcessPythonRunner>(); // TODO stub
+}
 
 builder.Services.AddScoped<FindCodesUseCase>();
 builder.Services.AddScoped<FindCodesBatchJsonUseCase>();
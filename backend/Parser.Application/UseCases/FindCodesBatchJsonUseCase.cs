@@ -1,3 +1,5 @@
+using System.Security.Cryptography;
+using System.Text;
 using System.Text.Json;
 using Parser.Python;
 using Parser.Application.Models;
@@ -25,32 +27,72 @@ public sealed class FindCodesBatchJsonUseCase : IUseCaseHandler
 
         var results = new List<JsonElement>();
 
+        // identical texts (same policy under several ids) are sent once and share the result
+        var textHashes = new List<string>();
+        var firstByTextHash = new Dictionary<string, int>();
+        var uniqueItems = new List<TextBatchItem>();
+        var dedupedItems = 0;
+
         foreach (TextBatchItem item in findCodesInput.Items)
         {
-            var pythonInput = new
+            var text = item.Text ?? string.Empty;
+            var textHash = Convert.ToHexString(SHA256.HashData(Encoding.UTF8.GetBytes(text))).ToLowerInvariant();
+            textHashes.Add(textHash);
+
+            if (firstByTextHash.ContainsKey(textHash))
             {
-                id = item.Id,
-                name = item.Name,
-                text = item.Text ?? string.Empty
-            };
+                dedupedItems++;
+                continue;
+            }
+            firstByTextHash[textHash] = uniqueItems.Count;
+            uniqueItems.Add(item);
+        }
+
+        // one python process for the whole batch; results come back in the order the items were sent
+        var options = new Dictionary<string, object>(findCodesInput.Options ?? new Dictionary<string, object>());
+        options.Remove("output_format");
 
-            var payloadJson = JsonSerializer.Serialize(new
+        var payloadJson = JsonSerializer.Serialize(new
+        {
+            use_case_id = UseCaseId,
+            input = new
             {
-                use_case_id = UseCaseId,
-                input = pythonInput,
-                options = findCodesInput.Options ?? new Dictionary<string, object>()
-            });
+                items = uniqueItems.Select(item => new
+                {
+                    id = item.Id,
+                    name = item.Name,
+                    text = item.Text ?? string.Empty
+                })
+            },
+            options
+        });
+
+        var pythonOut = await _python.RunAsync("find-codes", payloadJson, ct);
 
-            var pythonOut = await _python.RunAsync("find-codes", payloadJson, ct);
+        using var doc = JsonDocument.Parse(pythonOut);
+        var batch = doc.RootElement;
+        if (batch.ValueKind != JsonValueKind.Array || batch.GetArrayLength() != uniqueItems.Count)
+        {
+            throw new InvalidOperationException(
+                $"Python batch returned {(batch.ValueKind == JsonValueKind.Array ? batch.GetArrayLength() : 0)} results for {uniqueItems.Count} items."
+            );
+        }
 
-            using var doc = JsonDocument.Parse(pythonOut);
-            var py = doc.RootElement;
+        for (var i = 0; i < findCodesInput.Items.Count; i++)
+        {
+            var item = findCodesInput.Items[i];
+            var textHash = textHashes[i];
+            var source = uniqueItems[firstByTextHash[textHash]];
+            var isShared = !ReferenceEquals(source, item);
 
             var wrapped = JsonSerializer.SerializeToElement(new
             {
                 id = item.Id,
                 name = item.Name,
-                result = py
+                result = batch[firstByTextHash[textHash]].GetProperty("result"),
+                shared_computation = isShared
+                    ? new { text_sha256 = textHash, computed_for = source.Id }
+                    : null
             });
 
             results.Add(wrapped);
@@ -61,7 +103,11 @@ public sealed class FindCodesBatchJsonUseCase : IUseCaseHandler
         return new UseCaseResult(
             UseCaseId,
             Payload: arrayPayLoad,
-            Metadata: new Dictionary<string, object> { ["handler"] = nameof(FindCodesBatchJsonUseCase) }
+            Metadata: new Dictionary<string, object>
+            {
+                ["handler"] = nameof(FindCodesBatchJsonUseCase),
+                ["dedupedItems"] = dedupedItems
+            }
         );
     }
 }
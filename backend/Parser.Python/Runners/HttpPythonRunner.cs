@@ -0,0 +1,58 @@
+using System.Net;
+using System.Text;
+using System.Text.Json;
+
+namespace Parser.Python.Runners;
+
+/// <summary>
+/// Sends requests to a long-running python server (python -m aiparser.entrypoints.serve) instead of starting
+/// a process per request. The pipeline stays warm there and requests go through its priority lanes.
+/// </summary>
+public sealed class HttpPythonRunner : IPythonRunner
+{
+    private readonly HttpClient _http;
+
+    public HttpPythonRunner(HttpClient http) => _http = http;
+
+    public async Task<string> RunAsync(string useCaseId, string payloadJson, CancellationToken ct)
+    {
+        var minimalPayload = PythonPayload.Minimal(payloadJson, withPriority: true);
+
+        using var content = new StringContent(minimalPayload, Encoding.UTF8, "application/json");
+        using var response = await _http.PostAsync("find-codes", content, ct);
+        var body = (await response.Content.ReadAsStringAsync(ct)).Trim();
+
+        if (response.StatusCode == HttpStatusCode.ServiceUnavailable)
+        {
+            var retryAfter = response.Headers.RetryAfter?.Delta?.TotalSeconds;
+            throw new InvalidOperationException(
+                $"Python server is overloaded; retry in {retryAfter ?? 1:0}s. UseCaseId='{useCaseId}'. {body}"
+            );
+        }
+        if (response.StatusCode == HttpStatusCode.GatewayTimeout)
+        {
+            throw new TimeoutException($"Python server missed the request deadline. UseCaseId='{useCaseId}'. {body}");
+        }
+        if (!response.IsSuccessStatusCode)
+        {
+            throw new InvalidOperationException(
+                $"Python server failed ({(int)response.StatusCode}). UseCaseId='{useCaseId}'. {body}"
+            );
+        }
+
+        try
+        {
+            JsonDocument.Parse(body);
+        }
+        catch (Exception e)
+        {
+            throw new InvalidOperationException(
+                $"Python server returned non-JSON. " +
+                $"UseCaseId='{useCaseId}'. First 500 chars: {body[..Math.Min(500, body.Length)]}",
+                e
+            );
+        }
+
+        return body;
+    }
+}
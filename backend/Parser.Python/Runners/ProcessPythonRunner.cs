@@ -15,11 +15,7 @@ public sealed class ProcessPythonRunner : IPythonRunner
 
     public async Task<string> RunAsync(string useCaseId, string payloadJson, CancellationToken ct)
     {
-        var (text, options) = ExtractTextAndOptions(payloadJson);
-
-        var minimalPayload = options.HasValue
-            ? JsonSerializer.Serialize(new {text, options = options.Value})
-            : JsonSerializer.Serialize(new {text});
+        var minimalPayload = PythonPayload.Minimal(payloadJson);
 
         var workingDir = "/app"; //FindRepoRootOrThrow();
 
@@ -121,45 +117,6 @@ public sealed class ProcessPythonRunner : IPythonRunner
     }
 
 
-    private static (string text, JsonElement? options) ExtractTextAndOptions(string payloadJson)
-    {
-        using var doc = JsonDocument.Parse(payloadJson);
-        var root = doc.RootElement;
-
-        string text = "";
-
-        if (root.TryGetProperty("input", out var input))
-        {
-            // input can be a string: "..."
-            if (input.ValueKind == JsonValueKind.String)
-            {
-                text = input.GetString() ?? "";
-            }
-            // input can be object with text: { text: "..." }
-            else if (input.ValueKind == JsonValueKind.Object && input.TryGetProperty("text", out var textProp))
-            {
-                if (textProp.ValueKind == JsonValueKind.String)
-                    text = textProp.GetString() ?? "";
-                else
-                    text = textProp.GetRawText();
-            }
-            else
-            {
-                // last resort: stringify
-                text = input.GetRawText();
-            }
-        }
-
-        JsonElement? options = null;
-        if (root.TryGetProperty("options", out var opt) && opt.ValueKind == JsonValueKind.Object)
-        {
-            options = opt.Clone(); // clone out of JsonDocument lifetime
-        }
-
-        return (text, options);
-    }
-
-
     private static void TryKill(Process proc)
     {
         try
@@ -0,0 +1,73 @@
+using System.Text.Json;
+
+namespace Parser.Python.Runners;
+
+/// <summary>
+/// The payload the python side reads: {"text": ...} or {"items": [...]}, plus "options".
+/// </summary>
+internal static class PythonPayload
+{
+    public static string Minimal(string payloadJson, bool withPriority = false)
+    {
+        var (text, items, options) = ExtractInput(payloadJson);
+
+        // a batch goes to python as {"items": [...]} so the whole batch runs in one call
+        var payload = new Dictionary<string, object>();
+        if (items.HasValue)
+            payload["items"] = items.Value;
+        else
+            payload["text"] = text;
+        if (options.HasValue)
+            payload["options"] = options.Value;
+        if (withPriority)
+            // the server queues single documents ahead of batches
+            payload["priority"] = items.HasValue ? "bulk" : "interactive";
+
+        return JsonSerializer.Serialize(payload);
+    }
+
+
+    private static (string text, JsonElement? items, JsonElement? options) ExtractInput(string payloadJson)
+    {
+        using var doc = JsonDocument.Parse(payloadJson);
+        var root = doc.RootElement;
+
+        string text = "";
+        JsonElement? items = null;
+
+        if (root.TryGetProperty("input", out var input))
+        {
+            // input can be a batch: { items: [ { id, name, text }, ... ] }
+            if (input.ValueKind == JsonValueKind.Object && input.TryGetProperty("items", out var itemsProp) && itemsProp.ValueKind == JsonValueKind.Array)
+            {
+                items = itemsProp.Clone();
+            }
+            // input can be a string: "..."
+            else if (input.ValueKind == JsonValueKind.String)
+            {
+                text = input.GetString() ?? "";
+            }
+            // input can be object with text: { text: "..." }
+            else if (input.ValueKind == JsonValueKind.Object && input.TryGetProperty("text", out var textProp))
+            {
+                if (textProp.ValueKind == JsonValueKind.String)
+                    text = textProp.GetString() ?? "";
+                else
+                    text = textProp.GetRawText();
+            }
+            else
+            {
+                // last resort: stringify
+                text = input.GetRawText();
+            }
+        }
+
+        JsonElement? options = null;
+        if (root.TryGetProperty("options", out var opt) && opt.ValueKind == JsonValueKind.Object)
+        {
+            options = opt.Clone(); // clone out of JsonDocument lifetime
+        }
+
+        return (text, items, options);
+    }
+}
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# tests import the aiparser package from the repository root, the same way the entrypoints are run
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,161 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from aiparser.admission import AdmissionController, DeadlineExceeded, LaneConfig, Overloaded
+
+
+def _lanes(bulk_running = 1, max_queue = 8):
+    lanes = {"interactive": LaneConfig(max_queue = max_queue, max_running = 2)}
+    if bulk_running is not None:
+        lanes["bulk"] = LaneConfig(max_queue = max_queue, max_running = bulk_running)
+    return lanes
+
+
+def _blocker(controller, lane = "interactive"):
+    # occupies one worker until the returned event is set
+    release, started = threading.Event(), threading.Event()
+    controller.submit(lane, lambda: (started.set(), release.wait(5)))
+    assert started.wait(5)
+    return release
+
+
+def test_interactive_work_runs_before_queued_bulk_work():
+    controller = AdmissionController(2, _lanes())
+    try:
+        release, other = _blocker(controller), _blocker(controller)
+        order = []
+        bulk = controller.submit("bulk", lambda: order.append("bulk"))
+        interactive = controller.submit("interactive", lambda: order.append("interactive"))
+        # one worker frees up: it takes the interactive job first, then the bulk one
+        release.set()
+        bulk.result(5), interactive.result(5)
+        other.set()
+        assert order == ["interactive", "bulk"]
+    finally:
+        controller.close()
+
+
+def test_bulk_never_occupies_more_than_its_workers():
+    controller = AdmissionController(2, _lanes(bulk_running = 1))
+    try:
+        release = _blocker(controller, "bulk")
+        # the second worker stays free for interactive work while the second bulk job waits
+        queued = controller.submit("bulk", lambda: "bulk")
+        assert controller.submit("interactive", lambda: "ok").result(5) == "ok"
+        assert not queued.done()
+        release.set()
+        assert queued.result(5) == "bulk"
+    finally:
+        controller.close()
+
+
+def test_a_full_lane_refuses_work():
+    controller = AdmissionController(1, _lanes(bulk_running = None, max_queue = 1))
+    try:
+        release = _blocker(controller)
+        controller.submit("interactive", lambda: None)
+        with pytest.raises(Overloaded):
+            controller.submit("interactive", lambda: None)
+        release.set()
+    finally:
+        controller.close()
+
+
+def test_a_job_still_queued_at_its_deadline_fails_without_running():
+    controller = AdmissionController(1, _lanes(bulk_running = None))
+    try:
+        release = _blocker(controller)
+        ran = []
+        future = controller.submit("interactive", lambda: ran.append(1), deadline_s = 0.05)
+        with pytest.raises(DeadlineExceeded):
+            future.result(5)
+        release.set()
+        assert controller.submit("interactive", lambda: "after").result(5) == "after"
+        assert ran == []
+    finally:
+        controller.close()
+
+
+def test_cancelled_jobs_are_dropped_and_workers_survive():
+    controller = AdmissionController(1, _lanes(bulk_running = None))
+    try:
+        release = _blocker(controller)
+        ran = []
+        future = controller.submit("interactive", lambda: ran.append(1), deadline_s = 0.05)
+        assert future.cancel()
+        time.sleep(0.7)  # past the deadline sweep, which must skip the cancelled future
+        release.set()
+        assert controller.submit("interactive", lambda: "after").result(5) == "after"
+        assert ran == []
+    finally:
+        controller.close()
+
+
+@pytest.mark.parametrize("workers, bulk_running", [(1, 1), (2, 2), (2, 0)])
+def test_a_bulk_lane_must_leave_a_worker_for_interactive_requests(workers, bulk_running):
+    with pytest.raises(ValueError):
+        AdmissionController(workers, _lanes(bulk_running = bulk_running))
+
+
+def test_a_single_worker_without_lanes_is_refused():
+    with pytest.raises(ValueError):
+        AdmissionController(1)
+
+
+def test_server_answers_504_at_the_deadline(tmp_path):
+    from aiparser.entrypoints.serve import InferenceServer
+
+    controller = AdmissionController(1, _lanes(bulk_running = None))
+    server = InferenceServer(("127.0.0.1", 0), {}, controller)
+    thread = threading.Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+    try:
+        release = _blocker(controller)
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{server.server_address[1]}/find-codes",
+            data = json.dumps({"text": "Forearm crutches are covered.", "deadline_ms": 200}).encode("utf-8"),
+            headers = {"Content-Type": "application/json"},
+        )
+        started = time.monotonic()
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(request, timeout = 10)
+        elapsed = time.monotonic() - started
+        assert e.value.code == 504
+        assert elapsed < 0.45
+        release.set()
+    finally:
+        server.shutdown()
+        server.server_close()
+        controller.close()
+
+
+@pytest.mark.parametrize("payload, headers", [
+    ({"text": "Forearm crutches are covered.", "deadline_ms": 0}, {}),
+    ({"text": "Forearm crutches are covered.", "deadline_ms": "soon"}, {}),
+    ({"text": "Forearm crutches are covered."}, {"X-Deadline-Ms": "0"}),
+])
+def test_server_rejects_a_deadline_that_is_not_positive(payload, headers):
+    from aiparser.entrypoints.serve import InferenceServer
+
+    controller = AdmissionController(2, _lanes())
+    server = InferenceServer(("127.0.0.1", 0), {}, controller)
+    thread = threading.Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+    try:
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{server.server_address[1]}/find-codes",
+            data = json.dumps(payload).encode("utf-8"),
+            headers = {"Content-Type": "application/json", **headers},
+        )
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(request, timeout = 10)
+        assert e.value.code == 400
+    finally:
+        server.shutdown()
+        server.server_close()
+        controller.close()
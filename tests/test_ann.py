@@ -0,0 +1,53 @@
+import random
+
+from aiparser.models import Concept
+from aiparser.retriever.ann import IVFIndex
+from aiparser.retriever.embedding_store import EmbeddingStore
+
+
+def _write_store(path, n = 200, dim = 8, seed = 3):
+    rng = random.Random(seed)
+    concepts = [Concept(code = str(i), concept = f"concept {i}") for i in range(n)]
+    vectors = [[rng.gauss(0, 1) for _ in range(dim)] for _ in range(n)]
+    EmbeddingStore.write(path, concepts, vectors)
+    return vectors
+
+
+def test_saved_ivf_build_is_reused_for_the_same_store(tmp_path):
+    store_path = tmp_path / "store.emb"
+    vectors = _write_store(store_path)
+    store = EmbeddingStore.open(store_path)
+    built = IVFIndex(nlist = 8, nprobe = 8)
+    built.build(store)
+    built.save(tmp_path / "store.emb.ivf")
+
+    reopened = EmbeddingStore.open(store_path)
+    loaded = IVFIndex(nlist = 8, nprobe = 8)
+    assert loaded.load(tmp_path / "store.emb.ivf", reopened)
+    for query in vectors[:10]:
+        assert loaded.search(query, top_k = 5) == built.search(query, top_k = 5)
+    store.close()
+    reopened.close()
+
+
+def test_saved_ivf_build_is_ignored_when_store_or_settings_change(tmp_path):
+    store_path = tmp_path / "store.emb"
+    _write_store(store_path)
+    store = EmbeddingStore.open(store_path)
+    built = IVFIndex(nlist = 8)
+    built.build(store)
+    built.save(tmp_path / "store.emb.ivf")
+    store.close()
+
+    assert not IVFIndex(nlist = 4).load(tmp_path / "store.emb.ivf", EmbeddingStore.open(store_path))
+
+    _write_store(store_path, seed = 4)
+    assert not IVFIndex(nlist = 8).load(tmp_path / "store.emb.ivf", EmbeddingStore.open(store_path))
+
+
+def test_in_memory_stores_are_never_saved(tmp_path):
+    store = EmbeddingStore.from_vectors([Concept(code = "a", concept = "a")], [[1.0, 0.0]])
+    index = IVFIndex(nlist = 1)
+    index.build(store)
+    index.save(tmp_path / "mem.ivf")
+    assert not (tmp_path / "mem.ivf").exists()
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from aiparser.llm.mock_inference import MockCodeInferenceModel
+from aiparser.llm.openai_batch import BatchJob, LocalBatchClient
+from aiparser.models import AuditTrail, Concept, Input, to_jsonable
+from aiparser.pipeline import CodeInferencePipeline, PipelineConfig
+from aiparser.retriever.token_retriever import TokenRetriever
+from aiparser.run_pipeline import local_batch_responder, run_batch_job
+
+
+class ChatMockModel(MockCodeInferenceModel):
+    # the two halves of the OpenAI model a batch job uses, answered without a client
+    def build_chat_request(self, input_text, retrieved_concepts, *, audit = None):
+        return {"messages": [{"role": "user", "content": input_text}]}
+
+    def parse_chat_content(self, content, retrieved_concepts):
+        return self.infer_codes("", retrieved_concepts)
+
+
+CONCEPTS = [Concept(code = "E0110", concept = "crutches forearm"), Concept(code = "K0001", concept = "standard wheelchair")]
+
+
+def _pipeline(top_k = 5):
+    retriever = TokenRetriever()
+    retriever.index(CONCEPTS)
+    return CodeInferencePipeline(retriever, ChatMockModel(), PipelineConfig(top_k = top_k))
+
+
+def _run(job_dir, inputs, pipeline = None, context = ""):
+    job = BatchJob(job_dir, LocalBatchClient(job_dir / "local", local_batch_responder(job_dir)), poll_interval_s = 0)
+    return run_batch_job(pipeline or _pipeline(), ChatMockModel(), inputs, [AuditTrail(run_id = "run", timestamp_utc = "now", input_hash = "h") for _ in inputs], job, context = context)
+
+
+INPUTS = [
+    Input(id = "a", name = "A", text = "Forearm crutches are covered."),
+    Input(id = "b", name = "B", text = "A standard wheelchair is covered."),
+    Input(id = "c", name = "C", text = "Forearm crutches are covered."),
+]
+
+
+def test_rerun_over_the_same_inputs_resumes(tmp_path):
+    first = _run(tmp_path, INPUTS)
+    again = _run(tmp_path, INPUTS)
+    assert [o.id for o in again] == [o.id for o in first] == ["a", "b", "c"]
+    assert json.loads(json.dumps(to_jsonable(again))) == json.loads(json.dumps(to_jsonable(first)))
+
+
+def test_batch_dir_refuses_different_inputs(tmp_path):
+    _run(tmp_path, INPUTS)
+    with pytest.raises(ValueError, match = "ids, input_hash"):
+        _run(tmp_path, INPUTS[:1])
+
+
+def test_batch_dir_refuses_reordered_inputs(tmp_path):
+    _run(tmp_path, INPUTS)
+    with pytest.raises(ValueError, match = "ids"):
+        _run(tmp_path, list(reversed(INPUTS)))
+
+
+def test_batch_dir_refuses_a_changed_pipeline_or_dictionary(tmp_path):
+    _run(tmp_path, INPUTS, context = "dictionary-v1")
+    with pytest.raises(ValueError, match = "pipeline"):
+        _run(tmp_path, INPUTS, context = "dictionary-v2")
+    with pytest.raises(ValueError, match = "pipeline"):
+        _run(tmp_path, INPUTS, pipeline = _pipeline(top_k = 2), context = "dictionary-v1")
@@ -0,0 +1,122 @@
+import json
+from pathlib import Path
+
+from aiparser.checkpoint import CheckpointJournal, RetryFile
+from aiparser.llm.mock_inference import MockCodeInferenceModel
+from aiparser.models import AuditTrail, Concept, ConceptTable, DictionaryAudit, Input
+from aiparser.pipeline import CodeInferencePipeline, PipelineConfig
+from aiparser.retriever.token_retriever import TokenRetriever
+from aiparser.run_pipeline import run_with_checkpoint
+
+
+class CountingModel(MockCodeInferenceModel):
+    def __init__(self):
+        self.calls = 0
+
+    def infer_codes(self, input_text, retrieved_concepts, *, audit = None):
+        self.calls += 1
+        return super().infer_codes(input_text, retrieved_concepts, audit = audit)
+
+
+CONCEPTS = [Concept(code = "E0110", concept = "crutches forearm"), Concept(code = "K0001", concept = "standard wheelchair")]
+INPUTS = [
+    Input(id = "a", name = "A", text = "Forearm crutches are covered."),
+    Input(id = "b", name = "B", text = "A standard wheelchair is covered."),
+]
+
+
+def _run(tmp_path, *, top_k = 5, concepts = CONCEPTS):
+    model = CountingModel()
+    retriever = TokenRetriever()
+    retriever.index(concepts)
+    pipeline = CodeInferencePipeline(retriever, model, PipelineConfig(top_k = top_k))
+    dictionary = DictionaryAudit(row_count = len(concepts), schema = {}, content_sha256 = ConceptTable.from_concepts(concepts).sha256())
+    journal = CheckpointJournal(tmp_path / "out.journal.jsonl", fingerprint = pipeline.fingerprint(dictionary.context()))
+    audits = [AuditTrail(run_id = "run", timestamp_utc = "now", input_hash = "h")] * len(INPUTS)
+    results = run_with_checkpoint(pipeline, INPUTS, audits, journal, RetryFile(tmp_path / "out.retry.jsonl"))
+    return results, model.calls
+
+
+def test_resume_with_the_same_pipeline_reuses_the_journal(tmp_path):
+    first, calls = _run(tmp_path)
+    assert calls == 2
+    again, calls = _run(tmp_path)
+    assert calls == 0
+    assert [r.inferred_codes for r in again] == [r.inferred_codes for r in first]
+
+
+def test_resume_after_a_pipeline_change_recomputes(tmp_path):
+    _run(tmp_path)
+    _, calls = _run(tmp_path, top_k = 1)
+    assert calls == 2
+    # the new records are the ones a later run with the changed pipeline resumes from
+    _, calls = _run(tmp_path, top_k = 1)
+    assert calls == 0
+
+
+def test_resume_after_a_dictionary_change_recomputes(tmp_path):
+    _run(tmp_path)
+    revised = [Concept(code = "E0110", concept = "crutches forearm, adjustable"), CONCEPTS[1]]
+    results, calls = _run(tmp_path, concepts = revised)
+    assert calls == 2
+    assert len(results) == 2
+
+
+def test_records_without_a_fingerprint_are_not_trusted(tmp_path):
+    path = tmp_path / "out.journal.jsonl"
+    path.write_text('{"id": "a", "text_sha256": "x", "output": {}}\n', encoding = "utf-8")
+    journal = CheckpointJournal(path, fingerprint = "f1")
+    assert journal.completed("a", "x") is None
+    assert journal.stale == 1
+
+
+def test_identical_text_in_a_later_file_reuses_the_result(tmp_path):
+    model = CountingModel()
+    retriever = TokenRetriever()
+    retriever.index(CONCEPTS)
+    pipeline = CodeInferencePipeline(retriever, model, PipelineConfig(top_k = 5))
+    journal = CheckpointJournal(tmp_path / "out.journal.jsonl", fingerprint = pipeline.fingerprint())
+    retry = RetryFile(tmp_path / "out.retry.jsonl")
+    computed = {}
+
+    first_file = INPUTS
+    second_file = [Input(id = "c", name = "C", text = INPUTS[0].text)]
+    audit = AuditTrail(run_id = "run", timestamp_utc = "now", input_hash = "h")
+    first = run_with_checkpoint(pipeline, first_file, [audit] * 2, journal, retry, computed = computed)
+    second = run_with_checkpoint(pipeline, second_file, [audit], journal, retry, computed = computed)
+
+    assert model.calls == 2
+    assert second[0].id == "c"
+    assert second[0].inferred_codes == first[0].inferred_codes
+    assert second[0].audit["shared_computation"]["computed_for"] == "a"
+
+
+def _write_inputs(path):
+    path.write_text(
+        "policy_id,policy_name,cleaned_policy_text\n"
+        "a,A,Forearm crutches are covered.\n"
+        "b,B,A standard wheelchair is covered.\n",
+        encoding = "utf-8",
+    )
+
+
+def test_a_complete_run_removes_the_default_journal(tmp_path, monkeypatch):
+    from aiparser import run_pipeline
+    monkeypatch.chdir(Path(run_pipeline.__file__).parent.parent)
+    _write_inputs(tmp_path / "in.csv")
+    output = tmp_path / "out.json"
+    run_pipeline.main(str(tmp_path / "in.csv"), str(output), ingest_workers = 1)
+    assert output.exists()
+    assert not (tmp_path / "out.json.journal.jsonl").exists()
+    # a rerun recomputes instead of resuming from the previous run
+    run_pipeline.main(str(tmp_path / "in.csv"), str(output), ingest_workers = 1)
+    manifest = json.loads((tmp_path / "out.json.manifest.json").read_text(encoding = "utf-8"))
+    assert manifest.get("resumed_run_ids") is None
+
+
+def test_an_explicit_checkpoint_is_kept(tmp_path, monkeypatch):
+    from aiparser import run_pipeline
+    monkeypatch.chdir(Path(run_pipeline.__file__).parent.parent)
+    _write_inputs(tmp_path / "in.csv")
+    run_pipeline.main(str(tmp_path / "in.csv"), str(tmp_path / "out.json"), checkpoint = str(tmp_path / "keep.jsonl"), ingest_workers = 1)
+    assert len((tmp_path / "keep.jsonl").read_text(encoding = "utf-8").splitlines()) == 2
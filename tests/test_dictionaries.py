@@ -0,0 +1,31 @@
+from aiparser.dictionaries import DictionarySpec, build_dictionaries
+
+
+def _write(path, rows):
+    path.write_text("code,description\n" + "".join(f"{code},{text}\n" for code, text in rows), encoding = "utf-8")
+    return path
+
+
+def _build(tmp_path, icd_rows):
+    hcpcs = _write(tmp_path / "hcpcs.csv", [("E0110", "crutches forearm"), ("K0001", "standard wheelchair")])
+    icd = _write(tmp_path / "icd.csv", icd_rows)
+    specs = [DictionarySpec.parse(f"hcpcs={hcpcs}"), DictionarySpec.parse(f"icd10cm={icd},top_k=5")]
+    retriever, audit = build_dictionaries(specs, retriever = "token")
+    retriever.close()
+    return audit
+
+
+def test_two_dictionaries_are_indexed_with_a_content_hash(tmp_path):
+    audit = _build(tmp_path, [("S82.0", "fracture of patella")])
+    assert audit.row_count == 3
+    assert sorted(audit.code_systems) == ["hcpcs", "icd10cm"]
+    assert len(audit.content_sha256) == 64
+    assert audit.context() == audit.content_sha256
+
+
+def test_content_hash_follows_the_tables(tmp_path):
+    first = _build(tmp_path, [("S82.0", "fracture of patella")])
+    same = _build(tmp_path, [("S82.0", "fracture of patella")])
+    edited = _build(tmp_path, [("S82.0", "closed fracture of patella")])
+    assert same.content_sha256 == first.content_sha256
+    assert edited.content_sha256 != first.content_sha256
@@ -0,0 +1,77 @@
+import pytest
+
+from aiparser.models import Concept, DictionaryAudit
+from aiparser.retriever.sharded_retriever import ShardedRetriever
+from aiparser.retriever.minhash_retriever import MinHashRetriever
+from aiparser.retriever.token_retriever import TokenRetriever
+
+
+V1 = [Concept(code = "A1", concept = "knee brace"), Concept(code = "B2", concept = "wheelchair cushion")]
+V2 = [Concept(code = "A1", concept = "knee brace, hinged"), Concept(code = "C3", concept = "walker")]
+
+
+def test_first_index_reports_no_change():
+    assert TokenRetriever().index(V1) is None
+
+
+def test_reindex_reports_the_dictionary_diff_for_the_audit():
+    retriever = TokenRetriever()
+    retriever.index(V1)
+    change = retriever.index(V2)
+    assert (change.added, change.removed, change.updated, change.row_count) == (["C3"], ["B2"], ["A1"], 2)
+
+    audit = DictionaryAudit(row_count = 2, schema = {})
+    audit.record_change(change)
+    assert audit.changes == [change]
+
+
+def test_sharded_reindex_combines_shard_changes():
+    sharded = ShardedRetriever({"hcpcs": TokenRetriever(), "icd": TokenRetriever()})
+    try:
+        assert sharded.index_shards({"hcpcs": V1, "icd": [Concept(code = "Z1", concept = "fracture")]}) is None
+        change = sharded.index_shards({"hcpcs": V2, "icd": [Concept(code = "Z1", concept = "fracture")]})
+        assert sorted(change.added) == ["C3"] and change.removed == ["B2"] and change.row_count == 3
+    finally:
+        sharded.close()
+
+
+@pytest.mark.parametrize("retriever_cls", [TokenRetriever, MinHashRetriever])
+def test_metadata_only_edit_lands_without_a_text_change(retriever_cls):
+    retriever = retriever_cls()
+    retriever.index([Concept(code = "A1", concept = "knee brace", metadata = {"status": "active"}), V1[1]])
+
+    change = retriever.update([Concept(code = "A1", concept = "knee brace", metadata = {"status": "retired"})])
+    assert (change.added, change.removed, change.updated) == ([], [], ["A1"])
+    found = {r.concept.code: r.concept for r in retriever.retrieve("knee brace", top_k = 5)}
+    assert found["A1"].metadata == {"status": "retired"}
+
+    # a full re-index with only the metadata changed reports and applies it the same way
+    change = retriever.index([Concept(code = "A1", concept = "knee brace", metadata = {"status": "active"}), V1[1]])
+    assert change.updated == ["A1"]
+    found = {r.concept.code: r.concept for r in retriever.retrieve("knee brace", top_k = 5)}
+    assert found["A1"].metadata == {"status": "active"}
+
+
+def test_saved_embedding_store_is_synced_by_diff(tmp_path):
+    pytest.importorskip("openai")
+    from aiparser.retriever.openai_embeddint_retriever import OpenAIEmbeddingRetriever
+
+    embedded = []
+
+    def fake_embed_batch(batch):
+        embedded.extend(batch)
+        return [[float(len(text)), 1.0, 0.5] for text in batch]
+
+    def make():
+        retriever = OpenAIEmbeddingRetriever(api_key = "test", store_path = str(tmp_path / "store.emb"), query_cache_size = 0)
+        retriever._embed_batch = fake_embed_batch
+        return retriever
+
+    assert make().index(V1) is None
+    assert sorted(embedded) == ["knee brace", "wheelchair cushion"]
+
+    # a later run with the next dictionary version embeds only the changed rows and reports the diff
+    embedded.clear()
+    change = make().index(V2)
+    assert sorted(embedded) == ["knee brace, hinged", "walker"]
+    assert (change.added, change.removed, change.updated) == (["C3"], ["B2"], ["A1"])
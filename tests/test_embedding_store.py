@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from aiparser.models import Concept
+from aiparser.retriever.embedding_store import EmbeddingStore
+
+
+def _write(path, texts):
+    concepts = [Concept(code = f"C{i}", concept = text) for i, text in enumerate(texts)]
+    vectors = [[1.0 if d == i % 3 else 0.0 for d in range(3)] for i in range(len(texts))]
+    EmbeddingStore.write(path, concepts, vectors)
+
+
+def test_open_round_trips(tmp_path):
+    path = tmp_path / "store.emb"
+    _write(path, ["alpha", "beta"])
+    store = EmbeddingStore.open(path)
+    try:
+        assert [c.concept for c in store.concepts] == ["alpha", "beta"]
+        assert list(store.vector(1)) == [0.0, 1.0, 0.0]
+    finally:
+        store.close()
+
+
+def test_open_refuses_table_from_another_write(tmp_path):
+    # same row count, different rows: what a reader sees between the two renames of a concurrent write
+    path = tmp_path / "store.emb"
+    _write(path, ["alpha", "beta"])
+    other = tmp_path / "other.emb"
+    _write(other, ["gamma", "delta"])
+    (tmp_path / "store.emb.concepts.json").write_bytes((tmp_path / "other.emb.concepts.json").read_bytes())
+
+    with pytest.raises(ValueError, match = "does not match"):
+        EmbeddingStore.open(path)
+
+
+def test_open_accepts_stores_without_table_hash(tmp_path):
+    path = tmp_path / "store.emb"
+    _write(path, ["alpha"])
+    table = json.loads((tmp_path / "store.emb.concepts.json").read_text(encoding = "utf-8"))
+    # rewrite the header without table_sha256, as older stores were written
+    data = path.read_bytes()
+    start = data.index(b"{")
+    end = data.index(b"}", start) + 1
+    header = json.loads(data[start:end])
+    del header["table_sha256"]
+    raw = json.dumps(header, sort_keys = True).encode("utf-8")
+    path.write_bytes(data[:start] + raw + b" " * (end - start - len(raw)) + data[end:])
+
+    store = EmbeddingStore.open(path)
+    try:
+        assert store.concepts[0].concept == table["rows"][0][1]
+    finally:
+        store.close()
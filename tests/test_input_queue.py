@@ -0,0 +1,64 @@
+import gzip
+
+import pytest
+
+from aiparser.input_csv_loader import InputCsvSchema, InputFileQueue, expand_input_paths
+
+
+HEADER = "policy_id,policy_name,cleaned_policy_text\n"
+
+
+def _write(path, rows, compress = False):
+    data = (HEADER + "".join(f"{i},{name},{text}\n" for i, name, text in rows)).encode("utf-8")
+    path.parent.mkdir(parents = True, exist_ok = True)
+    path.write_bytes(gzip.compress(data) if compress else data)
+    return path
+
+
+@pytest.fixture
+def input_dir(tmp_path):
+    _write(tmp_path / "a.csv", [("a1", "A", "knee brace"), ("a2", "A", "")])
+    _write(tmp_path / "sub" / "b.csv.gz", [("b1", "B", "walker")], compress = True)
+    _write(tmp_path / "sub" / "c.csv", [("c1", "C", "wheelchair")])
+    (tmp_path / "notes.txt").write_text("not an input", encoding = "utf-8")
+    return tmp_path
+
+
+def test_directories_expand_to_csv_files_in_a_stable_order(input_dir):
+    paths = expand_input_paths([str(input_dir), str(input_dir / "a.csv")])
+    assert [p.relative_to(input_dir).as_posix() for p in paths] == ["a.csv", "sub/b.csv.gz", "sub/c.csv"]
+
+
+def test_missing_inputs_are_reported(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        expand_input_paths([str(tmp_path / "missing.csv")])
+    with pytest.raises(FileNotFoundError):
+        expand_input_paths([str(tmp_path / "*.csv")])
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_files_come_back_parsed_in_input_order(input_dir, workers):
+    paths = expand_input_paths([str(input_dir)])
+    queue = InputFileQueue(paths, InputCsvSchema(), workers = workers, max_pending = 1)
+    parsed = list(queue)
+    assert [[i.id for i in f.inputs] for f in parsed] == [["a1"], ["b1"], ["c1"]]
+    assert [f.skipped_rows for f in parsed] == [1, 0, 0]
+    # the gzipped file is hashed as received, so its hash differs from the hash of its contents
+    assert len({f.sha256 for f in parsed}) == 3
+
+
+def test_close_before_iterating_shuts_the_workers_down(input_dir):
+    queue = InputFileQueue(expand_input_paths([str(input_dir)]), InputCsvSchema(), workers = 2)
+    queue.close()
+    queue.close()
+    assert list(queue) == []
+
+
+def test_a_bad_file_raises_when_reached(tmp_path):
+    _write(tmp_path / "a.csv", [("a1", "A", "knee brace")])
+    (tmp_path / "b.csv").write_text("id,text\n1,x\n", encoding = "utf-8")
+    queue = InputFileQueue(expand_input_paths([str(tmp_path)]), InputCsvSchema(), workers = 2)
+    files = iter(queue)
+    assert next(files).inputs[0].id == "a1"
+    with pytest.raises(ValueError, match = "missing required columns"):
+        next(files)
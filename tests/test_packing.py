@@ -0,0 +1,84 @@
+import pytest
+
+from aiparser.llm.mock_inference import MockCodeInferenceModel
+from aiparser.models import Concept
+from aiparser.pipeline import CodeInferencePipeline, PipelineConfig
+from aiparser.retriever.token_retriever import TokenRetriever
+
+
+class RecordingModel(MockCodeInferenceModel):
+    def __init__(self, packs = True):
+        self.packs = packs
+        self.batches = []
+
+    @property
+    def supports_packing(self):
+        return self.packs
+
+    def infer_codes_batch(self, requests):
+        self.batches.append(len(requests))
+        return super().infer_codes_batch(requests)
+
+
+TEXTS = ["Forearm crutches are covered.", "A standard wheelchair is covered.", "Forearm crutches again."]
+
+
+def _pipeline(model):
+    retriever = TokenRetriever()
+    retriever.index([Concept(code = "E0110", concept = "crutches forearm"), Concept(code = "K0001", concept = "standard wheelchair")])
+    return CodeInferencePipeline(retriever, model, PipelineConfig(top_k = 5, pack_max_chars = 200))
+
+
+def test_short_documents_are_packed():
+    model = RecordingModel()
+    _pipeline(model).run_many(TEXTS, max_workers = 2)
+    assert model.batches == [3]
+
+
+def test_a_model_that_cannot_pack_gets_single_calls():
+    model = RecordingModel(packs = False)
+    results = _pipeline(model).run_many(TEXTS, max_workers = 2)
+    assert model.batches == []
+    assert len(results) == 3
+
+
+class _Completions:
+    def __init__(self):
+        self.requests = []
+
+    def create(self, **request):
+        self.requests.append(request)
+        message = type("Message", (), {"content": '{"inferred": []}'})
+        choice = type("Choice", (), {"message": message})
+        return type("Response", (), {"choices": [choice], "usage": None})
+
+
+def _openai_model(**kwargs):
+    pytest.importorskip("openai")
+    from aiparser.llm.openai_inference import OpenAIInferenceModel
+    from aiparser.llm.prompt_budget import PromptBudget
+    model = OpenAIInferenceModel(api_key = "test", prompt_budget = PromptBudget(max_prompt_tokens = 400), **kwargs)
+    completions = _Completions()
+    model._client = type("Client", (), {"chat": type("Chat", (), {"completions": completions})})
+    return model, completions
+
+
+def test_packed_prompts_trim_each_document_to_its_budget():
+    from aiparser.models import InferenceRequest, ModelAudit, RetrievedConcept
+    model, completions = _openai_model()
+    retrieved = [RetrievedConcept(concept = Concept(code = "E0110", concept = "crutches forearm"), score = 0.5)]
+    audits = [ModelAudit(model_name = "m", model_version = "1"), ModelAudit(model_name = "m", model_version = "1")]
+    requests = [
+        InferenceRequest(doc_id = "a", input_text = "crutches " * 2000, retrieved = retrieved, audit = audits[0]),
+        InferenceRequest(doc_id = "b", input_text = "Forearm crutches.", retrieved = retrieved, audit = audits[1]),
+    ]
+    model.infer_codes_batch(requests)
+    prompt = completions.requests[0]["messages"][1]["content"]
+    assert len(prompt) < 4000
+    assert audits[0].params["text_trimmed"] is True and audits[1].params["text_trimmed"] is False
+
+
+def test_custom_schema_disables_packing():
+    schema = {"name": "custom", "schema": {"type": "object", "properties": {"inferred": {"type": "array"}}}}
+    model, completions = _openai_model(custom_schema = schema)
+    assert model.supports_packing is False
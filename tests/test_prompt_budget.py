@@ -0,0 +1,31 @@
+from aiparser.llm.prompt_budget import PromptBudget, _passages, estimate_tokens, select_passages
+
+
+CANDIDATES = [{"code": "E0110", "concepts": ["crutches forearm"]}]
+
+
+def test_run_on_text_is_split_into_bounded_passages():
+    passages = _passages("word " * 30000, 700)
+    assert len(passages) > 1
+    assert all(len(p) <= 700 for p in passages)
+
+
+def test_run_on_text_over_budget_is_trimmed_not_emptied():
+    text, decisions = select_passages("word " * 30000, CANDIDATES, 500, PromptBudget())
+    assert text
+    assert decisions["passages_kept"] > 0
+    assert estimate_tokens(text) <= 500
+
+
+def test_a_single_passage_larger_than_the_budget_is_truncated():
+    budget = PromptBudget(passage_chars = 5000)
+    text, decisions = select_passages("crutches " * 3000, CANDIDATES, 10, budget)
+    assert text.startswith("crutches")
+    assert decisions["passages_kept"] == 1
+    assert estimate_tokens(text) <= 10
+
+
+def test_text_inside_the_budget_is_untouched():
+    text, decisions = select_passages("Forearm crutches are covered.", CANDIDATES, 500, PromptBudget())
+    assert text == "Forearm crutches are covered."
+    assert decisions["text_trimmed"] is False
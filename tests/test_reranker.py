@@ -0,0 +1,24 @@
+from aiparser.models import Concept, RetrievedConcept
+from aiparser.reranker import FEATURES, candidate_features
+from aiparser.text_utils import analyze
+
+
+OVERLAP = FEATURES.index("token_overlap")
+
+
+def _overlap(text, concept):
+    retrieved = [RetrievedConcept(concept = Concept(code = "X1", concept = concept), score = 0.5)]
+    return candidate_features(analyze(text), retrieved)[0].features[OVERLAP]
+
+
+def test_unknown_tokens_in_different_streams_do_not_match():
+    # both words are outside the vocabulary, so each stream numbers them -1
+    assert _overlap("zzqxv", "wwkrj") == 0.0
+
+
+def test_unknown_tokens_match_by_their_text():
+    assert _overlap("the zzqxv device", "zzqxv") == 1.0
+
+
+def test_partial_overlap_is_a_fraction_of_the_concept_tokens():
+    assert _overlap("forearm support", "crutches forearm") == 0.5
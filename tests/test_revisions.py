@@ -0,0 +1,62 @@
+from aiparser.models import Concept, InferredCode, RetrievedConcept
+from aiparser.revisions import Revision, RevisionStore
+
+
+def _revision(code, context = "ctx"):
+    retrieved = [RetrievedConcept(concept = Concept(code = code, concept = "crutches forearm"), score = 0.5)]
+    inferred = [InferredCode(code = code, confidence = 0.5, score = 0.5, matched_concepts = ["crutches forearm"], justification = "match")]
+    return Revision(context = context, sections = {"s1": retrieved}, candidates = "c", inferred = inferred)
+
+
+def _lines(path):
+    return [line for line in path.read_text(encoding = "utf-8").splitlines() if line.strip()]
+
+
+def test_latest_revision_wins_after_reload(tmp_path):
+    path = tmp_path / "revisions.jsonl"
+    store = RevisionStore(path)
+    store.put("a", _revision("E0110"))
+    store.put("a", _revision("E0114"))
+    reloaded = RevisionStore(path)
+    assert reloaded.get("a", "ctx").inferred[0].code == "E0114"
+    assert reloaded.get("a", "other") is None
+
+
+def test_superseded_lines_are_compacted_on_load(tmp_path):
+    path = tmp_path / "revisions.jsonl"
+    store = RevisionStore(path)
+    for code in ["E0110", "E0111", "E0112", "E0114"]:
+        store.put("a", _revision(code))
+    store.put("b", _revision("K0001"))
+    assert len(_lines(path)) == 5
+
+    reloaded = RevisionStore(path)
+    assert len(_lines(path)) == 2
+    assert len(reloaded) == 2
+    assert reloaded.get("a", "ctx").inferred[0].code == "E0114"
+    assert reloaded.get("b", "ctx").sections["s1"][0].concept.code == "K0001"
+
+
+def test_live_lines_are_not_rewritten(tmp_path):
+    path = tmp_path / "revisions.jsonl"
+    store = RevisionStore(path)
+    store.put("a", _revision("E0110"))
+    store.put("a", _revision("E0114"))
+    store.put("b", _revision("K0001"))
+    RevisionStore(path)
+    # 3 lines for 2 documents is under the compaction threshold
+    assert len(_lines(path)) == 3
+
+
+def test_torn_tail_is_dropped_and_the_file_rewritten(tmp_path):
+    path = tmp_path / "revisions.jsonl"
+    store = RevisionStore(path)
+    store.put("a", _revision("E0110"))
+    with open(path, "a", encoding = "utf-8") as f:
+        f.write('{"id": "b", "context": "ctx", "sect')
+
+    reloaded = RevisionStore(path)
+    assert len(reloaded) == 1
+    assert path.read_text(encoding = "utf-8").endswith("\n")
+    reloaded.put("b", _revision("K0001"))
+    assert len(RevisionStore(path)) == 2
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from aiparser.models import Input
+from aiparser.sharding import merge_shards, shard_of
+
+
+INPUTS = [Input(id = f"doc{i}", name = f"Doc {i}", text = f"text {i}") for i in range(8)]
+DICTIONARY = {"row_count": 2, "schema": {}, "content_sha256": "v1"}
+
+
+def _write_shards(tmp_path, count = 2, dictionaries = None, input_hashes = None, drop = None):
+    paths = []
+    for index in range(count):
+        path = tmp_path / f"out.{index}.json"
+        records = [{"id": d.id, "name": d.name, "inferred_codes": [], "audit": None} for d in INPUTS if shard_of(d.id, count) == index and d.id != drop]
+        path.write_text(json.dumps(records), encoding = "utf-8")
+        manifest = {
+            "run_id": f"run{index}",
+            "shard": f"{index}/{count}",
+            "input_hash": (input_hashes or {}).get(index, "h"),
+            "dictionary": (dictionaries or {}).get(index, DICTIONARY),
+            "pipeline": {"top_k": 5},
+        }
+        (tmp_path / f"out.{index}.json.manifest.json").write_text(json.dumps(manifest), encoding = "utf-8")
+        paths.append(path)
+    return paths
+
+
+def test_merge_restores_input_order(tmp_path):
+    manifest = merge_shards(INPUTS, _write_shards(tmp_path), tmp_path / "out.json")
+    merged = json.loads((tmp_path / "out.json").read_text(encoding = "utf-8"))
+    assert [r["id"] for r in merged] == [d.id for d in INPUTS]
+    assert manifest.document_count == len(INPUTS)
+    assert manifest.shard_run_ids == {"0/2": "run0", "1/2": "run1"}
+
+
+def test_merge_fails_on_a_missing_shard(tmp_path):
+    paths = _write_shards(tmp_path)
+    with pytest.raises(ValueError, match = "missing \\[1\\]"):
+        merge_shards(INPUTS, paths[:1], tmp_path / "out.json")
+
+
+def test_merge_fails_on_a_missing_document(tmp_path):
+    with pytest.raises(ValueError, match = "1 missing"):
+        merge_shards(INPUTS, _write_shards(tmp_path, drop = "doc3"), tmp_path / "out.json")
+
+
+def test_merge_fails_on_different_input_files(tmp_path):
+    with pytest.raises(ValueError, match = "input_hash"):
+        merge_shards(INPUTS, _write_shards(tmp_path, input_hashes = {1: "other"}), tmp_path / "out.json")
+
+
+def test_merge_fails_on_different_dictionaries(tmp_path):
+    revised = {**DICTIONARY, "content_sha256": "v2"}
+    with pytest.raises(ValueError, match = "dictionary"):
+        merge_shards(INPUTS, _write_shards(tmp_path, dictionaries = {1: revised}), tmp_path / "out.json")
+
+
+def test_merge_ignores_which_shard_recorded_the_index_sync(tmp_path):
+    synced = {**DICTIONARY, "changes": [{"added": ["C3"], "removed": [], "updated": [], "row_count": 2, "timestamp_utc": "t"}]}
+    merge_shards(INPUTS, _write_shards(tmp_path, dictionaries = {0: synced}), tmp_path / "out.json")